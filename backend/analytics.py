@@ -0,0 +1,513 @@
+"""Experiment analytics.
+
+Per-question and per-rater summaries (QuestionStats, RaterStats) are updated
+in the same transaction as each rating, and the analytics endpoints read only
+those summaries: an overview, plus sortable, filterable pages of
+per-question and per-rater stats. rebuild() reconstructs them from the raw ratings with grouped
+SQL queries, and check() compares the two for consistency.
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import json
+import logging
+import math
+
+from sqlalchemy import Float, case, delete, func, insert, update
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import FunctionElement
+
+from database import upsert
+from models import Experiment, Question, QuestionStats, Rater, RaterStats, Rating
+
+logger = logging.getLogger(__name__)
+
+# Tolerances when comparing floating-point sums in check(); SQLite's julianday()
+# only resolves timestamps to about a millisecond
+CHECK_REL_TOLERANCE = 1e-3
+CHECK_ABS_TOLERANCE = 0.05
+
+QUESTION_TEXT_PREVIEW_CHARS = 100
+
+# Per-question and per-rater stats are served a page at a time
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+QUESTION_SORTS = ("question_id", "num_ratings", "avg_response_time", "avg_confidence")
+RATER_SORTS = ("num_ratings", "avg_response_time", "avg_confidence")
+
+
+class response_seconds(FunctionElement):
+    """Seconds between two timestamp expressions (end - start), per dialect."""
+
+    type = Float()
+    inherit_cache = True
+    name = "response_seconds"
+
+
+@compiles(response_seconds)
+def _response_seconds_default(element, compiler, **kw):
+    end, start = list(element.clauses)
+    return f"EXTRACT(EPOCH FROM ({compiler.process(end, **kw)} - {compiler.process(start, **kw)}))"
+
+
+@compiles(response_seconds, "sqlite")
+def _response_seconds_sqlite(element, compiler, **kw):
+    end, start = list(element.clauses)
+    return (
+        f"((julianday({compiler.process(end, **kw)}) - julianday({compiler.process(start, **kw)})) * 86400.0)"
+    )
+
+
+@compiles(response_seconds, "mysql")
+def _response_seconds_mysql(element, compiler, **kw):
+    end, start = list(element.clauses)
+    return (
+        f"(TIMESTAMPDIFF(MICROSECOND, {compiler.process(start, **kw)}, {compiler.process(end, **kw)}) / 1000000.0)"
+    )
+
+
+def rating_response_time():
+    return response_seconds(Rating.time_submitted, Rating.time_started)
+
+
+def response_time_seconds(time_started: datetime, time_submitted: datetime) -> float:
+    # Submitted times are naive UTC; clients may send an aware start time
+    if time_started.tzinfo is not None:
+        time_started = time_started.astimezone(timezone.utc).replace(tzinfo=None)
+    return (time_submitted - time_started).total_seconds()
+
+
+SUMMARY_SUM_COLUMNS = (
+    "num_ratings",
+    "sum_response_time",
+    "sum_sq_response_time",
+    "sum_confidence",
+    "confidence_1",
+    "confidence_2",
+    "confidence_3",
+    "confidence_4",
+    "confidence_5",
+)
+
+
+def _empty_summary() -> dict:
+    row = {name: 0 for name in SUMMARY_SUM_COLUMNS}
+    row.update(min_response_time=None, max_response_time=None)
+    return row
+
+
+def _add_to_summary(row: dict, response_time: float, confidence: int):
+    row["num_ratings"] += 1
+    row["sum_response_time"] += response_time
+    row["sum_sq_response_time"] += response_time * response_time
+    row["sum_confidence"] += confidence
+    if 1 <= confidence <= 5:
+        row[f"confidence_{confidence}"] += 1
+    if row["min_response_time"] is None or response_time < row["min_response_time"]:
+        row["min_response_time"] = response_time
+    if row["max_response_time"] is None or response_time > row["max_response_time"]:
+        row["max_response_time"] = response_time
+
+
+def _summary_upsert_values(current, new) -> dict:
+    values = {name: current[name] + new[name] for name in SUMMARY_SUM_COLUMNS}
+    values["min_response_time"] = case(
+        (current.min_response_time.is_(None) | (new.min_response_time < current.min_response_time),
+         new.min_response_time),
+        else_=current.min_response_time,
+    )
+    values["max_response_time"] = case(
+        (current.max_response_time.is_(None) | (new.max_response_time > current.max_response_time),
+         new.max_response_time),
+        else_=current.max_response_time,
+    )
+    return values
+
+
+def _upsert_summaries(db: Session, model, key: str, rows: List[dict]):
+    """Add each row's totals to its summary, creating summaries on first ratings."""
+    db.execute(upsert(db.get_bind().dialect.name, model, rows, [key], _summary_upsert_values))
+
+
+def record_ratings(db: Session, ratings: List[dict]):
+    """Fold new ratings into the summaries, in the caller's transaction.
+
+    Each rating has experiment_id, question_id, rater_id, answer, confidence,
+    time_started and time_submitted. The batch is aggregated per question and
+    per rater first, so it costs the same four statements whatever its size.
+    """
+    if not ratings:
+        return
+    questions: Dict[int, dict] = {}
+    answers: Dict[int, Dict[str, int]] = {}
+    raters: Dict[int, dict] = {}
+    for rating in ratings:
+        response_time = response_time_seconds(rating["time_started"], rating["time_submitted"])
+        question = questions.setdefault(
+            rating["question_id"],
+            dict(_empty_summary(), question_id=rating["question_id"], experiment_id=rating["experiment_id"],
+                 answer_counts="{}"),
+        )
+        _add_to_summary(question, response_time, rating["confidence"])
+        counts = answers.setdefault(rating["question_id"], {})
+        counts[rating["answer"]] = counts.get(rating["answer"], 0) + 1
+        rater = raters.setdefault(
+            rating["rater_id"],
+            dict(_empty_summary(), rater_id=rating["rater_id"], experiment_id=rating["experiment_id"]),
+        )
+        _add_to_summary(rater, response_time, rating["confidence"])
+
+    _upsert_summaries(db, QuestionStats, "question_id", list(questions.values()))
+    # A locking read: it waits for concurrent batches on these questions to
+    # commit and sees their counts (a plain read could use an older snapshot,
+    # e.g. under MySQL's REPEATABLE READ), and no other batch can change the
+    # counts until this transaction commits
+    stored = dict(
+        db.query(QuestionStats.question_id, QuestionStats.answer_counts)
+        .filter(QuestionStats.question_id.in_(list(answers)))
+        .with_for_update()
+        .all()
+    )
+    updates = []
+    for question_id, batch_counts in answers.items():
+        counts = json.loads(stored[question_id])
+        for answer, count in batch_counts.items():
+            counts[answer] = counts.get(answer, 0) + count
+        updates.append({"question_id": question_id, "answer_counts": json.dumps(counts)})
+    db.execute(update(QuestionStats), updates)
+
+    _upsert_summaries(db, RaterStats, "rater_id", list(raters.values()))
+
+
+def _round(value):
+    return round(value, 2) if value is not None else 0
+
+
+def _preview(text):
+    # Fetched one character past the preview length to tell whether it was cut
+    if text is not None and len(text) > QUESTION_TEXT_PREVIEW_CHARS:
+        return text[:QUESTION_TEXT_PREVIEW_CHARS] + "..."
+    return text
+
+
+def _std(num_ratings: int, total: float, total_sq: float) -> float:
+    mean = total / num_ratings
+    return math.sqrt(max(total_sq / num_ratings - mean * mean, 0.0))
+
+
+# Reads from the maintained summaries
+
+def overview(db: Session, experiment_id: int) -> dict:
+    total_ratings, total_time, min_time, max_time, total_confidence = (
+        db.query(
+            func.sum(QuestionStats.num_ratings),
+            func.sum(QuestionStats.sum_response_time),
+            func.min(QuestionStats.min_response_time),
+            func.max(QuestionStats.max_response_time),
+            func.sum(QuestionStats.sum_confidence),
+        )
+        .filter(QuestionStats.experiment_id == experiment_id)
+        .one()
+    )
+    total_questions = (
+        db.query(func.count(Question.id)).filter(Question.experiment_id == experiment_id).scalar()
+    )
+
+    if not total_ratings:
+        return {
+            "total_ratings": 0,
+            "total_questions": total_questions,
+            "total_raters": 0,
+            "avg_response_time_seconds": 0,
+            "avg_confidence": 0,
+        }
+
+    total_raters = (
+        db.query(func.count(RaterStats.rater_id))
+        .filter(RaterStats.experiment_id == experiment_id, RaterStats.num_ratings > 0)
+        .scalar()
+    )
+    return {
+        "total_ratings": total_ratings,
+        "total_questions": total_questions,
+        "total_raters": total_raters,
+        "avg_response_time_seconds": _round(total_time / total_ratings),
+        "min_response_time_seconds": _round(min_time),
+        "max_response_time_seconds": _round(max_time),
+        "avg_confidence": _round(total_confidence / total_ratings),
+    }
+
+
+def _average(model, column):
+    return column / func.nullif(model.num_ratings, 0)
+
+
+def _page(query, sort_column, order: str, tiebreak, skip: int, limit: int):
+    total = query.order_by(None).count()
+    direction = sort_column.desc() if order == "desc" else sort_column.asc()
+    return total, query.order_by(direction, tiebreak).offset(skip).limit(limit).all()
+
+
+def question_stats(
+    db: Session,
+    experiment: Experiment,
+    skip: int = 0,
+    limit: int = DEFAULT_PAGE_SIZE,
+    sort: str = "question_id",
+    order: str = "asc",
+    under_quota: bool = False,
+) -> dict:
+    """One page of per-question stats, including questions with no ratings yet.
+
+    under_quota keeps only questions with fewer ratings than the experiment's
+    num_ratings_per_question.
+    """
+    query = (
+        db.query(
+            Question.id,
+            Question.question_id,
+            func.substr(Question.question_text, 1, QUESTION_TEXT_PREVIEW_CHARS + 1),
+            QuestionStats,
+        )
+        .outerjoin(QuestionStats, QuestionStats.question_id == Question.id)
+        .filter(Question.experiment_id == experiment.id)
+    )
+    if under_quota:
+        query = query.filter(Question.rating_count < experiment.num_ratings_per_question)
+
+    sort_columns = {
+        "question_id": Question.question_id,
+        "num_ratings": func.coalesce(QuestionStats.num_ratings, 0),
+        "avg_response_time": _average(QuestionStats, QuestionStats.sum_response_time),
+        "avg_confidence": _average(QuestionStats, QuestionStats.sum_confidence),
+    }
+    total, rows = _page(query, sort_columns[sort], order, Question.id, skip, limit)
+
+    items = []
+    for _, question_id, text, stats in rows:
+        item = {
+            "question_id": question_id,
+            "question_text": _preview(text),
+            "num_ratings": 0,
+            "avg_response_time_seconds": None,
+            "min_response_time_seconds": None,
+            "max_response_time_seconds": None,
+            "std_response_time_seconds": None,
+            "avg_confidence": None,
+            "answer_distribution": {},
+        }
+        if stats is not None and stats.num_ratings:
+            item.update(
+                num_ratings=stats.num_ratings,
+                avg_response_time_seconds=_round(stats.sum_response_time / stats.num_ratings),
+                min_response_time_seconds=_round(stats.min_response_time),
+                max_response_time_seconds=_round(stats.max_response_time),
+                std_response_time_seconds=_round(
+                    _std(stats.num_ratings, stats.sum_response_time, stats.sum_sq_response_time)
+                ),
+                avg_confidence=_round(stats.sum_confidence / stats.num_ratings),
+                answer_distribution=json.loads(stats.answer_counts),
+            )
+        items.append(item)
+    return {"items": items, "total": total, "skip": skip, "limit": limit}
+
+
+def rater_stats(
+    db: Session,
+    experiment: Experiment,
+    skip: int = 0,
+    limit: int = DEFAULT_PAGE_SIZE,
+    sort: str = "num_ratings",
+    order: str = "desc",
+    max_avg_response_time: Optional[float] = None,
+) -> dict:
+    """One page of per-rater stats for raters with at least one rating.
+
+    max_avg_response_time keeps only raters whose average response time is
+    below that many seconds, to spot raters answering suspiciously fast.
+    """
+    query = (
+        db.query(RaterStats, Rater)
+        .join(Rater, RaterStats.rater_id == Rater.id)
+        .filter(RaterStats.experiment_id == experiment.id, RaterStats.num_ratings > 0)
+    )
+    avg_response_time = _average(RaterStats, RaterStats.sum_response_time)
+    if max_avg_response_time is not None:
+        query = query.filter(avg_response_time < max_avg_response_time)
+
+    sort_columns = {
+        "num_ratings": RaterStats.num_ratings,
+        "avg_response_time": avg_response_time,
+        "avg_confidence": _average(RaterStats, RaterStats.sum_confidence),
+    }
+    total, rows = _page(query, sort_columns[sort], order, RaterStats.rater_id, skip, limit)
+
+    items = [
+        {
+            "prolific_id": rater.prolific_id,
+            "study_id": rater.study_id,
+            "session_start": rater.session_start.isoformat() if rater.session_start else None,
+            "session_end": rater.session_end.isoformat() if rater.session_end else None,
+            "is_active": rater.is_active,
+            "num_ratings": stats.num_ratings,
+            "total_response_time_seconds": _round(stats.sum_response_time),
+            "avg_response_time_seconds": _round(stats.sum_response_time / stats.num_ratings),
+            "std_response_time_seconds": _round(
+                _std(stats.num_ratings, stats.sum_response_time, stats.sum_sq_response_time)
+            ),
+            "avg_confidence": _round(stats.sum_confidence / stats.num_ratings),
+        }
+        for stats, rater in rows
+    ]
+    return {"items": items, "total": total, "skip": skip, "limit": limit}
+
+
+def experiment_analytics(db: Session, experiment: Experiment) -> dict:
+    return {"experiment_name": experiment.name, "overview": overview(db, experiment.id)}
+
+
+# Reconstruction from raw ratings
+
+def _raw_summary_columns():
+    response_time = rating_response_time()
+    return [
+        func.count(Rating.id),
+        func.sum(response_time),
+        func.sum(response_time * response_time),
+        func.min(response_time),
+        func.max(response_time),
+        func.sum(Rating.confidence),
+    ] + [
+        func.sum(case((Rating.confidence == level, 1), else_=0)) for level in range(1, 6)
+    ]
+
+
+SUMMARY_FIELDS = [
+    "num_ratings",
+    "sum_response_time",
+    "sum_sq_response_time",
+    "min_response_time",
+    "max_response_time",
+    "sum_confidence",
+    "confidence_1",
+    "confidence_2",
+    "confidence_3",
+    "confidence_4",
+    "confidence_5",
+]
+
+
+def _raw_question_summaries(db: Session, experiment_id: int) -> Dict[int, dict]:
+    summaries = {
+        question_id: dict(zip(SUMMARY_FIELDS, values), answer_counts={})
+        for question_id, *values in (
+            db.query(Question.id, *_raw_summary_columns())
+            .join(Rating, Rating.question_id == Question.id)
+            .filter(Question.experiment_id == experiment_id)
+            .group_by(Question.id)
+        )
+    }
+    for question_id, answer, count in (
+        db.query(Rating.question_id, Rating.answer, func.count(Rating.id))
+        .join(Question, Rating.question_id == Question.id)
+        .filter(Question.experiment_id == experiment_id)
+        .group_by(Rating.question_id, Rating.answer)
+    ):
+        summaries[question_id]["answer_counts"][answer] = count
+    return summaries
+
+
+def _raw_rater_summaries(db: Session, experiment_id: int) -> Dict[int, dict]:
+    return {
+        rater_id: dict(zip(SUMMARY_FIELDS, values))
+        for rater_id, *values in (
+            db.query(Rating.rater_id, *_raw_summary_columns())
+            .join(Question, Rating.question_id == Question.id)
+            .filter(Question.experiment_id == experiment_id)
+            .group_by(Rating.rater_id)
+        )
+    }
+
+
+def rebuild(db: Session, experiment_id: int):
+    """Replace an experiment's summaries with ones recomputed from its ratings."""
+    question_summaries = _raw_question_summaries(db, experiment_id)
+    rater_summaries = _raw_rater_summaries(db, experiment_id)
+
+    db.execute(delete(QuestionStats).where(QuestionStats.experiment_id == experiment_id))
+    db.execute(delete(RaterStats).where(RaterStats.experiment_id == experiment_id))
+    if question_summaries:
+        db.execute(
+            insert(QuestionStats),
+            [
+                dict(summary, question_id=question_id, experiment_id=experiment_id,
+                     answer_counts=json.dumps(summary["answer_counts"]))
+                for question_id, summary in question_summaries.items()
+            ],
+        )
+    if rater_summaries:
+        db.execute(
+            insert(RaterStats),
+            [
+                dict(summary, rater_id=rater_id, experiment_id=experiment_id)
+                for rater_id, summary in rater_summaries.items()
+            ],
+        )
+    db.commit()
+
+
+def rebuild_all(db: Session):
+    experiment_ids = [experiment_id for (experiment_id,) in db.query(Experiment.id).order_by(Experiment.id)]
+    for experiment_id in experiment_ids:
+        rebuild(db, experiment_id)
+    logger.info(f"Rebuilt analytics summaries for {len(experiment_ids)} experiments")
+
+
+def _differences(label: str, stored: Optional[dict], expected: dict) -> List[str]:
+    if stored is None:
+        return [f"{label}: missing summary"]
+    differences = []
+    for field, value in expected.items():
+        actual = stored.get(field)
+        if isinstance(value, float) or isinstance(actual, float):
+            matches = (
+                value is not None and actual is not None
+                and math.isclose(actual, value, rel_tol=CHECK_REL_TOLERANCE, abs_tol=CHECK_ABS_TOLERANCE)
+            ) or (value is None and actual is None)
+        else:
+            matches = actual == value
+        if not matches:
+            differences.append(f"{label}: {field} is {actual!r}, expected {value!r}")
+    return differences
+
+
+def check(db: Session, experiment_id: int) -> List[str]:
+    """Compare an experiment's summaries with its raw ratings; returns the differences."""
+    differences = []
+
+    stored_questions = {
+        stats.question_id: {
+            **{field: getattr(stats, field) for field in SUMMARY_FIELDS},
+            "answer_counts": json.loads(stats.answer_counts),
+        }
+        for stats in db.query(QuestionStats).filter(
+            QuestionStats.experiment_id == experiment_id, QuestionStats.num_ratings > 0
+        )
+    }
+    expected_questions = _raw_question_summaries(db, experiment_id)
+    for question_id in sorted(set(stored_questions) | set(expected_questions)):
+        expected = expected_questions.get(question_id, {"num_ratings": 0})
+        differences += _differences(f"question {question_id}", stored_questions.get(question_id), expected)
+
+    stored_raters = {
+        stats.rater_id: {field: getattr(stats, field) for field in SUMMARY_FIELDS}
+        for stats in db.query(RaterStats).filter(
+            RaterStats.experiment_id == experiment_id, RaterStats.num_ratings > 0
+        )
+    }
+    expected_raters = _raw_rater_summaries(db, experiment_id)
+    for rater_id in sorted(set(stored_raters) | set(expected_raters)):
+        expected = expected_raters.get(rater_id, {"num_ratings": 0})
+        differences += _differences(f"rater {rater_id}", stored_raters.get(rater_id), expected)
+
+    return differences
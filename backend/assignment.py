@@ -0,0 +1,350 @@
+"""In-process next-question assignment.
+
+Keeps, per experiment, the questions bucketed by their current rating count
+and the set of questions each rater has already rated, so the "least-rated
+question this rater hasn't seen" rule is answered without touching the
+database. A served question is leased to its rater for LEASE_TTL_SECONDS and
+counts toward its quota until the lease is rated, released or expires, so
+raters arriving together are spread across questions instead of all being
+handed the same ones.
+
+The database stays the source of truth: state is loaded from it on first use
+(or at startup, for experiments with raters in a session) and updated after each committed rating or lease change.
+Loads don't hold the state lock while querying, so the engine can be used from
+both sync handlers and the event loop; changes reported during a load are
+queued and applied once it finishes.
+
+Each worker process keeps its own state and only sees its own changes, so
+when several workers serve the same database, ASSIGNMENT_RESYNC_SECONDS
+makes each one reload an experiment's state once it is that old. Between
+reloads a question may briefly be over-assigned, never lost.
+"""
+from collections import defaultdict
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+import asyncio
+import heapq
+import logging
+import os
+import random
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from cache import ExperimentConfig
+from models import Experiment, Question, QuestionLease, Rater, Rating, SESSION_DURATION_MINUTES
+
+logger = logging.getLogger(__name__)
+
+# How long a served question stays reserved for its rater
+LEASE_TTL_SECONDS = int(os.getenv("LEASE_TTL_SECONDS", "600"))
+
+# Random draws from a bucket before falling back to scanning it
+MAX_SAMPLE_ATTEMPTS = 8
+
+# Reload an experiment's state once it is this old; 0 keeps it for the life
+# of the process, which is only correct with a single worker
+ASSIGNMENT_RESYNC_SECONDS = float(os.getenv("ASSIGNMENT_RESYNC_SECONDS", "0"))
+
+
+class _IndexedSet:
+    """Set with O(1) add, remove and uniform random choice."""
+
+    def __init__(self):
+        self._items: List[int] = []
+        self._positions: Dict[int, int] = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def add(self, item: int):
+        if item not in self._positions:
+            self._positions[item] = len(self._items)
+            self._items.append(item)
+
+    def discard(self, item: int):
+        pos = self._positions.pop(item, None)
+        if pos is None:
+            return
+        last = self._items.pop()
+        if pos < len(self._items):
+            self._items[pos] = last
+            self._positions[last] = pos
+
+    def choice(self) -> int:
+        return random.choice(self._items)
+
+
+class ExperimentAssignment:
+    """Assignment state for a single experiment.
+
+    A question's count is its ratings plus its active leases.
+    """
+
+    def __init__(self, experiment_id: int, num_ratings_per_question: int):
+        self.experiment_id = experiment_id
+        self.num_ratings_per_question = num_ratings_per_question
+        self.lock = threading.Lock()
+        self._counts: Dict[int, int] = {}
+        self._buckets: Dict[int, _IndexedSet] = defaultdict(_IndexedSet)
+        self._rated: Dict[int, Set[int]] = defaultdict(set)
+        # rater_id -> {question_id: expires_at}
+        self._leases: Dict[int, Dict[int, datetime]] = defaultdict(dict)
+        # (expires_at, question_id, rater_id); entries for extended or released
+        # leases are skipped when popped
+        self._expiry_heap: List[Tuple[datetime, int, int]] = []
+        # Resolved once load() has been applied; until then record_rating and
+        # release_rater calls are queued in _pending
+        self.ready: Future = Future()
+        self._pending: List[Callable[[], None]] = []
+        self.loaded_at: Optional[float] = None  # time.monotonic()
+
+    def _adjust(self, question_id: int, delta: int):
+        old = self._counts.get(question_id)
+        if old is not None:
+            bucket = self._buckets[old]
+            bucket.discard(question_id)
+            if not bucket:
+                del self._buckets[old]
+        count = (old or 0) + delta
+        self._counts[question_id] = count
+        self._buckets[count].add(question_id)
+
+    def _add_lease(self, question_id: int, rater_id: int, expires_at: datetime):
+        held = self._leases[rater_id]
+        if question_id not in held:
+            self._adjust(question_id, 1)
+        held[question_id] = expires_at
+        heapq.heappush(self._expiry_heap, (expires_at, question_id, rater_id))
+
+    def _remove_lease(self, question_id: int, rater_id: int) -> bool:
+        held = self._leases.get(rater_id)
+        if not held or question_id not in held:
+            return False
+        del held[question_id]
+        if not held:
+            del self._leases[rater_id]
+        return True
+
+    def _expire_leases(self, now: datetime):
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, question_id, rater_id = heapq.heappop(heap)
+            if self._leases.get(rater_id, {}).get(question_id) != expires_at:
+                continue
+            self._remove_lease(question_id, rater_id)
+            self._adjust(question_id, -1)
+
+    def read(self, db: Session):
+        """Query the experiment's state; runs without holding the lock."""
+        questions = (
+            db.query(Question.id, Question.rating_count)
+            .filter(Question.experiment_id == self.experiment_id)
+            .all()
+        )
+        rated = (
+            db.query(Rating.rater_id, Rating.question_id)
+            .join(Question, Rating.question_id == Question.id)
+            .filter(Question.experiment_id == self.experiment_id)
+            .all()
+        )
+        leases = (
+            db.query(QuestionLease.rater_id, QuestionLease.question_id, QuestionLease.expires_at)
+            .join(Question, QuestionLease.question_id == Question.id)
+            .filter(
+                Question.experiment_id == self.experiment_id,
+                QuestionLease.expires_at > datetime.utcnow(),
+            )
+            .all()
+        )
+        return questions, rated, leases
+
+    def apply(self, rows):
+        """Install state returned by read() and replay changes queued meanwhile."""
+        questions, rated, leases = rows
+        with self.lock:
+            for question_id, count in questions:
+                self._adjust(question_id, count)
+            for rater_id, question_id in rated:
+                self._rated[rater_id].add(question_id)
+            for rater_id, question_id, expires_at in leases:
+                if question_id not in self._rated[rater_id]:
+                    self._add_lease(question_id, rater_id, expires_at)
+            for change in self._pending:
+                change()
+            self._pending = []
+            self.loaded_at = time.monotonic()
+        self.ready.set_result(self)
+
+    def is_stale(self) -> bool:
+        return (
+            ASSIGNMENT_RESYNC_SECONDS > 0
+            and self.loaded_at is not None
+            and time.monotonic() - self.loaded_at > ASSIGNMENT_RESYNC_SECONDS
+        )
+
+    def _defer_until_loaded(self, change: Callable[[], None]) -> bool:
+        # Called with the lock held
+        if self.ready.done():
+            return False
+        self._pending.append(change)
+        return True
+
+    def record_rating(self, question_id: int, rater_id: int):
+        with self.lock:
+            if not self._defer_until_loaded(lambda: self._record_rating(question_id, rater_id)):
+                self._record_rating(question_id, rater_id)
+
+    def _record_rating(self, question_id: int, rater_id: int):
+        rated = self._rated[rater_id]
+        # Idempotent: the rating may already be reflected by a concurrent load
+        if question_id in rated or question_id not in self._counts:
+            return
+        rated.add(question_id)
+        # A rated lease already counts toward the quota
+        if not self._remove_lease(question_id, rater_id):
+            self._adjust(question_id, 1)
+
+    def release_rater(self, rater_id: int):
+        with self.lock:
+            if not self._defer_until_loaded(lambda: self._release_rater(rater_id)):
+                self._release_rater(rater_id)
+
+    def _release_rater(self, rater_id: int):
+        for question_id in list(self._leases.get(rater_id, {})):
+            self._remove_lease(question_id, rater_id)
+            self._adjust(question_id, -1)
+
+    def _pick_from_bucket(self, bucket: _IndexedSet, excluded) -> Optional[int]:
+        for _ in range(MAX_SAMPLE_ATTEMPTS):
+            question_id = bucket.choice()
+            if question_id not in excluded:
+                return question_id
+        # The rater has seen most of this bucket; choose among the rest exactly
+        remaining = [q for q in bucket if q not in excluded]
+        return random.choice(remaining) if remaining else None
+
+    def lease(self, rater_id: int, n: int = 1, ttl_seconds: int = LEASE_TTL_SECONDS) -> Tuple[List[int], datetime]:
+        """Lease up to n least-rated questions the rater hasn't rated.
+
+        Questions the rater already holds come first, in the order they were
+        leased, with their expiry extended; new leases fill the remainder.
+        Returns the leased question ids (empty when the rater has rated every
+        question) and their common expiry.
+        """
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=ttl_seconds)
+        with self.lock:
+            self._expire_leases(now)
+
+            held = self._leases.get(rater_id, {})
+            leased = list(held)[:n]
+            for question_id in leased:
+                self._add_lease(question_id, rater_id, expires_at)
+
+            excluded = self._rated.get(rater_id, set()) | set(held)
+            for count in sorted(self._buckets):
+                bucket = self._buckets.get(count)
+                while bucket and len(leased) < n:
+                    question_id = self._pick_from_bucket(bucket, excluded)
+                    if question_id is None:
+                        break
+                    # Moves the question up a bucket; buckets are visited in order
+                    self._add_lease(question_id, rater_id, expires_at)
+                    excluded.add(question_id)
+                    leased.append(question_id)
+                if len(leased) == n:
+                    break
+
+            return leased, expires_at
+
+
+def _has_active_raters():
+    # From the raters side, on the session sweep's (is_active, session_start) index
+    return Experiment.id.in_(
+        select(Rater.experiment_id).where(
+            Rater.is_active == True,  # noqa: E712
+            Rater.session_start > datetime.utcnow() - timedelta(minutes=SESSION_DURATION_MINUTES),
+        )
+    )
+
+
+class AssignmentEngine:
+    """Registry of per-experiment assignment state."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._experiments: Dict[int, ExperimentAssignment] = {}
+
+    def _claim(self, experiment: Union[Experiment, ExperimentConfig]) -> Tuple[ExperimentAssignment, bool]:
+        """Return the experiment's state and whether the caller must load it."""
+        with self._lock:
+            state = self._experiments.get(experiment.id)
+            if state is not None and not state.is_stale():
+                return state, False
+            # Registered before loading so ratings committed during the load
+            # are queued and applied afterwards rather than lost
+            state = ExperimentAssignment(experiment.id, experiment.num_ratings_per_question)
+            self._experiments[experiment.id] = state
+            return state, True
+
+    def _load_failed(self, state: ExperimentAssignment, error: Exception):
+        with self._lock:
+            if self._experiments.get(state.experiment_id) is state:
+                del self._experiments[state.experiment_id]
+        state.ready.set_exception(error)
+
+    def get(self, db: Session, experiment: Union[Experiment, ExperimentConfig]) -> ExperimentAssignment:
+        state, must_load = self._claim(experiment)
+        if not must_load:
+            return state.ready.result()
+        try:
+            state.apply(state.read(db))
+        except Exception as e:
+            self._load_failed(state, e)
+            raise
+        return state
+
+    async def get_async(self, db: AsyncSession, experiment: Union[Experiment, ExperimentConfig]) -> ExperimentAssignment:
+        state, must_load = self._claim(experiment)
+        if not must_load:
+            return await asyncio.wrap_future(state.ready)
+        try:
+            state.apply(await db.run_sync(state.read))
+        except Exception as e:
+            self._load_failed(state, e)
+            raise
+        return state
+
+    def record_rating(self, experiment_id: int, question_id: int, rater_id: int):
+        state = self._experiments.get(experiment_id)
+        if state is not None:
+            state.record_rating(question_id, rater_id)
+
+    def release_rater(self, experiment_id: int, rater_id: int):
+        state = self._experiments.get(experiment_id)
+        if state is not None:
+            state.release_rater(rater_id)
+
+    def invalidate(self, experiment_id: int):
+        with self._lock:
+            self._experiments.pop(experiment_id, None)
+
+    def warm(self, db: Session):
+        """Load the experiments raters are working on now; the rest (e.g.
+        finished ones) are loaded on first use."""
+        experiments = db.query(Experiment).filter(_has_active_raters()).all()
+        for experiment in experiments:
+            self.get(db, experiment)
+        logger.info(f"Warmed assignment state for {len(experiments)} experiments")
+
+
+
+assignments = AssignmentEngine()
@@ -0,0 +1,78 @@
+"""Helpers shared by the HTTP benchmarks (bench.scaling and bench.launch)."""
+import asyncio
+import time
+
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def questions_csv(num_questions: int, text: str = "Question {i}", options: str = "A,B") -> str:
+    return "question_id,question_text,options\n" + "".join(
+        f'q{i},{text.format(i=i)},"{options}"\n' for i in range(num_questions)
+    )
+
+
+async def create_experiment(client, name: str, num_questions: int, ratings_per_question: int) -> int:
+    """Create an experiment, upload num_questions questions and wait for them."""
+    experiment = (
+        await client.post(
+            "/api/admin/experiments", json={"name": name, "num_ratings_per_question": ratings_per_question}
+        )
+    ).json()
+    job = (
+        await client.post(
+            f"/api/admin/experiments/{experiment['id']}/upload",
+            files={"file": ("questions.csv", questions_csv(num_questions), "text/csv")},
+        )
+    ).json()
+    while True:
+        status = (await client.get(f"/api/admin/uploads/{job['job_id']}")).json()
+        if status["status"] == "completed":
+            return experiment["id"]
+        if status["status"] == "failed":
+            raise RuntimeError(f"Upload failed: {status['error']}")
+        await asyncio.sleep(0.1)
+
+
+async def participant(client, call, experiment_id: int, pid: str, deadline: float, rng, think_time: float = 0.0):
+    """One simulated rater: start a session, then fetch and submit questions
+    until the deadline or until none are left, and end the session.
+
+    call(endpoint, request) awaits the request and returns the response, or
+    None if it failed to complete; it is where the caller records latencies.
+    """
+    response = await call("start", client.post(f"/api/raters/start?experiment_id={experiment_id}&PROLIFIC_PID={pid}"))
+    if response is None or response.status_code != 200:
+        return
+    headers = {"Authorization": f"Bearer {response.json()['session_token']}"}
+
+    while time.perf_counter() < deadline:
+        response = await call("next-question", client.get("/api/raters/next-question", headers=headers))
+        if response is None or response.status_code != 200:
+            # Back off as a browser would after an error
+            await asyncio.sleep(1)
+            continue
+        question = response.json()
+        if not question:
+            break
+        if think_time:
+            # Reading and answering; uniform around the mean think time
+            await asyncio.sleep(rng.uniform(0.5, 1.5) * think_time)
+        await call(
+            "submit",
+            client.post(
+                "/api/raters/submit",
+                headers=headers,
+                json={
+                    "question_id": question["id"],
+                    "answer": rng.choice(["A", "B"]),
+                    "confidence": rng.randint(1, 5),
+                    "time_started": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
+                },
+            ),
+        )
+    await call("end-session", client.post("/api/raters/end-session", headers=headers))
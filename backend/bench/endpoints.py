@@ -0,0 +1,372 @@
+"""Per-endpoint latency, throughput and memory on a synthetic experiment.
+
+Generates an experiment with bench.generate, then calls each endpoint in
+process through the ASGI app, one request at a time. Response bodies are
+counted and discarded rather than buffered, so large exports don't inflate
+the memory figures. Reports p50/p95/p99 latency, requests (or rows) per
+second, and peak Python memory. Memory is traced with tracemalloc on one
+extra call, so tracing doesn't slow the timed ones. Native allocations (e.g.
+pyarrow) aren't included.
+
+Runs against a scratch SQLite database by default. With --database-url (e.g.
+an empty local PostgreSQL database) the schema is migrated there and the
+benchmark's experiments are deleted afterwards.
+
+Each run is appended as one JSON line to --output. --compare prints the
+change from the previous run with the same database and size.
+
+Requires httpx (requirements-dev.txt). Usage (from the backend directory):
+    python -m bench.endpoints [--size small|medium|large] [--database-url URL]
+        [--iterations 50] [--heavy-iterations 3] [--output bench/results.jsonl] [--compare]
+"""
+from datetime import datetime
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench._common import percentile, questions_csv
+from bench.generate import SIZES, generate
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Raters used for the next-question/submit benchmark each rate this many questions
+QUESTIONS_PER_RATER = 20
+
+
+def _git_commit() -> str:
+    result = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True
+    )
+    return result.stdout.strip() if result.returncode == 0 else ""
+
+
+class _Response:
+    def __init__(self):
+        self.status = 0
+        self.size = 0
+        self.body = bytearray()
+
+    def json(self):
+        return json.loads(bytes(self.body))
+
+
+# Only this much of a body is kept, for endpoints whose JSON is read
+_KEEP_BODY_BYTES = 1 << 20
+
+
+async def _call(app, method: str, path: str, **kwargs) -> _Response:
+    """Send one request straight to the ASGI app; kwargs as for httpx.Request."""
+    import httpx
+
+    request = httpx.Request(method, f"http://bench{path}", **kwargs)
+    body = request.read()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": request.url.path,
+        "raw_path": request.url.raw_path.split(b"?")[0],
+        "query_string": request.url.query,
+        "root_path": "",
+        "headers": [(name.lower(), value) for name, value in request.headers.raw],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    response = _Response()
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            await asyncio.Event().wait()  # No disconnect until the app is done
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response.status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            response.size += len(chunk)
+            if len(response.body) < _KEEP_BODY_BYTES:
+                response.body += chunk
+
+    await app(scope, receive, send)
+    return response
+
+
+class _Timings:
+    def __init__(self):
+        self.latencies = []
+        self.rows = 0  # Rows processed by the timed calls, where it applies
+        self.peak_memory = None  # Bytes, when traced
+
+    async def time(self, call):
+        started = time.perf_counter()
+        result = await call()
+        self.latencies.append(time.perf_counter() - started)
+        return result
+
+    async def trace_memory(self, call):
+        tracemalloc.start()
+        try:
+            await call()
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def summary(self) -> dict:
+        total = sum(self.latencies)
+        summary = {
+            "calls": len(self.latencies),
+            "per_second": round(len(self.latencies) / total, 2) if total else 0.0,
+            "p50_ms": round(percentile(self.latencies, 0.5) * 1000, 2),
+            "p95_ms": round(percentile(self.latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(self.latencies, 0.99) * 1000, 2),
+            "max_ms": round(max(self.latencies, default=0) * 1000, 2),
+            "peak_memory_mb": None if self.peak_memory is None else round(self.peak_memory / (1 << 20), 2),
+        }
+        if self.rows:
+            summary["rows_per_second"] = round(self.rows / total, 1) if total else 0.0
+        return summary
+
+
+def _check(response: _Response, path: str):
+    if response.status >= 400:
+        raise RuntimeError(f"{path} returned {response.status}")
+    return response
+
+
+async def _get_repeatedly(app, path: str, iterations: int) -> _Timings:
+    timings = _Timings()
+
+    async def call():
+        return _check(await _call(app, "GET", path), path)
+
+    await call()  # Warm up (first-call imports and caches aren't timed)
+    for _ in range(iterations):
+        await timings.time(call)
+    await timings.trace_memory(call)
+    return timings
+
+
+async def _export(app, experiment_id: int, iterations: int, num_ratings: int) -> _Timings:
+    path = f"/api/admin/experiments/{experiment_id}/export?format=csv"
+    timings = await _get_repeatedly(app, path, iterations)
+    timings.rows = num_ratings * iterations
+    return timings
+
+
+async def _rate(app, experiment_id: int, iterations: int):
+    """Fresh raters fetching and submitting questions, as in a study."""
+    starts, next_questions, submits = _Timings(), _Timings(), _Timings()
+
+    async def start() -> dict:
+        path = f"/api/raters/start?experiment_id={experiment_id}&PROLIFIC_PID=bench-{time.time_ns()}"
+        session = _check(await _call(app, "POST", path), "/api/raters/start").json()
+        return {"Authorization": f"Bearer {session['session_token']}"}
+
+    async def next_question(headers: dict):
+        path = "/api/raters/next-question"
+        return _check(await _call(app, "GET", path, headers=headers), path).json()
+
+    async def submit(headers: dict, question: dict):
+        body = {
+            "question_id": question["id"],
+            "answer": "A",
+            "confidence": 3,
+            "time_started": datetime.utcnow().isoformat(),
+        }
+        path = "/api/raters/submit"
+        _check(await _call(app, "POST", path, headers=headers, json=body), path)
+
+    num_raters = max(1, -(-iterations // QUESTIONS_PER_RATER))
+    for rater in range(num_raters):
+        headers = await starts.time(start)
+        for _ in range(min(QUESTIONS_PER_RATER, iterations - rater * QUESTIONS_PER_RATER)):
+            question = await next_questions.time(lambda: next_question(headers))
+            if not question:
+                break
+            await submits.time(lambda: submit(headers, question))
+
+    # One more rater, traced
+    await starts.trace_memory(start)
+    headers = await start()
+    question = {}
+
+    async def traced_next_question():
+        question.update(await next_question(headers) or {})
+
+    await next_questions.trace_memory(traced_next_question)
+    if question:
+        await submits.trace_memory(lambda: submit(headers, question))
+    return starts, next_questions, submits
+
+
+async def _upload(app, num_questions: int, iterations: int) -> _Timings:
+    """Upload a CSV into a new experiment and wait for it to be processed."""
+    timings = _Timings()
+    csv_data = questions_csv(num_questions, "Uploaded question {i}", "A,B,C,D").encode("utf-8")
+
+    async def new_experiment() -> int:
+        body = {"name": "bench upload", "num_ratings_per_question": 3}
+        return _check(await _call(app, "POST", "/api/admin/experiments", json=body), "create experiment").json()["id"]
+
+    async def upload(experiment_id: int):
+        path = f"/api/admin/experiments/{experiment_id}/upload"
+        files = {"file": ("questions.csv", csv_data, "text/csv")}
+        job = _check(await _call(app, "POST", path, files=files), path).json()
+        while True:
+            status = (await _call(app, "GET", f"/api/admin/uploads/{job['job_id']}")).json()
+            if status["status"] == "completed":
+                return
+            if status["status"] == "failed":
+                raise RuntimeError(f"Upload failed: {status['error']}")
+            await asyncio.sleep(0.005)
+
+    for _ in range(iterations):
+        experiment_id = await new_experiment()
+        await timings.time(lambda: upload(experiment_id))
+    experiment_id = await new_experiment()
+    await timings.trace_memory(lambda: upload(experiment_id))
+    timings.rows = num_questions * iterations
+    return timings
+
+
+async def _run(app_module, experiment_id: int, num_ratings: int, args) -> dict:
+    app = app_module.app
+    results = {}
+    async with app_module.lifespan(app):
+        admin = f"/api/admin/experiments/{experiment_id}"
+        results["get_experiment_analytics"] = await _get_repeatedly(app, f"{admin}/analytics", args.iterations)
+        results["get_question_analytics"] = await _get_repeatedly(
+            app, f"{admin}/analytics/questions?limit=50&sort=num_ratings&under_quota=true", args.iterations
+        )
+        results["get_experiment_stats"] = await _get_repeatedly(app, f"{admin}/stats", args.iterations)
+        results["export_ratings"] = await _export(app, experiment_id, args.heavy_iterations, num_ratings)
+        starts, next_questions, submits = await _rate(app, experiment_id, args.iterations)
+        results["start_session"] = starts
+        results["get_next_question"] = next_questions
+        results["submit_rating"] = submits
+        results["upload_questions"] = await _upload(app, SIZES[args.size].questions, args.heavy_iterations)
+    return {name: timings.summary() for name, timings in results.items()}
+
+
+def _previous(output: str, record: dict):
+    if not os.path.exists(output):
+        return None
+    previous = None
+    with open(output) as f:
+        for line in f:
+            run = json.loads(line)
+            if run["database"] == record["database"] and run["size"] == record["size"]:
+                previous = run
+    return previous
+
+
+def _change(old: float, new: float) -> str:
+    if not old:
+        return ""
+    return f"{(new - old) / old * 100:+.0f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=SIZES, default="small", help="Synthetic experiment: 1k, 100k or 1M questions")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the synthetic experiment")
+    parser.add_argument("--database-url", help="Database to run against (default: a scratch SQLite file)")
+    parser.add_argument("--iterations", type=int, default=50, help="Calls per endpoint")
+    parser.add_argument(
+        "--heavy-iterations", type=int, default=3, help="Calls for the export and upload benchmarks"
+    )
+    parser.add_argument(
+        "--output", default=os.path.join(BENCH_DIR, "results.jsonl"), help="JSON Lines file the run is appended to"
+    )
+    parser.add_argument("--compare", action="store_true", help="Compare with the previous run in --output")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="endpoint_bench_")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["UPLOAD_SPOOL_DIR"] = os.path.join(workdir, "uploads")
+    os.environ.setdefault("SESSION_TOKEN_SECRET", "endpoint-bench")
+    os.environ["SESSION_SWEEP_SECONDS"] = "0"
+
+    # The app reads its configuration on import
+    from sqlalchemy import func, select
+
+    import main as app_module
+    import schema
+    from database import SessionLocal, engine
+    from models import Experiment, Question
+
+    logging.getLogger().setLevel(logging.WARNING)
+    schema.migrate()
+
+    size = SIZES[args.size]
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        existing = set(db.scalars(select(Experiment.id)))
+        experiment_id = generate(db, size, args.seed)
+        num_ratings = db.scalar(
+            select(func.sum(Question.rating_count)).where(Question.experiment_id == experiment_id)
+        )
+    print(f"{engine.dialect.name}, {args.size}: {size.questions} questions, {num_ratings} ratings "
+          f"(generated in {time.perf_counter() - started:.1f}s)")
+
+    try:
+        results = asyncio.run(_run(app_module, experiment_id, num_ratings, args))
+    finally:
+        if args.database_url:
+            with SessionLocal() as db:
+                db.query(Experiment).filter(Experiment.id.notin_(existing)).delete(synchronize_session=False)
+                db.commit()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    record = {
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "database": engine.dialect.name,
+        "size": args.size,
+        "questions": size.questions,
+        "ratings": num_ratings,
+        "seed": args.seed,
+        "python": platform.python_version(),
+        "results": results,
+    }
+    previous = _previous(args.output, record) if args.compare else None
+
+    print(f"{'endpoint':26} {'calls':>6} {'per s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'peak mem':>9}")
+    for name, result in results.items():
+        line = (
+            f"{name:26} {result['calls']:6d} {result['per_second']:8.1f} {result['p50_ms']:7.1f}ms "
+            f"{result['p95_ms']:7.1f}ms {result['p99_ms']:7.1f}ms "
+            + (f"{result['peak_memory_mb']:7.1f}MB" if result["peak_memory_mb"] is not None else f"{'-':>9}")
+        )
+        if previous and name in previous["results"]:
+            old = previous["results"][name]
+            line += f"  p50 {_change(old['p50_ms'], result['p50_ms'])}, p95 {_change(old['p95_ms'], result['p95_ms'])}"
+        print(line)
+    if args.compare and previous is None:
+        print(f"No earlier {record['database']} {record['size']} run in {args.output} to compare with")
+    elif previous:
+        print(f"Compared with {previous['timestamp']} ({previous['commit'] or 'unknown commit'})")
+
+    with open(args.output, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"Results appended to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
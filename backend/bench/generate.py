@@ -0,0 +1,148 @@
+"""Synthetic experiments for benchmarks.
+
+generate() writes one experiment straight into the database, in bulk rather
+than through the API: questions with four options, raters who each rated
+about RATINGS_PER_RATER questions in their hour, and ratings with random
+answers, confidences and response times. Each question has between 0 and
+num_ratings_per_question ratings, so some are complete and some still need
+raters. rating_count and the analytics summaries are filled in as if the
+ratings had been submitted. The same size and seed always give the same
+data.
+
+Usage (from the backend directory; DATABASE_URL selects the database):
+    python -m bench.generate --size small|medium|large [--seed 0]
+"""
+from datetime import datetime, timedelta
+from typing import NamedTuple
+import argparse
+import random
+import sys
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+
+class Size(NamedTuple):
+    questions: int
+    ratings_per_question: int
+
+
+SIZES = {
+    "small": Size(questions=1_000, ratings_per_question=3),
+    "medium": Size(questions=100_000, ratings_per_question=3),
+    "large": Size(questions=1_000_000, ratings_per_question=3),
+}
+
+# About an hour of questions at 30s each
+RATINGS_PER_RATER = 120
+
+# Raters, or questions with their ratings, per bulk insert
+CHUNK_ROWS = 5_000
+
+OPTIONS = ["A", "B", "C", "D"]
+
+
+def generate(db: Session, size: Size, seed: int = 0, name: str = "") -> int:
+    """Create a synthetic experiment and return its id."""
+    # Imported here so callers can point DATABASE_URL elsewhere first
+    import analytics
+    from models import Experiment, Question, Rater, Rating
+
+    rng = random.Random(seed)
+    # Rating counts are drawn up front to size the rater pool
+    rating_counts = [rng.randint(0, size.ratings_per_question) for _ in range(size.questions)]
+    num_raters = max(size.ratings_per_question, sum(rating_counts) // RATINGS_PER_RATER)
+
+    experiment = Experiment(
+        name=name or f"synthetic {size.questions} questions (seed {seed})",
+        num_ratings_per_question=size.ratings_per_question,
+    )
+    db.add(experiment)
+    db.commit()
+
+    base_time = datetime.utcnow() - timedelta(days=1)
+    rater_starts = [base_time + timedelta(seconds=rng.randint(0, 6 * 3600)) for _ in range(num_raters)]
+    for start in range(0, num_raters, CHUNK_ROWS):
+        db.execute(
+            insert(Rater),
+            [
+                {
+                    "prolific_id": f"synthetic{i}",
+                    "experiment_id": experiment.id,
+                    "session_start": rater_starts[i],
+                    "session_end": rater_starts[i] + timedelta(hours=1),
+                    "is_active": False,
+                }
+                for i in range(start, min(start + CHUNK_ROWS, num_raters))
+            ],
+        )
+    rater_ids = list(db.scalars(select(Rater.id).where(Rater.experiment_id == experiment.id).order_by(Rater.id)))
+
+    last_question_id = 0
+    for start in range(0, size.questions, CHUNK_ROWS):
+        counts = rating_counts[start:start + CHUNK_ROWS]
+        db.execute(
+            insert(Question),
+            [
+                {
+                    "experiment_id": experiment.id,
+                    "question_id": f"q{start + i}",
+                    "question_text": f"Synthetic question {start + i}: which option fits best?",
+                    "gt_answer": rng.choice(OPTIONS),
+                    "options": ",".join(OPTIONS),
+                    "question_type": "MC",
+                    "extra_data": "{}",
+                    "rating_count": count,
+                }
+                for i, count in enumerate(counts)
+            ],
+        )
+        question_ids = list(
+            db.scalars(
+                select(Question.id)
+                .where(Question.experiment_id == experiment.id, Question.id > last_question_id)
+                .order_by(Question.id)
+            )
+        )
+        last_question_id = question_ids[-1]
+
+        ratings = []
+        for question_id, count in zip(question_ids, counts):
+            for rater_index in rng.sample(range(num_raters), count):
+                time_started = rater_starts[rater_index] + timedelta(seconds=rng.randint(0, 3300))
+                ratings.append(
+                    {
+                        "question_id": question_id,
+                        "rater_id": rater_ids[rater_index],
+                        "answer": rng.choice(OPTIONS),
+                        "confidence": rng.randint(1, 5),
+                        "time_started": time_started,
+                        "time_submitted": time_started + timedelta(seconds=rng.uniform(5, 120)),
+                    }
+                )
+        if ratings:
+            db.execute(insert(Rating), ratings)
+        db.commit()
+
+    analytics.rebuild(db, experiment.id)
+    return experiment.id
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=SIZES, default="small", help="Number of questions: 1k, 100k or 1M")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args(argv)
+
+    import schema
+    from database import SessionLocal
+
+    schema.migrate()
+    with SessionLocal() as db:
+        experiment_id = generate(db, SIZES[args.size], args.seed)
+    print(f"Created experiment {experiment_id}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
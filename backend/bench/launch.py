@@ -0,0 +1,267 @@
+"""Load test replaying a study launch.
+
+A cohort of simulated participants arrives within --ramp-seconds, as when a
+Prolific study goes live. Each one calls /api/raters/start, then loops
+next-question, a think time, and submit. The loop ends when their
+--session-seconds are up or no questions are left, and then they end the
+session.
+
+Reports, per endpoint:
+- p50/p95/p99 latency and error rate
+- ratings beyond num_ratings_per_question on any question (over quota),
+  and how many questions are still short of it
+- time the server spent waiting for database connections, and requests
+  that gave up on the SQLite write lock (503)
+
+Pass/fail checks can be set with --budget ENDPOINT:pNN=MS, --max-error-rate
+and --max-over-quota; the exit status is 1 when any check fails, so the
+run can gate a change. Once every question the rater hasn't seen is at
+quota, next-question still serves the least-rated ones, so over-quota
+ratings only fail the run while some questions are still under quota; seed
+enough questions for the cohort (about raters * session / think time) to
+keep it meaningful.
+
+Without --url, a server is started on a scratch SQLite database (with
+--workers processes) and seeded with --questions questions. With --url, the
+run targets that server, creating an experiment unless --experiment-id is
+given. Requires httpx (requirements-dev.txt). Usage (from the backend directory):
+    python -m bench.launch [--raters 200] [--ramp-seconds 5] [--think-time 1]
+        [--session-seconds 30] [--budget next-question:p95=250] [--max-error-rate 0.01]
+"""
+from collections import defaultdict
+import argparse
+import asyncio
+import json
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from bench import server
+from bench._common import create_experiment, participant, percentile
+
+ENDPOINTS = ("start", "next-question", "submit", "end-session")
+PERCENTILES = (50, 95, 99)
+_BUDGET = re.compile(r"^(?P<endpoint>[\w-]+):p(?P<percentile>\d{1,2})=(?P<ms>\d+(\.\d+)?)$")
+
+
+def _budget(value: str):
+    match = _BUDGET.match(value)
+    if not match or match["endpoint"] not in ENDPOINTS or int(match["percentile"]) not in PERCENTILES:
+        raise argparse.ArgumentTypeError(
+            f"expected ENDPOINT:pNN=MS with ENDPOINT one of {', '.join(ENDPOINTS)} and NN one of "
+            f"{', '.join(map(str, PERCENTILES))}, e.g. next-question:p95=250"
+        )
+    return match["endpoint"], int(match["percentile"]), float(match["ms"])
+
+
+class _Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))  # endpoint -> status -> count
+
+    async def call(self, endpoint: str, request):
+        """Time a request; returns the response, or None if it failed to complete."""
+        started = time.perf_counter()
+        try:
+            response = await request
+        except Exception as e:
+            self.latencies[endpoint].append(time.perf_counter() - started)
+            self.errors[endpoint][type(e).__name__] += 1
+            return None
+        self.latencies[endpoint].append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors[endpoint][str(response.status_code)] += 1
+        return response
+
+    def summary(self) -> dict:
+        summary = {}
+        for endpoint in ENDPOINTS:
+            latencies = self.latencies[endpoint]
+            errors = sum(self.errors[endpoint].values())
+            summary[endpoint] = {
+                "requests": len(latencies),
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+                "errors": dict(self.errors[endpoint]),
+                "error_rate": round(errors / len(latencies), 4) if latencies else 0.0,
+            }
+        return summary
+
+
+async def _participant(client, experiment_id: int, number: int, args, stats: _Stats, rng: random.Random):
+    await asyncio.sleep(rng.uniform(0, args.ramp_seconds))
+    await participant(
+        client,
+        stats.call,
+        experiment_id,
+        f"launch{number}-{args.run_id}",
+        time.perf_counter() + args.session_seconds,
+        rng,
+        args.think_time,
+    )
+
+
+async def _over_quota(client, experiment_id: int) -> dict:
+    """Questions rated more often than the experiment asks for."""
+    target = (await client.get(f"/api/admin/experiments/{experiment_id}/stats")).json()["target_ratings_per_question"]
+    questions, excess, skip = 0, 0, 0
+    while True:
+        page = (
+            await client.get(
+                f"/api/admin/experiments/{experiment_id}/analytics/questions",
+                params={"sort": "num_ratings", "order": "desc", "limit": 500, "skip": skip},
+            )
+        ).json()
+        over = [item["num_ratings"] - target for item in page["items"] if item["num_ratings"] > target]
+        questions += len(over)
+        excess += sum(over)
+        if len(over) < len(page["items"]) or not page["items"]:
+            break
+        skip += len(page["items"])
+    under = (
+        await client.get(
+            f"/api/admin/experiments/{experiment_id}/analytics/questions",
+            params={"under_quota": "true", "limit": 1},
+        )
+    ).json()["total"]
+    return {"questions": questions, "extra_ratings": excess, "questions_under_quota": under}
+
+
+def _metric_sums(text: str, name: str) -> float:
+    """Sum of a metric's samples in /metrics output (all label sets)."""
+    total = 0.0
+    for line in text.splitlines():
+        if line.startswith(name + "{") or line.startswith(name + " "):
+            total += float(line.rsplit(" ", 1)[1])
+    return total
+
+
+async def _pool_wait(client) -> float:
+    response = await client.get("/metrics")
+    return _metric_sums(response.text, "db_pool_wait_seconds_sum") if response.status_code == 200 else 0.0
+
+
+async def _run(base_url: str, args, process=None) -> dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.raters, max_keepalive_connections=args.raters)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        await server.wait_healthy(client, process)
+        experiment_id = args.experiment_id or await create_experiment(
+            client, "launch load test", args.questions, args.ratings_per_question
+        )
+
+        stats = _Stats()
+        rng = random.Random(args.seed)
+        pool_wait_before = await _pool_wait(client)
+        started = time.perf_counter()
+        await asyncio.gather(
+            *[
+                _participant(client, experiment_id, i, args, stats, random.Random(rng.random()))
+                for i in range(args.raters)
+            ]
+        )
+        elapsed = time.perf_counter() - started
+
+        return {
+            "experiment_id": experiment_id,
+            "raters": args.raters,
+            "seconds": round(elapsed, 1),
+            "requests_per_second": round(sum(len(v) for v in stats.latencies.values()) / elapsed, 1),
+            "endpoints": stats.summary(),
+            "over_quota": await _over_quota(client, experiment_id),
+            # Busy responses: writers that waited out SQLITE_BUSY_TIMEOUT_MS
+            "database_busy": sum(stats.errors[endpoint].get("503", 0) for endpoint in ENDPOINTS),
+            # Only the worker that answers /metrics is counted
+            "pool_wait_seconds": round(await _pool_wait(client) - pool_wait_before, 3),
+        }
+
+
+def _check(result: dict, args) -> list:
+    failures = []
+    for endpoint, percentile, budget_ms in args.budget:
+        latency_ms = result["endpoints"][endpoint][f"p{percentile}_ms"]
+        if latency_ms > budget_ms:
+            failures.append(f"{endpoint} p{percentile} {latency_ms}ms > {budget_ms:g}ms")
+    for endpoint, summary in result["endpoints"].items():
+        if summary["error_rate"] > args.max_error_rate:
+            failures.append(f"{endpoint} error rate {summary['error_rate']:.2%} > {args.max_error_rate:.2%}")
+    over_quota = result["over_quota"]
+    if over_quota["extra_ratings"] > args.max_over_quota and over_quota["questions_under_quota"]:
+        failures.append(
+            f"{over_quota['extra_ratings']} ratings over quota > {args.max_over_quota} "
+            f"with {over_quota['questions_under_quota']} questions under quota"
+        )
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Server to test (default: start one on a scratch SQLite database)")
+    parser.add_argument("--experiment-id", type=int, help="Existing experiment to rate (with --url)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for the local server")
+    parser.add_argument("--questions", type=int, default=10_000, help="Questions in the created experiment")
+    parser.add_argument("--ratings-per-question", type=int, default=3, help="Quota of the created experiment")
+    parser.add_argument("--raters", type=int, default=200, help="Participants in the cohort")
+    parser.add_argument("--ramp-seconds", type=float, default=5.0, help="Window in which participants arrive")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean seconds spent on a question")
+    parser.add_argument("--session-seconds", type=float, default=30.0, help="How long each participant rates")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for arrivals, think times and answers")
+    parser.add_argument(
+        "--budget", type=_budget, action="append", default=[],
+        help="Latency budget, e.g. next-question:p95=250 (ms); repeatable",
+    )
+    parser.add_argument("--max-error-rate", type=float, default=0.0, help="Allowed error rate per endpoint")
+    parser.add_argument("--max-over-quota", type=int, default=0, help="Allowed ratings beyond the quota")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+    args.run_id = time.strftime("%Y%m%d%H%M%S")
+
+    if args.url:
+        result = asyncio.run(_run(args.url, args))
+    else:
+        workdir = tempfile.mkdtemp(prefix="launch_bench_")
+        try:
+            with server.run(server.scratch_env(workdir), args.workers) as (base_url, process):
+                result = asyncio.run(_run(base_url, args, process))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(
+        f"{args.raters} raters over {args.ramp_seconds:g}s, {args.think_time:g}s think time, "
+        f"{args.session_seconds:g}s sessions: {result['requests_per_second']} req/s for {result['seconds']}s"
+    )
+    print(f"{'endpoint':14} {'requests':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7}")
+    for endpoint, summary in result["endpoints"].items():
+        errors = ", ".join(f"{count} x {status}" for status, count in sorted(summary["errors"].items()))
+        print(
+            f"{endpoint:14} {summary['requests']:8d} {summary['p50_ms']:7.1f}ms {summary['p95_ms']:7.1f}ms "
+            f"{summary['p99_ms']:7.1f}ms {summary['error_rate']:7.2%}  {errors}"
+        )
+    print(
+        f"Over quota: {result['over_quota']['extra_ratings']} ratings on {result['over_quota']['questions']} questions, "
+        f"{result['over_quota']['questions_under_quota']} questions under quota; "
+        f"database busy (503): {result['database_busy']}; pool wait: {result['pool_wait_seconds']}s"
+    )
+
+    failures = _check(result, args)
+    result["failures"] = failures
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        return 1
+    if args.budget or args.max_error_rate or args.max_over_quota:
+        print("PASS")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
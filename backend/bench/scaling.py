@@ -0,0 +1,95 @@
+"""Rater throughput by number of worker processes.
+
+For each worker count, starts the app with `uvicorn --workers N` on a fresh
+SQLite database (after `manage.py release`, as in production), uploads an
+experiment and runs concurrent simulated raters that fetch and submit
+questions until the time is up, then end their sessions. Afterwards the analytics summaries are
+checked against the raw ratings, so lost or double-counted writes show up as
+a failure rather than as better throughput.
+
+Requires httpx (requirements-dev.txt). Usage (from the backend directory):
+    python -m bench.scaling [--workers 1 2 4] [--raters 32] [--seconds 10]
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from bench import server
+from bench._common import create_experiment, participant, percentile
+
+NUM_QUESTIONS = 5000
+
+
+async def _rater(client, experiment_id: int, number: int, deadline: float, latencies, errors):
+    async def call(endpoint, request):
+        started = time.perf_counter()
+        try:
+            response = await request
+        except Exception as e:
+            errors.append(f"{endpoint} {type(e).__name__}")
+            return None
+        finally:
+            latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors.append(f"{endpoint} {response.status_code}")
+        return response
+
+    await participant(client, call, experiment_id, f"bench{number}", deadline, random.Random(number))
+
+
+async def _run(workers: int, raters: int, seconds: float) -> dict:
+    import httpx
+
+    workdir = tempfile.mkdtemp(prefix="scaling_bench_")
+    env = server.scratch_env(workdir)
+    with server.run(env, workers) as (base_url, process):
+        limits = httpx.Limits(max_connections=raters, max_keepalive_connections=raters)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            await server.wait_healthy(client, process)
+            experiment_id = await create_experiment(client, "scaling", NUM_QUESTIONS, 5)
+
+            latencies, errors = [], []
+            started = time.perf_counter()
+            deadline = started + seconds
+            await asyncio.gather(
+                *[_rater(client, experiment_id, i, deadline, latencies, errors) for i in range(raters)]
+            )
+            elapsed = time.perf_counter() - started
+
+    check = server.manage(env, "rebuild-analytics", "--check")
+    shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "requests_per_second": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "errors": errors,
+        "consistent": check.returncode == 0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to compare")
+    parser.add_argument("--raters", type=int, default=32, help="Concurrent simulated raters")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Duration of each run")
+    args = parser.parse_args(argv)
+
+    print(f"{args.raters} raters, {args.seconds:g}s per run, {os.cpu_count()} CPUs")
+    print(f"{'workers':>7} {'req/s':>8} {'p50':>9} {'p95':>9} {'errors':>7}  summaries")
+    for workers in args.workers:
+        result = asyncio.run(_run(workers, args.raters, args.seconds))
+        print(
+            f"{workers:7d} {result['requests_per_second']:8.0f} {result['p50_ms']:7.1f}ms "
+            f"{result['p95_ms']:7.1f}ms {len(result['errors']):7d}  "
+            f"{'match ratings' if result['consistent'] else 'MISMATCH'}"
+        )
+        for error in sorted(set(result["errors"]))[:5]:
+            print(f"        {error}")
+
+
+if __name__ == "__main__":
+    main()
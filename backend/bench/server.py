@@ -0,0 +1,75 @@
+"""Running the app in a subprocess for the HTTP benchmarks.
+
+The server gets a scratch SQLite database and upload directory under
+workdir, set up with `manage.py release` as in production, and is started
+with `uvicorn --workers N`.
+"""
+from contextlib import contextmanager
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def scratch_env(workdir: str, **overrides) -> dict:
+    """Environment for a server (and manage.py) using a database in workdir."""
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        UPLOAD_SPOOL_DIR=os.path.join(workdir, "uploads"),
+        MIGRATE_ON_STARTUP="0",
+        SESSION_TOKEN_SECRET="bench",
+        ASSIGNMENT_RESYNC_SECONDS="5",
+    )
+    env.update(overrides)
+    return env
+
+
+def manage(env: dict, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "manage.py", *args], cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+
+
+@contextmanager
+def run(env: dict, workers: int = 1):
+    """Release and start a server; yields (base_url, process)."""
+    release = manage(env, "release")
+    if release.returncode != 0:
+        raise RuntimeError(f"manage.py release failed:\n{release.stderr}")
+    port = free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--port", str(port), "--workers", str(workers), "--log-level", "warning", "--no-access-log",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    try:
+        yield f"http://127.0.0.1:{port}", process
+    finally:
+        process.terminate()
+        process.wait()
+
+
+async def wait_healthy(client, process=None):
+    for _ in range(200):
+        if process is not None and process.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("Server didn't become healthy")
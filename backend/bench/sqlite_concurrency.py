@@ -0,0 +1,201 @@
+"""Concurrent read/write throughput on SQLite, before and after tuning.
+
+Runs the same workload against two fresh database files: one with the old
+connection setup (rollback journal, only foreign keys enabled) and one with
+database.SQLITE_PRAGMAS. Writer threads submit ratings the way the submit
+endpoint does (insert the rating and bump the question's rating_count in
+one transaction) while reader threads run session-status and analytics-page
+style reads.
+
+Usage (from the backend directory):
+    python -m bench.sqlite_concurrency [--writers 4] [--readers 8] [--seconds 5]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# The app engines aren't used; keep them off the real database
+_workdir = tempfile.mkdtemp(prefix="sqlite_bench_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_workdir, 'unused.db')}")
+
+from sqlalchemy import create_engine, event, func, insert, select, update  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from database import Base, set_sqlite_pragmas  # noqa: E402
+from models import Experiment, Question, Rater, Rating  # noqa: E402
+
+NUM_QUESTIONS = 2000
+
+
+def _untuned_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def _make_engine(path: str, tuned: bool):
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False},
+        pool_size=32,
+        max_overflow=0,
+    )
+    event.listen(engine, "connect", set_sqlite_pragmas if tuned else _untuned_pragmas)
+    return engine
+
+
+def _seed(engine, num_raters: int):
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        experiment = Experiment(name="bench", num_ratings_per_question=3)
+        db.add(experiment)
+        db.flush()
+        db.execute(
+            insert(Question),
+            [
+                {"experiment_id": experiment.id, "question_id": f"q{i}", "question_text": f"Question {i}"}
+                for i in range(NUM_QUESTIONS)
+            ],
+        )
+        raters = [
+            Rater(prolific_id=f"p{i}", experiment_id=experiment.id, session_start=datetime.utcnow())
+            for i in range(num_raters)
+        ]
+        db.add_all(raters)
+        db.commit()
+        question_ids = list(db.scalars(select(Question.id).order_by(Question.id)))
+        return experiment.id, [rater.id for rater in raters], question_ids
+
+
+class _Counter:
+    def __init__(self):
+        self.ops = 0
+        self.errors = 0
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.ops += 1
+            self.latencies.append(seconds)
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def _writer(Session, rater_id, question_ids, deadline, counter):
+    for question_id in question_ids:
+        if time.perf_counter() >= deadline:
+            return
+        started = time.perf_counter()
+        try:
+            with Session() as db:
+                db.execute(
+                    insert(Rating).values(
+                        question_id=question_id,
+                        rater_id=rater_id,
+                        answer="A",
+                        confidence=3,
+                        time_started=datetime.utcnow(),
+                        time_submitted=datetime.utcnow(),
+                    )
+                )
+                db.execute(
+                    update(Question)
+                    .where(Question.id == question_id)
+                    .values(rating_count=Question.rating_count + 1)
+                )
+                db.commit()
+        except OperationalError:
+            counter.error()
+            continue
+        counter.record(time.perf_counter() - started)
+
+
+def _reader(Session, experiment_id, rater_ids, deadline, counter):
+    i = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            with Session() as db:
+                db.scalar(select(func.count(Rating.id)).where(Rating.rater_id == rater_ids[i % len(rater_ids)]))
+                db.execute(
+                    select(Question.id, Question.rating_count)
+                    .where(Question.experiment_id == experiment_id)
+                    .order_by(Question.id)
+                    .limit(50)
+                    .offset((i * 50) % NUM_QUESTIONS)
+                ).all()
+        except OperationalError:
+            counter.error()
+            continue
+        counter.record(time.perf_counter() - started)
+        i += 1
+
+
+def run(tuned: bool, writers: int, readers: int, seconds: float) -> dict:
+    path = os.path.join(_workdir, f"{'tuned' if tuned else 'untuned'}.db")
+    engine = _make_engine(path, tuned)
+    experiment_id, rater_ids, question_ids = _seed(engine, writers)
+    Session = sessionmaker(bind=engine)
+
+    writes, reads = _Counter(), _Counter()
+    deadline = time.perf_counter() + seconds
+    threads = [
+        threading.Thread(target=_writer, args=(Session, rater_id, question_ids, deadline, writes))
+        for rater_id in rater_ids
+    ] + [
+        threading.Thread(target=_reader, args=(Session, experiment_id, rater_ids, deadline, reads))
+        for _ in range(readers)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    engine.dispose()
+
+    return {
+        "writes_per_second": writes.ops / elapsed,
+        "reads_per_second": reads.ops / elapsed,
+        "write_p95_ms": writes.percentile(0.95) * 1000,
+        "read_p95_ms": reads.percentile(0.95) * 1000,
+        "errors": writes.errors + reads.errors,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=4, help="Concurrent rating submitters")
+    parser.add_argument("--readers", type=int, default=8, help="Concurrent readers")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each run")
+    args = parser.parse_args(argv)
+
+    print(f"{args.writers} writers, {args.readers} readers, {args.seconds:g}s per run")
+    print(f"{'':10} {'writes/s':>10} {'reads/s':>10} {'write p95':>10} {'read p95':>10} {'errors':>7}")
+    for tuned in (False, True):
+        result = run(tuned, args.writers, args.readers, args.seconds)
+        print(
+            f"{'tuned' if tuned else 'untuned':10} "
+            f"{result['writes_per_second']:10.0f} {result['reads_per_second']:10.0f} "
+            f"{result['write_p95_ms']:8.1f}ms {result['read_p95_ms']:8.1f}ms {result['errors']:7d}"
+        )
+    shutil.rmtree(_workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Cache for experiment config and question ownership.
+
+Rater endpoints need an experiment's settings (name, completion URL, ratings
+per question) and, on submit, which experiment a question belongs to. Both
+are fixed once created, so they are cached instead of queried on every
+request. Entries are removed when an experiment is deleted or a failed
+upload removes its questions, since SQLite may reuse the deleted ids.
+
+The default backend is a process-local TTL/LRU cache. Invalidations only
+reach the worker that made them, so with several workers another worker can
+serve a deleted experiment until its entry expires; the TTL is kept short,
+and rater endpoints that hit a foreign-key error on a stale entry drop it.
+Set CACHE_URL to a redis:// URL (requires the redis package) to share one
+cache, and its invalidations, between workers; RedisCache accepts any client
+with the redis-py get/mget/set/delete interface, e.g. fakeredis. Its calls
+block, so the async lookups run them in the threadpool.
+"""
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+from models import Experiment, Question
+
+logger = logging.getLogger(__name__)
+
+CACHE_URL = os.getenv("CACHE_URL")
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "100000"))
+
+# Keys per Redis DELETE
+REDIS_DELETE_BATCH = 1000
+
+
+class LocalCache:
+    """Thread-safe in-process cache; least recently used entries are evicted first."""
+
+    # Lookups don't do I/O, so async code calls them directly
+    blocking = False
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl_seconds: int = CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get_many(self, keys: List[str]) -> list:
+        return [self.get(key) for key in keys]
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def set_many(self, items: Dict[str, object]):
+        for key, value in items.items():
+            self.set(key, value)
+
+    def delete(self, keys: Iterable[str]):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache:
+    """Cache stored in Redis (or anything speaking its API), as JSON."""
+
+    blocking = True
+
+    def __init__(self, client, ttl_seconds: int = CACHE_TTL_SECONDS, prefix: str = "rating_platform:"):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def get_many(self, keys: List[str]) -> list:
+        if not keys:
+            return []
+        values = []
+        for raw in self.client.mget([self.prefix + key for key in keys]):
+            if raw is None:
+                self.misses += 1
+                values.append(None)
+            else:
+                self.hits += 1
+                values.append(json.loads(raw))
+        return values
+
+    def set(self, key: str, value):
+        self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl_seconds)
+
+    def set_many(self, items: Dict[str, object]):
+        pipeline = self.client.pipeline()
+        for key, value in items.items():
+            pipeline.set(self.prefix + key, json.dumps(value), ex=self.ttl_seconds)
+        pipeline.execute()
+
+    def delete(self, keys: Iterable[str]):
+        keys = [self.prefix + key for key in keys]
+        for start in range(0, len(keys), REDIS_DELETE_BATCH):
+            self.client.delete(*keys[start:start + REDIS_DELETE_BATCH])
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        for start in range(0, len(keys), REDIS_DELETE_BATCH):
+            self.client.delete(*keys[start:start + REDIS_DELETE_BATCH])
+
+
+def _from_env():
+    if not CACHE_URL:
+        return LocalCache()
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError("CACHE_URL requires the redis package to be installed")
+    logger.info("Using Redis cache")
+    return RedisCache(redis.Redis.from_url(CACHE_URL))
+
+
+cache = _from_env()
+
+metrics.Counter("cache_hits", "Cache lookups answered from the cache", function=lambda: cache.hits)
+metrics.Counter("cache_misses", "Cache lookups that went to the database", function=lambda: cache.misses)
+
+
+class ExperimentConfig(NamedTuple):
+    """The settings rater endpoints read from an Experiment."""
+
+    id: int
+    name: str
+    num_ratings_per_question: int
+    prolific_completion_url: Optional[str]
+
+
+def _experiment_key(experiment_id: int) -> str:
+    return f"experiment:{experiment_id}"
+
+
+def _question_key(question_id: int) -> str:
+    return f"question_experiment:{question_id}"
+
+
+async def run(method, *args):
+    """Call a cache method or function from async code without blocking the event loop."""
+    if cache.blocking:
+        return await run_in_threadpool(method, *args)
+    return method(*args)
+
+
+async def get_experiment(db: AsyncSession, experiment_id: int) -> Optional[ExperimentConfig]:
+    cached = await run(cache.get, _experiment_key(experiment_id))
+    if cached is not None:
+        return ExperimentConfig(*cached)
+
+    row = (
+        await db.execute(
+            select(
+                Experiment.id,
+                Experiment.name,
+                Experiment.num_ratings_per_question,
+                Experiment.prolific_completion_url,
+            ).where(Experiment.id == experiment_id)
+        )
+    ).first()
+    if row is None:
+        return None
+    config = ExperimentConfig(*row)
+    await run(cache.set, _experiment_key(experiment_id), list(config))
+    return config
+
+
+async def get_question_experiments(db: AsyncSession, question_ids: Iterable[int]) -> Dict[int, int]:
+    """Map each existing question id to its experiment id; unknown ids are left out."""
+    question_ids = list(question_ids)
+    found = {}
+    missing: List[int] = []
+    cached = await run(cache.get_many, [_question_key(question_id) for question_id in question_ids])
+    for question_id, experiment_id in zip(question_ids, cached):
+        if experiment_id is None:
+            missing.append(question_id)
+        else:
+            found[question_id] = experiment_id
+
+    if missing:
+        rows = (
+            await db.execute(
+                select(Question.id, Question.experiment_id).where(Question.id.in_(missing))
+            )
+        ).all()
+        for question_id, experiment_id in rows:
+            found[question_id] = experiment_id
+        if rows:
+            await run(
+                cache.set_many,
+                {_question_key(question_id): experiment_id for question_id, experiment_id in rows},
+            )
+    return found
+
+
+def invalidate_experiment(experiment_id: int, question_ids: Iterable[int] = ()):
+    """Forget a deleted experiment and its questions."""
+    cache.delete([_experiment_key(experiment_id)])
+    invalidate_questions(question_ids)
+
+
+def invalidate_questions(question_ids: Iterable[int]):
+    cache.delete([_question_key(question_id) for question_id in question_ids])
@@ -1,8 +1,64 @@
-from sqlalchemy import create_engine, event
+from sqlalchemy import Select, create_engine, event
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from typing import Callable, List, Union
 import os
 
+import metrics
+
+# Connection pool settings, for every backend (file-based SQLite pools
+# connections too). The sync and async engines each keep their own pool, so
+# a process can hold up to twice DB_POOL_SIZE + DB_MAX_OVERFLOW connections.
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds to wait for a connection
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Seconds before a connection is replaced
+
+# Applied to every SQLite connection. WAL lets readers run alongside a
+# writer, and with synchronous=NORMAL a commit only fsyncs at checkpoints;
+# busy_timeout makes a writer wait for the lock instead of failing with
+# "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # Negative values are in KiB
+    "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024))),
+    "foreign_keys": "ON",
+}
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def _pool_options(database_url, label: str) -> dict:
+    """The dialect's default pool class, recording checkout waits for /metrics,
+    and the DB_POOL_* settings (unless it is in-memory SQLite's single
+    connection pool, which takes none)."""
+    url = make_url(database_url)
+    pool_class = url.get_dialect().get_pool_class(url)
+    options = {"poolclass": metrics.timed_pool_class(pool_class, label)}
+    if issubclass(pool_class, QueuePool):
+        options.update(
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+            pool_recycle=POOL_RECYCLE,
+        )
+    return options
+
+
 # Get database URL from environment variable, or use SQLite as default
 DATABASE_URL = os.getenv("DATABASE_URL")
 
@@ -14,7 +70,6 @@ if DATABASE_URL:
     elif DATABASE_URL.startswith("mysql://"):
         # MySQL: use pymysql driver if not specified
         DATABASE_URL = DATABASE_URL.replace("mysql://", "mysql+pymysql://", 1)
-    engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 else:
     # Default to SQLite for local development
     # Use /data on Render (persistent disk), otherwise local data folder
@@ -25,22 +80,83 @@ else:
         os.makedirs(DATABASE_DIR, exist_ok=True)
 
     DATABASE_URL = f"sqlite:///{os.path.join(DATABASE_DIR, 'rating_platform.db')}"
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-
-    # Enable foreign key support for SQLite
-    @event.listens_for(engine, "connect")
-    def set_sqlite_pragma(dbapi_connection, connection_record):
-        cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON")
-        cursor.close()
+
+# Async drivers for the rater endpoints, by backend
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+    "mysql": "aiomysql",
+}
+
+url = make_url(DATABASE_URL)
+ASYNC_DATABASE_URL = url.set(drivername=f"{url.get_backend_name()}+{ASYNC_DRIVERS[url.get_backend_name()]}")
+
+if url.get_backend_name() == "sqlite":
+    engine = create_engine(
+        DATABASE_URL, connect_args={"check_same_thread": False}, **_pool_options(DATABASE_URL, "sync")
+    )
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_options(ASYNC_DATABASE_URL, "async"))
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+else:
+    engine = create_engine(DATABASE_URL, pool_pre_ping=True, **_pool_options(DATABASE_URL, "sync"))
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL, pool_pre_ping=True, **_pool_options(ASYNC_DATABASE_URL, "async")
+    )
+
+metrics.instrument_engine(engine, "sync")
+metrics.instrument_engine(async_engine.sync_engine, "async")
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: attributes can't be lazily reloaded in async code
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
 
+def _insert_rows(insert_class, model, rows: Union[List[dict], Select]):
+    if isinstance(rows, Select):
+        return insert_class(model).from_select(list(rows.selected_columns.keys()), rows)
+    return insert_class(model).values(rows)
+
+
+def upsert(dialect_name: str, model, rows: Union[List[dict], Select], key: List[str], values: Callable):
+    """One INSERT for all rows that updates those whose key already exists.
+
+    rows is a list of row dicts, or a SELECT whose columns are labelled with
+    the column names. values(current, new) returns the SET clause by column
+    name, from the table's columns and the proposed row (excluded /
+    inserted), e.g. lambda current, new: {"expires_at": new.expires_at}. Keys
+    must be unique within rows.
+    """
+    if dialect_name == "mysql":
+        statement = _insert_rows(mysql_insert, model, rows)
+        return statement.on_duplicate_key_update(values(model.__table__.c, statement.inserted))
+    statement = _insert_rows(postgresql_insert if dialect_name == "postgresql" else sqlite_insert, model, rows)
+    return statement.on_conflict_do_update(
+        index_elements=key, set_=values(model.__table__.c, statement.excluded)
+    )
+
+
+def insert_missing(dialect_name: str, model, rows: List[dict], key: List[str]):
+    """One INSERT for all rows that skips those whose key already exists."""
+    if dialect_name == "mysql":
+        statement = mysql_insert(model).values(rows)
+        # A no-op update; INSERT IGNORE would also hide other errors
+        return statement.on_duplicate_key_update({key[0]: statement.inserted[key[0]]})
+    statement = (postgresql_insert if dialect_name == "postgresql" else sqlite_insert)(model).values(rows)
+    return statement.on_conflict_do_nothing(index_elements=key)
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
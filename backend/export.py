@@ -0,0 +1,356 @@
+"""Streaming export of an experiment's ratings.
+
+Ratings are read in keyset-paginated batches and written incrementally in one
+of several formats:
+
+- csv: the original flat layout, one row per rating
+- jsonl: one JSON object per rating
+- parquet / arrow: typed columnar output (Arrow IPC stream for "arrow");
+  requires pyarrow
+
+With normalized=True the output is a zip archive holding a questions table
+and a ratings table keyed by question_key, instead of repeating question text
+and ground truth on every rating.
+"""
+from datetime import datetime
+import csv
+import io
+import json
+import zipfile
+
+from sqlalchemy.orm import Session
+
+import question_bodies
+from models import Question, Rater, Rating
+
+EXPORT_BATCH_SIZE = 1000
+PARQUET_ROW_GROUP_ROWS = 50000
+
+FORMATS = ("csv", "jsonl", "parquet", "arrow")
+COLUMNAR_FORMATS = ("parquet", "arrow")
+
+FILE_EXTENSIONS = {"csv": "csv", "jsonl": "jsonl", "parquet": "parquet", "arrow": "arrows"}
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# (name, Arrow type) per table
+RATING_COLUMNS = [
+    ("rating_id", "int64"),
+    ("question_id", "string"),
+    ("question_text", "string"),
+    ("gt_answer", "string"),
+    ("rater_prolific_id", "string"),
+    ("rater_study_id", "string"),
+    ("rater_session_id", "string"),
+    ("answer", "string"),
+    ("confidence", "int8"),
+    ("time_started", "timestamp"),
+    ("time_submitted", "timestamp"),
+    ("response_time_seconds", "float64"),
+]
+NORMALIZED_RATING_COLUMNS = [
+    ("rating_id", "int64"),
+    ("question_key", "int64"),
+    ("rater_prolific_id", "string"),
+    ("rater_study_id", "string"),
+    ("rater_session_id", "string"),
+    ("answer", "string"),
+    ("confidence", "int8"),
+    ("time_started", "timestamp"),
+    ("time_submitted", "timestamp"),
+    ("response_time_seconds", "float64"),
+]
+QUESTION_COLUMNS = [
+    ("question_key", "int64"),
+    ("question_id", "string"),
+    ("question_text", "string"),
+    ("gt_answer", "string"),
+    ("options", "string"),
+    ("question_type", "string"),
+    ("metadata", "string"),
+]
+
+
+class ExportFormatUnavailable(Exception):
+    """The requested format needs an optional dependency that isn't installed."""
+
+
+def _rating_batches(db: Session, experiment_id: int, *columns):
+    """Yield an experiment's ratings in id order, one batch at a time.
+
+    Uses keyset pagination on Rating.id so each batch is an index range scan
+    rather than an OFFSET that rescans all previous rows, and selects only
+    the given columns (after Rating.id) instead of full ORM entities.
+    """
+    last_id = 0
+    while True:
+        batch = (
+            db.query(Rating.id, *columns)
+            .join(Question, Rating.question_id == Question.id)
+            .join(Rater, Rating.rater_id == Rater.id)
+            .filter(Question.experiment_id == experiment_id, Rating.id > last_id)
+            .order_by(Rating.id)
+            .limit(EXPORT_BATCH_SIZE)
+            .all()
+        )
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1][0]
+
+
+def _question_batches(db: Session, experiment_id: int):
+    last_id = 0
+    while True:
+        batch = (
+            db.query(
+                Question.id,
+                Question.question_id,
+                Question.question_text,
+                Question.gt_answer,
+                Question.options,
+                Question.question_type,
+                Question.extra_data,
+                Question.text_hash,
+                Question.extra_data_hash,
+            )
+            .filter(Question.experiment_id == experiment_id, Question.id > last_id)
+            .order_by(Question.id)
+            .limit(EXPORT_BATCH_SIZE)
+            .all()
+        )
+        if not batch:
+            return
+        bodies = question_bodies.load(
+            db, [row.text_hash for row in batch] + [row.extra_data_hash for row in batch]
+        )
+        yield [
+            (
+                row.id,
+                row.question_id,
+                question_bodies.full_text(bodies, row.text_hash, row.question_text),
+                row.gt_answer,
+                row.options,
+                row.question_type,
+                question_bodies.full_text(bodies, row.extra_data_hash, row.extra_data),
+            )
+            for row in batch
+        ]
+        last_id = batch[-1][0]
+
+
+def _response_time(time_started: datetime, time_submitted: datetime) -> float:
+    return (time_submitted - time_started).total_seconds()
+
+
+def _denormalized_ratings(db: Session, experiment_id: int):
+    for batch in _rating_batches(
+        db,
+        experiment_id,
+        Question.question_id,
+        Question.question_text,
+        Question.gt_answer,
+        Rater.prolific_id,
+        Rater.study_id,
+        Rater.session_id,
+        Rating.answer,
+        Rating.confidence,
+        Rating.time_started,
+        Rating.time_submitted,
+        Question.text_hash,
+    ):
+        bodies = question_bodies.load(db, [row.text_hash for row in batch])
+        yield [
+            (row[0], row.question_id, question_bodies.full_text(bodies, row.text_hash, row.question_text))
+            + tuple(row[3:-1])
+            + (_response_time(row.time_started, row.time_submitted),)
+            for row in batch
+        ]
+
+
+def _normalized_ratings(db: Session, experiment_id: int):
+    for batch in _rating_batches(
+        db,
+        experiment_id,
+        Rating.question_id,
+        Rater.prolific_id,
+        Rater.study_id,
+        Rater.session_id,
+        Rating.answer,
+        Rating.confidence,
+        Rating.time_started,
+        Rating.time_submitted,
+    ):
+        yield [tuple(row) + (_response_time(row[-2], row[-1]),) for row in batch]
+
+
+class _Sink:
+    """Write-only file object whose contents are drained as the response streams."""
+
+    def __init__(self):
+        self._chunks = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class _CsvWriter:
+    def __init__(self, f, columns):
+        self._f = f
+        self._write([[name for name, _ in columns]])
+
+    def _write(self, rows):
+        output = io.StringIO()
+        csv.writer(output).writerows(rows)
+        self._f.write(output.getvalue().encode("utf-8"))
+
+    def write(self, rows):
+        self._write(
+            [
+                [
+                    value.isoformat() if isinstance(value, datetime)
+                    else round(value, 2) if isinstance(value, float)
+                    else "" if value is None
+                    else value
+                    for value in row
+                ]
+                for row in rows
+            ]
+        )
+
+    def close(self):
+        pass
+
+
+class _JsonlWriter:
+    def __init__(self, f, columns):
+        self._f = f
+        self._names = [name for name, _ in columns]
+
+    def write(self, rows):
+        lines = [
+            json.dumps(
+                {
+                    name: value.isoformat() if isinstance(value, datetime) else value
+                    for name, value in zip(self._names, row)
+                }
+            )
+            for row in rows
+        ]
+        self._f.write(("\n".join(lines) + "\n").encode("utf-8"))
+
+    def close(self):
+        pass
+
+
+class _ArrowWriter:
+    """Arrow IPC stream or Parquet file, written in row groups."""
+
+    def __init__(self, f, columns, fmt: str):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ExportFormatUnavailable(f"The {fmt} format requires pyarrow to be installed")
+
+        self._pa = pa
+        types = {
+            "int64": pa.int64(),
+            "int8": pa.int8(),
+            "float64": pa.float64(),
+            "string": pa.string(),
+            "timestamp": pa.timestamp("us"),
+        }
+        self._schema = pa.schema([(name, types[type_name]) for name, type_name in columns])
+        self._pending = []
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(f, self._schema, compression="zstd")
+            self._group_rows = PARQUET_ROW_GROUP_ROWS
+        else:
+            self._writer = pa.ipc.new_stream(f, self._schema)
+            self._group_rows = EXPORT_BATCH_SIZE
+
+    def _flush(self):
+        if self._pending:
+            columns = list(zip(*self._pending))
+            self._writer.write_table(self._pa.Table.from_arrays(
+                [self._pa.array(column, type=field.type) for column, field in zip(columns, self._schema)],
+                schema=self._schema,
+            ))
+            self._pending = []
+
+    def write(self, rows):
+        self._pending.extend(rows)
+        if len(self._pending) >= self._group_rows:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+def _writer(fmt: str, f, columns):
+    if fmt == "csv":
+        return _CsvWriter(f, columns)
+    if fmt == "jsonl":
+        return _JsonlWriter(f, columns)
+    return _ArrowWriter(f, columns, fmt)
+
+
+def check_format(fmt: str):
+    """Raise ExportFormatUnavailable before streaming starts if fmt can't be written."""
+    if fmt in COLUMNAR_FORMATS:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportFormatUnavailable(f"The {fmt} format requires pyarrow to be installed")
+
+
+def stream_ratings(db: Session, experiment_id: int, fmt: str):
+    """Yield one rating per row, with question and rater fields inlined."""
+    sink = _Sink()
+    writer = _writer(fmt, sink, RATING_COLUMNS)
+    yield sink.drain()
+    for rows in _denormalized_ratings(db, experiment_id):
+        writer.write(rows)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def stream_normalized(db: Session, experiment_id: int, fmt: str):
+    """Yield a zip archive with separate questions and ratings tables."""
+    sink = _Sink()
+    extension = FILE_EXTENSIONS[fmt]
+    # Parquet is already compressed
+    compression = zipfile.ZIP_STORED if fmt == "parquet" else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(sink, "w", compression=compression) as archive:
+        for name, columns, batches in (
+            ("questions", QUESTION_COLUMNS, _question_batches(db, experiment_id)),
+            ("ratings", NORMALIZED_RATING_COLUMNS, _normalized_ratings(db, experiment_id)),
+        ):
+            with archive.open(f"{name}.{extension}", "w", force_zip64=True) as entry:
+                writer = _writer(fmt, entry, columns)
+                for rows in batches:
+                    writer.write(rows)
+                    yield sink.drain()
+                writer.close()
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,190 @@
+"""Background ingestion of question CSV uploads.
+
+The upload endpoint spools the file to disk and records an Upload row as a
+pending job; a small thread pool then parses and inserts the questions.
+Each chunk is committed together with the job's progress, so progress is
+visible to any worker and rater writes aren't blocked for the whole import.
+A failed job deletes the questions it inserted.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import codecs
+import csv
+import logging
+import os
+import tempfile
+import time
+
+from sqlalchemy import delete, insert, select, update
+
+import cache
+import question_bodies
+from assignment import assignments
+from database import SessionLocal
+from models import Question, Upload
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_ROWS = 1000  # Questions per bulk insert
+REQUIRED_FIELDS = ["question_id", "question_text"]
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+UPLOAD_SPOOL_DIR = os.getenv(
+    "UPLOAD_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "rating_platform_uploads")
+)
+
+# Upload.status values
+PENDING = "pending"
+PROCESSING = "processing"
+COMPLETED = "completed"
+FAILED = "failed"
+
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+
+
+class IngestError(Exception):
+    """The uploaded file can't be ingested; the message is shown to the admin."""
+
+
+def spool_path(upload_id: int) -> str:
+    os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+    return os.path.join(UPLOAD_SPOOL_DIR, f"upload_{upload_id}.csv")
+
+
+def open_reader(f) -> csv.DictReader:
+    """Parse a binary file as UTF-8 CSV, decoding line by line."""
+    return csv.DictReader(codecs.iterdecode(f, "utf-8"))
+
+
+def check_header(reader: csv.DictReader):
+    try:
+        fieldnames = reader.fieldnames
+    except UnicodeDecodeError:
+        raise IngestError("File must be UTF-8 encoded")
+    except csv.Error as e:
+        raise IngestError(f"Invalid CSV: {e}")
+    # An empty file has no header and simply yields no questions
+    if fieldnames is not None:
+        for field in REQUIRED_FIELDS:
+            if field not in fieldnames:
+                raise IngestError(f"Missing required field: {field}")
+
+
+def _question_rows(experiment_id: int, upload_id: int, reader: csv.DictReader):
+    for row in reader:
+        # Short rows leave the missing columns as None
+        for field in REQUIRED_FIELDS:
+            if not row.get(field):
+                raise IngestError(f"Line {reader.line_num}: missing {field}")
+        yield {
+            "experiment_id": experiment_id,
+            "upload_id": upload_id,
+            "question_id": row["question_id"],
+            "question_text": row["question_text"],
+            "gt_answer": row.get("gt_answer", ""),
+            "options": row.get("options", ""),
+            "question_type": row.get("question_type", "MC"),
+            "extra_data": row.get("metadata", "{}"),
+        }
+
+
+def _insert_chunk(db, upload_id: int, chunk, rows_processed: int, started: float):
+    if chunk:
+        if question_bodies.QUESTION_BODY_STORE:
+            chunk = question_bodies.store_rows(db, chunk)
+        db.execute(insert(Question), chunk)
+    duration = time.perf_counter() - started
+    db.execute(
+        update(Upload)
+        .where(Upload.id == upload_id)
+        .values(
+            rows_processed=rows_processed,
+            duration_seconds=round(duration, 3),
+            rows_per_second=round(rows_processed / duration, 1) if duration > 0 else None,
+        )
+    )
+    db.commit()
+
+
+def run_upload(upload_id: int, experiment_id: int, path: str):
+    """Ingest a spooled CSV file for an Upload job."""
+    db = SessionLocal()
+    rows_processed = 0
+    try:
+        db.execute(update(Upload).where(Upload.id == upload_id).values(status=PROCESSING))
+        db.commit()
+
+        started = time.perf_counter()
+        with open(path, "rb") as f:
+            reader = open_reader(f)
+            check_header(reader)
+            chunk = []
+            try:
+                for row in _question_rows(experiment_id, upload_id, reader):
+                    chunk.append(row)
+                    if len(chunk) == UPLOAD_CHUNK_ROWS:
+                        rows_processed += len(chunk)
+                        _insert_chunk(db, upload_id, chunk, rows_processed, started)
+                        chunk = []
+            except UnicodeDecodeError:
+                raise IngestError(f"File must be UTF-8 encoded (after {rows_processed} rows)")
+            except csv.Error as e:
+                raise IngestError(f"Invalid CSV after {rows_processed} rows: {e}")
+            rows_processed += len(chunk)
+            _insert_chunk(db, upload_id, chunk, rows_processed, started)
+
+        db.execute(
+            update(Upload)
+            .where(Upload.id == upload_id)
+            .values(status=COMPLETED, question_count=rows_processed, completed_at=datetime.utcnow())
+        )
+        db.commit()
+        logger.info(f"Uploaded {rows_processed} questions to experiment {experiment_id} (upload {upload_id})")
+    except Exception as e:
+        db.rollback()
+        if isinstance(e, IngestError):
+            error = str(e)
+            logger.warning(f"Upload {upload_id} rejected: {error}")
+        else:
+            error = "Internal error while importing questions"
+            logger.error(f"Upload {upload_id} failed: {e}", exc_info=True)
+        fail_upload(db, upload_id, error)
+    finally:
+        db.close()
+        assignments.invalidate(experiment_id)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def fail_upload(db, upload_id: int, error: str):
+    """Mark a job failed and remove the questions it had inserted."""
+    question_ids = list(db.scalars(select(Question.id).where(Question.upload_id == upload_id)))
+    body_hashes = question_bodies.question_hashes(db, Question.upload_id == upload_id)
+    db.execute(delete(Question).where(Question.upload_id == upload_id))
+    question_bodies.prune(db, body_hashes)
+    db.execute(
+        update(Upload)
+        .where(Upload.id == upload_id)
+        .values(status=FAILED, error=error, question_count=0, completed_at=datetime.utcnow())
+    )
+    db.commit()
+    # Their ids may be reused by the next upload
+    cache.invalidate_questions(question_ids)
+
+
+def submit_upload(upload_id: int, experiment_id: int, path: str):
+    _executor.submit(run_upload, upload_id, experiment_id, path)
+
+
+def fail_interrupted_uploads(db):
+    """Fail jobs left pending or processing by a previous process."""
+    interrupted = (
+        db.query(Upload.id)
+        .filter(Upload.status.in_([PENDING, PROCESSING]))
+        .all()
+    )
+    for (upload_id,) in interrupted:
+        fail_upload(db, upload_id, "Interrupted by a server restart")
+    if interrupted:
+        logger.warning(f"Marked {len(interrupted)} interrupted uploads as failed")
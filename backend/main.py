@@ -1,12 +1,21 @@
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.exc import OperationalError
+import asyncio
 import logging
 import time
 import os
 
-from database import engine, Base
-from routers import admin, raters
+import ingest
+import metrics
+import profiler
+import schema
+import sweeper
+from assignment import assignments
+from database import SessionLocal, async_engine, engine
+from routers import admin, debug, raters
 
 # Configure logging
 logging.basicConfig(
@@ -15,10 +24,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# A single process brings the schema up to date (see schema.py and
+# migrations/) and cleans up after the previous process on startup. With
+# several workers these must run once, before any worker starts: run
+# `python manage.py release` and set MIGRATE_ON_STARTUP=0.
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1") == "1"
 
-app = FastAPI(title="Human Rating Platform", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db = SessionLocal()
+    try:
+        if MIGRATE_ON_STARTUP:
+            schema.migrate()
+            ingest.fail_interrupted_uploads(db)
+        # Warm next-question assignment state so the first raters don't pay for it
+        assignments.warm(db)
+    finally:
+        db.close()
+    sweep = asyncio.create_task(sweeper.run()) if sweeper.SESSION_SWEEP_SECONDS > 0 else None
+    yield
+    if sweep is not None:
+        sweep.cancel()
+        with suppress(asyncio.CancelledError):
+            await sweep
+    await async_engine.dispose()
+
+
+app = FastAPI(title="Human Rating Platform", version="1.0.0", lifespan=lifespan)
 
 # Configure CORS
 # Set CORS_ORIGINS env var to comma-separated list of allowed origins
@@ -48,6 +81,33 @@ async def log_requests(request: Request, call_next):
     return response
 
 
+# Latency, status and SQL use per route, for /metrics
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    with metrics.track_request(request) as result:
+        response = await call_next(request)
+        result["status"] = response.status_code
+    return response
+
+
+# Development only: record each request's SQL (see profiler.py)
+if profiler.SQL_PROFILE:
+    logger.warning("SQL profiling is enabled; don't use SQL_PROFILE=1 in production")
+    profiler.instrument_engine(engine)
+    profiler.instrument_engine(async_engine.sync_engine)
+
+    @app.middleware("http")
+    async def profile_sql(request: Request, call_next):
+        if request.url.path.startswith("/debug"):
+            return await call_next(request)
+        with profiler.profile_request(request) as profile:
+            response = await call_next(request)
+            profile.status = response.status_code
+        response.headers["X-Profile-Id"] = profile.id
+        response.headers["X-SQL-Profile"] = profile.header()
+        return response
+
+
 # Global exception handler for consistent JSON error responses
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -58,11 +118,32 @@ async def global_exception_handler(request: Request, exc: Exception):
     )
 
 
+# SQLite serializes writers; one that waited out SQLITE_BUSY_TIMEOUT_MS is
+# asked to retry rather than reported as a server error
+@app.exception_handler(OperationalError)
+async def database_busy_handler(request: Request, exc: OperationalError):
+    if "database is locked" not in str(exc.orig):
+        return await global_exception_handler(request, exc)
+    logger.warning(f"Database busy: {request.method} {request.url.path}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database is busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+
 # Include API routers
 app.include_router(admin.router)
 app.include_router(raters.router)
+if profiler.SQL_PROFILE:
+    app.include_router(debug.router)
 
 
 @app.get("/health")
 def health():
     return {"status": "healthy"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
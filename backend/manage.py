@@ -0,0 +1,104 @@
+"""Maintenance commands.
+
+Usage (from the backend directory):
+    python manage.py migrate
+    python manage.py release
+    python manage.py check-query-plans
+    python manage.py rebuild-analytics [--experiment-id N] [--check]
+"""
+import argparse
+import logging
+import sys
+
+import analytics
+import ingest
+import query_plans
+import schema
+from database import SessionLocal, engine
+from models import Experiment
+
+
+def migrate(args) -> int:
+    schema.migrate()
+    print(f"Database is at revision {schema.current_revision()}")
+    return 0
+
+
+def release(args) -> int:
+    """Run once per deploy, before starting the workers."""
+    migrate(args)
+    with SessionLocal() as db:
+        ingest.fail_interrupted_uploads(db)
+    return 0
+
+
+def check_query_plans(args) -> int:
+    revision = schema.current_revision()
+    if revision != schema.head_revision():
+        print(f"Database is at revision {revision}; run `python manage.py migrate` first", file=sys.stderr)
+        return 1
+
+    failures = query_plans.check(engine)
+    for name, scans in failures:
+        print(f"{name}: {'; '.join(scans)}")
+    if failures:
+        print(f"{len(failures)} hot queries use full table scans", file=sys.stderr)
+        return 1
+    print(f"All {len(query_plans.hot_queries())} hot queries use indexes ({engine.dialect.name})")
+    return 0
+
+
+def rebuild_analytics(args) -> int:
+    with SessionLocal() as db:
+        query = db.query(Experiment.id).order_by(Experiment.id)
+        if args.experiment_id is not None:
+            query = query.filter(Experiment.id == args.experiment_id)
+        experiment_ids = [experiment_id for (experiment_id,) in query]
+        if not experiment_ids:
+            print("No matching experiments", file=sys.stderr)
+            return 1
+
+        status = 0
+        for experiment_id in experiment_ids:
+            if args.check:
+                differences = analytics.check(db, experiment_id)
+                for difference in differences:
+                    print(f"experiment {experiment_id}: {difference}")
+                if differences:
+                    status = 1
+                else:
+                    print(f"experiment {experiment_id}: summaries match ratings")
+            else:
+                analytics.rebuild(db, experiment_id)
+                print(f"experiment {experiment_id}: summaries rebuilt")
+        return status
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Human Rating Platform maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("migrate", help="Upgrade the database schema").set_defaults(handler=migrate)
+    commands.add_parser(
+        "release", help="Upgrade the schema and fail uploads interrupted by the previous deploy"
+    ).set_defaults(handler=release)
+    commands.add_parser(
+        "check-query-plans", help="Check that the hot queries use indexes (SQLite and PostgreSQL)"
+    ).set_defaults(handler=check_query_plans)
+
+    rebuild = commands.add_parser(
+        "rebuild-analytics", help="Recompute analytics summaries from the raw ratings"
+    )
+    rebuild.add_argument("--experiment-id", type=int, help="Only this experiment")
+    rebuild.add_argument(
+        "--check", action="store_true", help="Compare summaries with the ratings instead of rebuilding"
+    )
+    rebuild.set_defaults(handler=rebuild_analytics)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
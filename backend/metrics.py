@@ -0,0 +1,246 @@
+"""Prometheus metrics, served at /metrics.
+
+Covers request latency per route, requests in flight, SQL statements and
+time (overall and per request), time spent waiting for a pooled connection,
+the cache, and counts of sessions started and ratings submitted.
+
+Metrics are kept in memory in the format Prometheus scrapes, so there is no
+client library to install. They are per process: with several workers each
+scrape is answered by one of them, so run one worker per scrape target (or
+scrape each worker directly) when exact counts matter.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import threading
+import time
+
+from sqlalchemy import event
+
+# Seconds; from 5ms to 10s
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# SQL statements per request
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labelnames, labelvalues, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=(), function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._function = function  # Read at scrape time instead of incremented
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def _samples(self):
+        if self._function is not None:
+            return [("_total", (), (), self._function())]
+        with self._lock:
+            return [("_total", self.labelnames, key, value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues: str, amount: float = 1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def _samples(self):
+        with self._lock:
+            return [("", self.labelnames, key, value) for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labelvalues: str):
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                # Per-bucket (not cumulative) counts, with +Inf last, then the sum
+                state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    def _samples(self):
+        samples = []
+        labelnames = self.labelnames + ("le",)
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _format_value(bound)
+                    samples.append(("_bucket", labelnames, key + (le,), cumulative))
+                samples.append(("_count", self.labelnames, key, cumulative))
+                samples.append(("_sum", self.labelnames, key, total))
+        return samples
+
+
+def render() -> str:
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+
+# Requests
+
+REQUESTS = Counter("http_requests", "HTTP requests by route and status", ("method", "route", "status"))
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to the response headers, by route", ("method", "route")
+)
+# By method only: the route isn't known until the request has been routed
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "Requests being handled", ("method",))
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements run per request", ("method", "route"), QUERY_COUNT_BUCKETS
+)
+REQUEST_QUERY_DURATION = Histogram(
+    "http_request_db_duration_seconds", "Time spent in SQL statements per request", ("method", "route")
+)
+
+# Database
+
+QUERY_DURATION = Histogram("db_query_duration_seconds", "SQL statement execution time", ("engine",))
+POOL_WAIT = Histogram("db_pool_wait_seconds", "Time spent waiting for a pooled connection", ("engine",))
+
+# Application
+
+SESSIONS_STARTED = Counter("rater_sessions_started", "New rater sessions")
+RATINGS_SUBMITTED = Counter("ratings_submitted", "Ratings stored")
+
+# Statement count and time for the request being handled; a mutable list
+# (count, seconds) so statements run in copied contexts (threadpool, async
+# driver greenlets) add to the request's totals
+_request_queries: ContextVar[Optional[list]] = ContextVar("request_queries", default=None)
+
+
+def route_template(request) -> str:
+    """The path template of the route that handled a request, e.g.
+    /api/admin/experiments/{experiment_id}; "other" when nothing matched.
+
+    Only known once the request has been routed.
+    """
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "other"
+
+
+@contextmanager
+def track_request(request):
+    """Record a request's latency, status and SQL use; the caller sets the
+    yielded dict's "status" from the response."""
+    result = {"status": 500}
+    queries = [0, 0.0]
+    token = _request_queries.set(queries)
+    REQUESTS_IN_PROGRESS.inc(request.method)
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        elapsed = time.perf_counter() - started
+        REQUESTS_IN_PROGRESS.dec(request.method)
+        labels = (request.method, route_template(request))
+        REQUEST_DURATION.observe(elapsed, *labels)
+        REQUESTS.inc(*labels, str(result["status"]))
+        REQUEST_QUERIES.observe(queries[0], *labels)
+        REQUEST_QUERY_DURATION.observe(queries[1], *labels)
+        _request_queries.reset(token)
+
+
+def instrument_engine(engine, label: str):
+    """Time the SQL statements run on a (sync) engine."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _record_query(conn, label)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        if exception_context.connection is not None:
+            _record_query(exception_context.connection, label)
+
+
+def _record_query(conn, label: str):
+    starts = conn.info.get("metrics_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    QUERY_DURATION.observe(elapsed, label)
+    queries = _request_queries.get()
+    if queries is not None:
+        queries[0] += 1
+        queries[1] += elapsed
+
+
+class TimedCheckout:
+    """Pool mixin recording how long connect() waits for a connection."""
+
+    metrics_label = ""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - started, self.metrics_label)
+
+
+def timed_pool_class(pool_class, label: str):
+    # Named after the wrapped class, module included: SQLAlchemy names a pool's
+    # logger after its class, which keeps it under sqlalchemy.pool
+    return type(
+        pool_class.__name__,
+        (TimedCheckout, pool_class),
+        {"metrics_label": label, "__module__": pool_class.__module__, "__qualname__": pool_class.__qualname__},
+    )
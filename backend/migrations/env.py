@@ -0,0 +1,41 @@
+from logging.config import fileConfig
+
+from alembic import context
+
+from database import Base, engine
+import models  # noqa: F401  (registers the tables on Base.metadata)
+
+config = context.config
+
+# schema.migrate() passes its own connection and keeps the app's logging setup
+connection = config.attributes.get("connection")
+if connection is None and config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=engine.url.render_as_string(hide_password=False),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations(connection) -> None:
+    context.configure(connection=connection, target_metadata=target_metadata)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+elif connection is not None:
+    run_migrations(connection)
+else:
+    with engine.connect() as connection:
+        run_migrations(connection)
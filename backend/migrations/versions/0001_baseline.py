@@ -0,0 +1,239 @@
+"""Baseline schema
+
+Creates the schema as it stood before migrations were introduced. Databases
+created earlier by Base.metadata.create_all may have any subset of these
+tables and columns, so missing ones are added and existing ones left alone,
+and derived values (questions.rating_count, the analytics summaries) are
+recomputed. Every step is safe to repeat, since SQLite commits DDL as it
+goes and an interrupted run is simply run again.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _summary_columns():
+    return [
+        sa.Column("num_ratings", sa.Integer(), nullable=False),
+        sa.Column("sum_response_time", sa.Float(), nullable=False),
+        sa.Column("sum_sq_response_time", sa.Float(), nullable=False),
+        sa.Column("min_response_time", sa.Float(), nullable=True),
+        sa.Column("max_response_time", sa.Float(), nullable=True),
+        sa.Column("sum_confidence", sa.Integer(), nullable=False),
+        sa.Column("confidence_1", sa.Integer(), nullable=False),
+        sa.Column("confidence_2", sa.Integer(), nullable=False),
+        sa.Column("confidence_3", sa.Integer(), nullable=False),
+        sa.Column("confidence_4", sa.Integer(), nullable=False),
+        sa.Column("confidence_5", sa.Integer(), nullable=False),
+    ]
+
+
+def _tables():
+    """(name, columns, constraints, indexes) in dependency order."""
+    return [
+        (
+            "experiments",
+            [
+                sa.Column("id", sa.Integer(), nullable=False),
+                sa.Column("name", sa.String(), nullable=False),
+                sa.Column("created_at", sa.DateTime(), nullable=True),
+                sa.Column("num_ratings_per_question", sa.Integer(), nullable=True),
+                sa.Column("prolific_completion_url", sa.String(), nullable=True),
+            ],
+            [sa.PrimaryKeyConstraint("id")],
+            [("ix_experiments_id", ["id"])],
+        ),
+        (
+            "raters",
+            [
+                sa.Column("id", sa.Integer(), nullable=False),
+                sa.Column("prolific_id", sa.String(), nullable=False),
+                sa.Column("study_id", sa.String(), nullable=True),
+                sa.Column("session_id", sa.String(), nullable=True),
+                sa.Column("experiment_id", sa.Integer(), nullable=False),
+                sa.Column("session_start", sa.DateTime(), nullable=True),
+                sa.Column("session_end", sa.DateTime(), nullable=True),
+                sa.Column("is_active", sa.Boolean(), nullable=True),
+            ],
+            [
+                sa.ForeignKeyConstraint(["experiment_id"], ["experiments.id"], ondelete="CASCADE"),
+                sa.PrimaryKeyConstraint("id"),
+                sa.UniqueConstraint("prolific_id", "experiment_id", name="uq_rater_prolific_experiment"),
+            ],
+            [("ix_raters_id", ["id"])],
+        ),
+        (
+            "uploads",
+            [
+                sa.Column("id", sa.Integer(), nullable=False),
+                sa.Column("experiment_id", sa.Integer(), nullable=False),
+                sa.Column("filename", sa.String(), nullable=False),
+                sa.Column("uploaded_at", sa.DateTime(), nullable=True),
+                sa.Column("question_count", sa.Integer(), nullable=False),
+                sa.Column("status", sa.String(), server_default="completed", nullable=False),
+                sa.Column("rows_processed", sa.Integer(), server_default="0", nullable=False),
+                sa.Column("duration_seconds", sa.Float(), nullable=True),
+                sa.Column("rows_per_second", sa.Float(), nullable=True),
+                sa.Column("error", sa.Text(), nullable=True),
+                sa.Column("completed_at", sa.DateTime(), nullable=True),
+            ],
+            [
+                sa.ForeignKeyConstraint(["experiment_id"], ["experiments.id"], ondelete="CASCADE"),
+                sa.PrimaryKeyConstraint("id"),
+            ],
+            [("ix_uploads_id", ["id"])],
+        ),
+        (
+            "questions",
+            [
+                sa.Column("id", sa.Integer(), nullable=False),
+                sa.Column("experiment_id", sa.Integer(), nullable=False),
+                sa.Column("question_id", sa.String(), nullable=False),
+                sa.Column("question_text", sa.Text(), nullable=False),
+                sa.Column("gt_answer", sa.Text(), nullable=True),
+                sa.Column("options", sa.Text(), nullable=True),
+                sa.Column("question_type", sa.String(), nullable=True),
+                sa.Column("extra_data", sa.Text(), nullable=True),
+                sa.Column("rating_count", sa.Integer(), server_default="0", nullable=False),
+                sa.Column(
+                    "upload_id",
+                    sa.Integer(),
+                    sa.ForeignKey("uploads.id", ondelete="SET NULL"),
+                    nullable=True,
+                ),
+            ],
+            [
+                sa.ForeignKeyConstraint(["experiment_id"], ["experiments.id"], ondelete="CASCADE"),
+                sa.PrimaryKeyConstraint("id"),
+            ],
+            [
+                ("ix_questions_id", ["id"]),
+                ("ix_questions_experiment_rating_count", ["experiment_id", "rating_count", "id"]),
+            ],
+        ),
+        (
+            "ratings",
+            [
+                sa.Column("id", sa.Integer(), nullable=False),
+                sa.Column("question_id", sa.Integer(), nullable=False),
+                sa.Column("rater_id", sa.Integer(), nullable=False),
+                sa.Column("answer", sa.Text(), nullable=False),
+                sa.Column("confidence", sa.Integer(), nullable=False),
+                sa.Column("time_started", sa.DateTime(), nullable=False),
+                sa.Column("time_submitted", sa.DateTime(), nullable=True),
+            ],
+            [
+                sa.ForeignKeyConstraint(["question_id"], ["questions.id"], ondelete="CASCADE"),
+                sa.ForeignKeyConstraint(["rater_id"], ["raters.id"], ondelete="CASCADE"),
+                sa.PrimaryKeyConstraint("id"),
+                sa.UniqueConstraint("question_id", "rater_id", name="uq_rating_question_rater"),
+            ],
+            [("ix_ratings_id", ["id"])],
+        ),
+        (
+            "question_leases",
+            [
+                sa.Column("id", sa.Integer(), nullable=False),
+                sa.Column("question_id", sa.Integer(), nullable=False),
+                sa.Column("rater_id", sa.Integer(), nullable=False),
+                sa.Column("expires_at", sa.DateTime(), nullable=False),
+            ],
+            [
+                sa.ForeignKeyConstraint(["question_id"], ["questions.id"], ondelete="CASCADE"),
+                sa.ForeignKeyConstraint(["rater_id"], ["raters.id"], ondelete="CASCADE"),
+                sa.PrimaryKeyConstraint("id"),
+                sa.UniqueConstraint("question_id", "rater_id", name="uq_lease_question_rater"),
+            ],
+            [("ix_question_leases_id", ["id"])],
+        ),
+        (
+            "question_stats",
+            [
+                sa.Column("question_id", sa.Integer(), nullable=False),
+                sa.Column("experiment_id", sa.Integer(), nullable=False),
+                sa.Column("answer_counts", sa.Text(), nullable=False),
+            ] + _summary_columns(),
+            [
+                sa.ForeignKeyConstraint(["experiment_id"], ["experiments.id"], ondelete="CASCADE"),
+                sa.ForeignKeyConstraint(["question_id"], ["questions.id"], ondelete="CASCADE"),
+                sa.PrimaryKeyConstraint("question_id"),
+            ],
+            [],
+        ),
+        (
+            "rater_stats",
+            [
+                sa.Column("rater_id", sa.Integer(), nullable=False),
+                sa.Column("experiment_id", sa.Integer(), nullable=False),
+            ] + _summary_columns(),
+            [
+                sa.ForeignKeyConstraint(["experiment_id"], ["experiments.id"], ondelete="CASCADE"),
+                sa.ForeignKeyConstraint(["rater_id"], ["raters.id"], ondelete="CASCADE"),
+                sa.PrimaryKeyConstraint("rater_id"),
+            ],
+            [],
+        ),
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    created_tables = set()
+
+    for name, columns, constraints, indexes in _tables():
+        if name not in existing_tables:
+            op.create_table(name, *columns, *constraints)
+            created_tables.add(name)
+        else:
+            existing_columns = {c["name"] for c in inspector.get_columns(name)}
+            for column in columns:
+                if column.name in existing_columns:
+                    continue
+                if column.foreign_keys and bind.dialect.name == "sqlite":
+                    # SQLite can only add a foreign key inline with the column
+                    (fk,) = column.foreign_keys
+                    target_table, target_column = fk.target_fullname.split(".")
+                    op.execute(
+                        f"ALTER TABLE {name} ADD COLUMN {column.name} {column.type.compile(bind.dialect)} "
+                        f"REFERENCES {target_table} ({target_column}) ON DELETE {fk.ondelete}"
+                    )
+                else:
+                    op.add_column(name, column)
+
+        existing_indexes = (
+            set() if name in created_tables else {i["name"] for i in inspector.get_indexes(name)}
+        )
+        for index_name, index_columns in indexes:
+            if index_name not in existing_indexes:
+                op.create_index(index_name, name, index_columns, unique=False)
+
+    if "ratings" in existing_tables:
+        op.execute(
+            "UPDATE questions SET rating_count = "
+            "(SELECT COUNT(ratings.id) FROM ratings WHERE ratings.question_id = questions.id)"
+        )
+        # Summaries need the application models, so schema.migrate() rebuilds
+        # them once the migration has committed
+        context.config.attributes["rebuild_analytics"] = True
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, _, _, _ in reversed(_tables()):
+        op.drop_table(name)
@@ -0,0 +1,45 @@
+"""Indexes for the hot query paths
+
+Covers the per-rater lookups behind next-question, submit and session-status,
+per-experiment rater, upload and analytics listings, and failed-upload cleanup.
+Check with `python manage.py check-query-plans`.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_questions_experiment_id_id", "questions", ["experiment_id", "id"]),
+    ("ix_questions_upload_id", "questions", ["upload_id"]),
+    ("ix_raters_experiment_id", "raters", ["experiment_id"]),
+    ("ix_ratings_rater_question", "ratings", ["rater_id", "question_id"]),
+    ("ix_question_leases_rater_expires", "question_leases", ["rater_id", "expires_at"]),
+    ("ix_question_stats_experiment_id", "question_stats", ["experiment_id"]),
+    ("ix_rater_stats_experiment_num_ratings", "rater_stats", ["experiment_id", "num_ratings"]),
+    ("ix_uploads_experiment_uploaded_at", "uploads", ["experiment_id", "uploaded_at"]),
+    ("ix_uploads_status", "uploads", ["status"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,30 @@
+"""Index for the session expiry sweep
+
+The sweeper (sweeper.py) looks for active raters whose session started more
+than SESSION_DURATION_MINUTES ago.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_raters_active_session_start", "raters", ["is_active", "session_start"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_raters_active_session_start", table_name="raters")
@@ -0,0 +1,60 @@
+"""Compressed, content-addressed question bodies
+
+Adds the question_bodies table and the questions.text_hash and
+questions.extra_data_hash columns pointing into it (see question_bodies.py).
+Existing questions keep their texts inline; downgrading moves stored texts
+back inline before dropping the table.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import zlib
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "question_bodies",
+        sa.Column("hash", sa.String(length=64), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("hash"),
+    )
+    op.add_column("questions", sa.Column("text_hash", sa.String(length=64), nullable=True))
+    op.add_column("questions", sa.Column("extra_data_hash", sa.String(length=64), nullable=True))
+    op.create_index("ix_questions_text_hash", "questions", ["text_hash"], unique=False)
+    op.create_index("ix_questions_extra_data_hash", "questions", ["extra_data_hash"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    connection = op.get_bind()
+    for column, hash_column in (("question_text", "text_hash"), ("extra_data", "extra_data_hash")):
+        rows = connection.execute(
+            sa.text(
+                f"SELECT q.id, b.data FROM questions q JOIN question_bodies b ON b.hash = q.{hash_column}"
+            )
+        ).fetchall()
+        for question_id, data in rows:
+            connection.execute(
+                sa.text(f"UPDATE questions SET {column} = :text WHERE id = :id"),
+                {"text": zlib.decompress(data).decode("utf-8"), "id": question_id},
+            )
+    op.drop_index("ix_questions_extra_data_hash", table_name="questions")
+    op.drop_index("ix_questions_text_hash", table_name="questions")
+    op.drop_column("questions", "extra_data_hash")
+    op.drop_column("questions", "text_hash")
+    op.drop_table("question_bodies")
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Float, UniqueConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Float, UniqueConstraint, Index, LargeBinary
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 from database import Base
 
@@ -22,24 +22,58 @@ class Experiment(Base):
 
 class Question(Base):
     __tablename__ = "questions"
+    __table_args__ = (
+        # Serves next-question assignment: least-rated questions first within an experiment
+        Index('ix_questions_experiment_rating_count', 'experiment_id', 'rating_count', 'id'),
+        # Keyset-paginated question export, in id order within an experiment
+        Index('ix_questions_experiment_id_id', 'experiment_id', 'id'),
+        # Removing the questions of a failed upload
+        Index('ix_questions_upload_id', 'upload_id'),
+        # Pruning stored bodies no question uses
+        Index('ix_questions_text_hash', 'text_hash'),
+        Index('ix_questions_extra_data_hash', 'extra_data_hash'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     experiment_id = Column(Integer, ForeignKey("experiments.id", ondelete="CASCADE"), nullable=False)
     question_id = Column(String, nullable=False)
-    question_text = Column(Text, nullable=False)
-    gt_answer = Column(Text, nullable=True)
-    options = Column(Text, nullable=True)
+    # The body columns can be large, so entity loads skip them unless asked
+    # for (load_only / undefer_group("body"))
+    question_text = deferred(Column(Text, nullable=False), group="body")
+    gt_answer = deferred(Column(Text, nullable=True), group="body")
+    options = deferred(Column(Text, nullable=True), group="body")
     question_type = Column(String, default="MC")
-    extra_data = Column(Text, nullable=True)
+    extra_data = deferred(Column(Text, nullable=True), group="body")
+    # Set when the full question_text / extra_data is in question_bodies and
+    # the column holds only its start (see question_bodies.py)
+    text_hash = Column(String(64), nullable=True)
+    extra_data_hash = Column(String(64), nullable=True)
+    # Denormalized count of Rating rows, maintained in the same transaction as each insert
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")
+    upload_id = Column(Integer, ForeignKey("uploads.id", ondelete="SET NULL"), nullable=True)
 
     experiment = relationship("Experiment", back_populates="questions")
     ratings = relationship("Rating", back_populates="question", cascade="all, delete-orphan")
 
 
+class QuestionBody(Base):
+    """A long question text stored once, compressed (see question_bodies.py)."""
+
+    __tablename__ = "question_bodies"
+
+    hash = Column(String(64), primary_key=True)  # SHA-256 of the UTF-8 text
+    data = Column(LargeBinary, nullable=False)  # zlib-compressed UTF-8 text
+    size = Column(Integer, nullable=False)  # Uncompressed bytes
+
+
 class Rater(Base):
     __tablename__ = "raters"
     __table_args__ = (
         UniqueConstraint('prolific_id', 'experiment_id', name='uq_rater_prolific_experiment'),
+        # Per-experiment rater counts and listings
+        Index('ix_raters_experiment_id', 'experiment_id'),
+        # Session expiry sweep
+        Index('ix_raters_active_session_start', 'is_active', 'session_start'),
     )
 
     id = Column(Integer, primary_key=True, index=True)
@@ -59,6 +93,8 @@ class Rating(Base):
     __tablename__ = "ratings"
     __table_args__ = (
         UniqueConstraint('question_id', 'rater_id', name='uq_rating_question_rater'),
+        # A rater's ratings: session status counts, duplicate checks, assignment state
+        Index('ix_ratings_rater_question', 'rater_id', 'question_id'),
     )
 
     id = Column(Integer, primary_key=True, index=True)
@@ -73,13 +109,87 @@ class Rating(Base):
     rater = relationship("Rater", back_populates="ratings")
 
 
+class QuestionLease(Base):
+    """A question reserved for a rater between being served and being rated."""
+
+    __tablename__ = "question_leases"
+    __table_args__ = (
+        UniqueConstraint('question_id', 'rater_id', name='uq_lease_question_rater'),
+        # A rater's current leases
+        Index('ix_question_leases_rater_expires', 'rater_id', 'expires_at'),
+        # Expired lease sweep
+        Index('ix_question_leases_expires_at', 'expires_at'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    question_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"), nullable=False)
+    rater_id = Column(Integer, ForeignKey("raters.id", ondelete="CASCADE"), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class RatingSummaryMixin:
+    """Running totals over a set of ratings; response times are in seconds."""
+
+    num_ratings = Column(Integer, nullable=False, default=0)
+    sum_response_time = Column(Float, nullable=False, default=0.0)
+    sum_sq_response_time = Column(Float, nullable=False, default=0.0)
+    min_response_time = Column(Float, nullable=True)
+    max_response_time = Column(Float, nullable=True)
+    sum_confidence = Column(Integer, nullable=False, default=0)
+    confidence_1 = Column(Integer, nullable=False, default=0)
+    confidence_2 = Column(Integer, nullable=False, default=0)
+    confidence_3 = Column(Integer, nullable=False, default=0)
+    confidence_4 = Column(Integer, nullable=False, default=0)
+    confidence_5 = Column(Integer, nullable=False, default=0)
+
+
+class QuestionStats(RatingSummaryMixin, Base):
+    """Running per-question rating summary, updated with each rating (see analytics.py)."""
+
+    __tablename__ = "question_stats"
+    __table_args__ = (
+        Index('ix_question_stats_experiment_id', 'experiment_id'),
+    )
+
+    question_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"), primary_key=True)
+    experiment_id = Column(Integer, ForeignKey("experiments.id", ondelete="CASCADE"), nullable=False)
+    answer_counts = Column(Text, nullable=False, default="{}")  # JSON {answer: count}
+
+
+class RaterStats(RatingSummaryMixin, Base):
+    """Running per-rater rating summary, updated with each rating (see analytics.py)."""
+
+    __tablename__ = "rater_stats"
+    __table_args__ = (
+        # Rater analytics pages, which filter on num_ratings > 0
+        Index('ix_rater_stats_experiment_num_ratings', 'experiment_id', 'num_ratings'),
+    )
+
+    rater_id = Column(Integer, ForeignKey("raters.id", ondelete="CASCADE"), primary_key=True)
+    experiment_id = Column(Integer, ForeignKey("experiments.id", ondelete="CASCADE"), nullable=False)
+
+
 class Upload(Base):
+    """A CSV upload, processed as a background ingestion job (see ingest.py)."""
+
     __tablename__ = "uploads"
+    __table_args__ = (
+        # Upload history, newest first
+        Index('ix_uploads_experiment_uploaded_at', 'experiment_id', 'uploaded_at'),
+        # Finding interrupted jobs at startup
+        Index('ix_uploads_status', 'status'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     experiment_id = Column(Integer, ForeignKey("experiments.id", ondelete="CASCADE"), nullable=False)
     filename = Column(String, nullable=False)
     uploaded_at = Column(DateTime, default=datetime.utcnow)
     question_count = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, default="completed", server_default="completed")
+    rows_processed = Column(Integer, nullable=False, default=0, server_default="0")
+    duration_seconds = Column(Float, nullable=True)
+    rows_per_second = Column(Float, nullable=True)  # Ingest throughput
+    error = Column(Text, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
 
     experiment = relationship("Experiment")
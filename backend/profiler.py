@@ -0,0 +1,205 @@
+"""Per-request SQL profiler for development.
+
+With SQL_PROFILE=1 every SQL statement a request runs is recorded with its
+duration, and the first statement of each shape is EXPLAINed on the same
+connection. Statements of the same shape (the SQL text, with IN lists
+collapsed) run SQL_PROFILE_REPEAT_THRESHOLD or more times in one request are
+flagged as N+1 candidates and logged.
+
+Responses carry an `X-Profile-Id` header and an `X-SQL-Profile` summary;
+the full profile is at GET /debug/profile/{profile_id} (see routers/debug.py)
+for the last SQL_PROFILE_MAX_REQUESTS requests of the worker that served
+it. EXPLAIN adds a round trip per statement shape, so leave this off in
+production.
+"""
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+SQL_PROFILE = os.getenv("SQL_PROFILE", "0") == "1"
+SQL_PROFILE_REPEAT_THRESHOLD = int(os.getenv("SQL_PROFILE_REPEAT_THRESHOLD", "3"))
+SQL_PROFILE_MAX_REQUESTS = int(os.getenv("SQL_PROFILE_MAX_REQUESTS", "200"))
+
+EXPLAIN_PREFIXES = {
+    "sqlite": "EXPLAIN QUERY PLAN",
+    "postgresql": "EXPLAIN",
+    "mysql": "EXPLAIN",
+}
+
+# Statements that have a query plan; transaction control and DDL don't
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "INSERT")
+
+# Parameter lists expanded from IN (...), in any paramstyle
+_IN_LIST = re.compile(r"\bIN \((?:\s*(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)\s*,?)+\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """The statement with whitespace normalized and IN lists collapsed, so
+    the same query with different parameters has the same shape."""
+    return _IN_LIST.sub("IN (...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.started_at = datetime.utcnow()
+        self.duration = 0.0
+        self.status: Optional[int] = None
+        self.statements: List[dict] = []
+        self.plans: Dict[str, list] = {}  # shape -> EXPLAIN rows
+
+    @property
+    def sql_seconds(self) -> float:
+        return sum(statement["seconds"] for statement in self.statements)
+
+    def repeated(self) -> List[dict]:
+        """Statement shapes run at least SQL_PROFILE_REPEAT_THRESHOLD times."""
+        counts = Counter(statement["shape"] for statement in self.statements)
+        return [
+            {"shape": shape, "count": count}
+            for shape, count in counts.most_common()
+            if count >= SQL_PROFILE_REPEAT_THRESHOLD
+        ]
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration * 1000, 2),
+            "queries": len(self.statements),
+            "sql_ms": round(self.sql_seconds * 1000, 2),
+            "repeated": len(self.repeated()),
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            **self.summary(),
+            "n_plus_one_candidates": self.repeated(),
+            "statements": [
+                {**statement, "seconds": round(statement["seconds"], 6)} for statement in self.statements
+            ],
+            "plans": self.plans,
+        }
+
+    def header(self) -> str:
+        return (
+            f"queries={len(self.statements)}; sql_ms={self.sql_seconds * 1000:.1f}; "
+            f"repeated={len(self.repeated())}"
+        )
+
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("sql_profile", default=None)
+
+_profiles: "OrderedDict[str, RequestProfile]" = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+def get(profile_id: str) -> Optional[RequestProfile]:
+    with _profiles_lock:
+        return _profiles.get(profile_id)
+
+
+def recent() -> List[RequestProfile]:
+    """Kept profiles, newest first."""
+    with _profiles_lock:
+        return list(reversed(_profiles.values()))
+
+
+def _keep(profile: RequestProfile):
+    with _profiles_lock:
+        _profiles[profile.id] = profile
+        while len(_profiles) > SQL_PROFILE_MAX_REQUESTS:
+            _profiles.popitem(last=False)
+
+
+@contextmanager
+def profile_request(request):
+    """Record the SQL run while handling a request; the caller sets the
+    yielded profile's status from the response."""
+    profile = RequestProfile(request.method, request.url.path)
+    token = _current.set(profile)
+    started = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        profile.duration = time.perf_counter() - started
+        _current.reset(token)
+        _keep(profile)
+        for repeated in profile.repeated():
+            logger.warning(
+                f"Possible N+1 in {profile.method} {profile.path}: "
+                f"{repeated['count']} x {repeated['shape'][:200]} (profile {profile.id})"
+            )
+
+
+def _explain(conn, statement: str, parameters) -> list:
+    prefix = EXPLAIN_PREFIXES.get(conn.dialect.name)
+    if prefix is None:
+        return []
+    # A separate DBAPI cursor, so the EXPLAIN isn't itself recorded and the
+    # statement's cursor keeps its results
+    explain_cursor = conn.connection.cursor()
+    try:
+        explain_cursor.execute(f"{prefix} {statement}", parameters)
+        return [[str(value) for value in row] for row in explain_cursor.fetchall()]
+    except Exception as e:
+        return [[f"EXPLAIN failed: {e}"]]
+    finally:
+        explain_cursor.close()
+
+
+def instrument_engine(engine):
+    """Record the statements run on a (sync) engine into the current request's profile."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("profiler_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        profile = _current.get()
+        starts = conn.info.get("profiler_query_start")
+        if profile is None or not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        shape = statement_shape(statement)
+        if (
+            shape not in profile.plans
+            and not executemany
+            and shape.upper().startswith(EXPLAINABLE)
+        ):
+            profile.plans[shape] = _explain(conn, statement, parameters)
+        profile.statements.append(
+            {
+                "statement": statement,
+                "parameters": repr(parameters)[:500],
+                "seconds": elapsed,
+                "shape": shape,
+                "executemany": executemany,
+            }
+        )
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("profiler_query_start"):
+            connection.info["profiler_query_start"].pop()
@@ -0,0 +1,189 @@
+"""Query-plan checks for the hot query paths.
+
+Each hot query is EXPLAINed against the configured database and the plan is
+checked for full scans of application tables, so a dropped or unusable index
+shows up as a failure rather than as a slow endpoint. Supports SQLite
+(EXPLAIN QUERY PLAN) and PostgreSQL (EXPLAIN with sequential scans disabled,
+so the planner picks an index whenever one applies, even on small tables).
+
+Run with `python manage.py check-query-plans`.
+"""
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+import json
+
+from sqlalchemy import case, exists, func, or_, select
+
+from database import Base
+from models import (
+    Experiment,
+    Question,
+    QuestionBody,
+    QuestionLease,
+    QuestionStats,
+    Rater,
+    RaterStats,
+    Rating,
+    Upload,
+)
+
+# Placeholder parameters; plans don't depend on the values
+EXPERIMENT_ID = 1
+RATER_ID = 1
+QUESTION_ID = 1
+
+
+EXPLAIN_PREFIXES = {
+    "sqlite": "EXPLAIN QUERY PLAN",
+    "postgresql": "EXPLAIN (FORMAT JSON)",
+}
+
+
+def _explain(connection, statement):
+    # Placeholder values are rendered inline so the plan rows come back untyped
+    sql = statement.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True})
+    return connection.exec_driver_sql(f"{EXPLAIN_PREFIXES[connection.dialect.name]} {sql}")
+
+
+def hot_queries() -> Dict[str, object]:
+    """The statements behind the rater endpoints, export and analytics."""
+    now = datetime.utcnow()
+    return {
+        # Assignment state load (next-question)
+        "assignment: question counts": select(Question.id, Question.rating_count).where(
+            Question.experiment_id == EXPERIMENT_ID
+        ),
+        "assignment: rated questions": select(Rating.rater_id, Rating.question_id)
+        .join(Question, Rating.question_id == Question.id)
+        .where(Question.experiment_id == EXPERIMENT_ID),
+        "assignment: active leases": select(QuestionLease.rater_id, QuestionLease.question_id)
+        .join(Question, QuestionLease.question_id == Question.id)
+        .where(Question.experiment_id == EXPERIMENT_ID, QuestionLease.expires_at > now),
+        # next-question / submit / session-status
+        "rater lookup": select(Rater).where(Rater.id == RATER_ID),
+        "rater leases": select(QuestionLease).where(QuestionLease.rater_id == RATER_ID),
+        "duplicate rating check": select(Rating).where(
+            Rating.rater_id == RATER_ID, Rating.question_id == QUESTION_ID
+        ),
+        "session status count": select(func.count(Rating.id)).where(Rating.rater_id == RATER_ID),
+        "rater start": select(Rater).where(
+            Rater.prolific_id == "PID", Rater.experiment_id == EXPERIMENT_ID
+        ),
+        "assignment: warm experiments": select(Experiment.id).where(
+            Experiment.id.in_(
+                select(Rater.experiment_id).where(Rater.is_active == True, Rater.session_start > now)  # noqa: E712
+            )
+        ),
+        # Background session expiry
+        "session sweep": select(Rater.id, Rater.experiment_id).where(
+            Rater.is_active == True, Rater.session_start < now  # noqa: E712
+        ),
+        "lease sweep": select(QuestionLease.id).where(
+            or_(
+                QuestionLease.expires_at < now,
+                QuestionLease.rater_id.in_(
+                    select(Rater.id).where(Rater.is_active == True, Rater.session_start < now)  # noqa: E712
+                ),
+            )
+        ),
+        # Export
+        "export rating batch": select(Rating.id, Question.question_id, Rater.prolific_id)
+        .join(Question, Rating.question_id == Question.id)
+        .join(Rater, Rating.rater_id == Rater.id)
+        .where(Question.experiment_id == EXPERIMENT_ID, Rating.id > 0)
+        .order_by(Rating.id)
+        .limit(1000),
+        "export question batch": select(Question.id, Question.question_id)
+        .where(Question.experiment_id == EXPERIMENT_ID, Question.id > 0)
+        .order_by(Question.id)
+        .limit(1000),
+        # Analytics and stats
+        "analytics overview": select(func.sum(QuestionStats.num_ratings)).where(
+            QuestionStats.experiment_id == EXPERIMENT_ID
+        ),
+        "analytics questions": select(Question.id, QuestionStats.num_ratings)
+        .outerjoin(QuestionStats, QuestionStats.question_id == Question.id)
+        .where(Question.experiment_id == EXPERIMENT_ID)
+        .limit(50),
+        "analytics raters": select(RaterStats.rater_id, Rater.prolific_id)
+        .join(Rater, RaterStats.rater_id == Rater.id)
+        .where(RaterStats.experiment_id == EXPERIMENT_ID, RaterStats.num_ratings > 0)
+        .limit(50),
+        "experiment stats": select(
+            Question.experiment_id,
+            func.count(Question.id),
+            func.sum(case((Question.rating_count >= Experiment.num_ratings_per_question, 1), else_=0)),
+        )
+        .join(Experiment, Question.experiment_id == Experiment.id)
+        .where(Question.experiment_id.in_([EXPERIMENT_ID]))
+        .group_by(Question.experiment_id),
+        "experiment rater count": select(Rater.experiment_id, func.count(Rater.id))
+        .where(Rater.experiment_id.in_([EXPERIMENT_ID]))
+        .group_by(Rater.experiment_id),
+        # Uploads
+        "upload history": select(Upload)
+        .where(Upload.experiment_id == EXPERIMENT_ID)
+        .order_by(Upload.uploaded_at.desc())
+        .limit(100),
+        "interrupted uploads": select(Upload.id).where(Upload.status.in_(["pending", "processing"])),
+        "failed upload cleanup": select(Question.id).where(Question.upload_id == 1),
+        # Stored question bodies
+        "question bodies": select(QuestionBody.hash, QuestionBody.data).where(QuestionBody.hash.in_(["0" * 64])),
+        "question body prune": select(QuestionBody.hash).where(
+            QuestionBody.hash.in_(["0" * 64]),
+            ~exists().where(Question.text_hash == QuestionBody.hash),
+            ~exists().where(Question.extra_data_hash == QuestionBody.hash),
+        ),
+    }
+
+
+def _sqlite_full_scans(connection, statement, tables) -> List[str]:
+    # Rows are (id, parent, notused, detail); a full table scan reads
+    # "SCAN <table>" with no index, e.g. not "SCAN t USING COVERING INDEX ..."
+    scans = []
+    for row in _explain(connection, statement):
+        detail = row[3]
+        words = detail.split()
+        if len(words) >= 2 and words[0] == "SCAN" and words[1] in tables and "INDEX" not in detail:
+            scans.append(detail)
+    return scans
+
+
+def _postgresql_full_scans(connection, statement, tables) -> List[str]:
+    connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    plan = _explain(connection, statement).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    scans = []
+
+    def walk(node):
+        if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") in tables:
+            scans.append(f"Seq Scan on {node['Relation Name']}")
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return scans
+
+
+FULL_SCAN_CHECKS: Dict[str, Callable] = {
+    "sqlite": _sqlite_full_scans,
+    "postgresql": _postgresql_full_scans,
+}
+
+
+def check(engine) -> List[Tuple[str, List[str]]]:
+    """EXPLAIN each hot query; returns (query name, full scans) for failures."""
+    find_full_scans = FULL_SCAN_CHECKS.get(engine.dialect.name)
+    if find_full_scans is None:
+        raise NotImplementedError(f"Query-plan checks don't support {engine.dialect.name}")
+
+    tables = set(Base.metadata.tables)
+    failures = []
+    for name, statement in hot_queries().items():
+        with engine.begin() as connection:
+            scans = find_full_scans(connection, statement, tables)
+        if scans:
+            failures.append((name, scans))
+    return failures
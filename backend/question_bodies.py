@@ -0,0 +1,171 @@
+"""Compressed, content-addressed storage for long question texts.
+
+With QUESTION_BODY_STORE=1, uploads move question_text and metadata
+(extra_data) values of at least QUESTION_BODY_MIN_CHARS characters into the
+question_bodies table: zlib-compressed and keyed by the SHA-256 of the text,
+so a passage used by several questions or experiments is stored once. The
+question keeps the hash (text_hash, extra_data_hash) and the first
+INLINE_PREFIX_CHARS characters inline, which is enough for the analytics
+previews; serving and export look up the full text with load().
+
+Questions with a hash are always read from the store, so the setting can be
+turned on or off at any time; a missing body is an error rather than a reason
+to serve the prefix. Deleting questions prunes the bodies only they used,
+under row locks that keep a concurrent upload's bodies from being pruned
+before its questions are committed.
+"""
+from typing import Dict, Iterable, List, Optional
+import hashlib
+import os
+import zlib
+
+from sqlalchemy import delete, exists, or_, select
+from sqlalchemy.orm import Session
+
+from database import insert_missing
+from models import Question, QuestionBody
+
+QUESTION_BODY_STORE = os.getenv("QUESTION_BODY_STORE", "0") == "1"
+QUESTION_BODY_MIN_CHARS = int(os.getenv("QUESTION_BODY_MIN_CHARS", "1024"))
+
+COMPRESSION_LEVEL = 6
+
+# At least analytics.QUESTION_TEXT_PREVIEW_CHARS + 1
+INLINE_PREFIX_CHARS = 200
+
+# Question column -> column holding the hash of its stored body
+HASH_COLUMNS = {"question_text": "text_hash", "extra_data": "extra_data_hash"}
+
+# Hashes per IN (...) list, well below SQLite's bound-parameter limit
+HASH_BATCH_SIZE = 500
+
+
+class MissingQuestionBody(Exception):
+    """A question refers to a body that isn't in question_bodies."""
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _batches(hashes: Iterable[str]):
+    """The hashes in sorted slices of HASH_BATCH_SIZE.
+
+    Sorted so concurrent uploads and deletes take row locks in the same order.
+    """
+    hashes = sorted(hashes)
+    for start in range(0, len(hashes), HASH_BATCH_SIZE):
+        yield hashes[start:start + HASH_BATCH_SIZE]
+
+
+def _store(db: Session, texts: Dict[str, str]):
+    """Insert the bodies (hash -> text) that aren't stored yet and lock them all.
+
+    Runs in the transaction that inserts the questions using the bodies. The
+    shared row locks make a concurrent prune() wait until those questions are
+    committed; a body deleted by a prune that got there first is stored again.
+    """
+    dialect_name = db.get_bind().dialect.name
+    missing = set(texts)
+    for batch in _batches(texts):
+        missing.difference_update(db.scalars(select(QuestionBody.hash).where(QuestionBody.hash.in_(batch))))
+    while True:
+        for batch in _batches(missing):
+            rows = []
+            for body_hash in batch:
+                data = texts[body_hash].encode("utf-8")
+                rows.append({"hash": body_hash, "data": zlib.compress(data, COMPRESSION_LEVEL), "size": len(data)})
+            db.execute(insert_missing(dialect_name, QuestionBody, rows, ["hash"]))
+        missing = set(texts)
+        for batch in _batches(texts):
+            missing.difference_update(
+                db.scalars(
+                    select(QuestionBody.hash)
+                    .where(QuestionBody.hash.in_(batch))
+                    .order_by(QuestionBody.hash)
+                    .with_for_update(read=True)
+                )
+            )
+        if not missing:
+            return
+
+
+def store_rows(db: Session, rows: List[dict]) -> List[dict]:
+    """Move long texts of question rows (as inserted by ingest) into the store.
+
+    Every row gets both hash keys, so the rows can still be inserted with a
+    single executemany.
+    """
+    texts = {}
+    for row in rows:
+        for column, hash_column in HASH_COLUMNS.items():
+            text = row.get(column)
+            if text is not None and len(text) >= QUESTION_BODY_MIN_CHARS:
+                body_hash = content_hash(text)
+                texts[body_hash] = text
+                row[column] = text[:INLINE_PREFIX_CHARS]
+                row[hash_column] = body_hash
+            else:
+                row[hash_column] = None
+    if texts:
+        _store(db, texts)
+    return rows
+
+
+def load(db: Session, hashes: Iterable[Optional[str]]) -> Dict[str, str]:
+    """Texts of the given bodies by hash; None entries are skipped.
+
+    Raises MissingQuestionBody if any of them isn't stored.
+    """
+    wanted = {body_hash for body_hash in hashes if body_hash}
+    if not wanted:
+        return {}
+    bodies = {}
+    for batch in _batches(wanted):
+        for body_hash, data in db.execute(
+            select(QuestionBody.hash, QuestionBody.data).where(QuestionBody.hash.in_(batch))
+        ):
+            bodies[body_hash] = zlib.decompress(data).decode("utf-8")
+    if len(bodies) < len(wanted):
+        raise MissingQuestionBody(f"Question bodies not found: {', '.join(sorted(wanted - set(bodies)))}")
+    return bodies
+
+
+def full_text(bodies: Dict[str, str], body_hash: Optional[str], inline: Optional[str]) -> Optional[str]:
+    """A question column's full value, given the bodies returned by load()."""
+    return bodies[body_hash] if body_hash else inline
+
+
+def question_hashes(db: Session, *criteria) -> List[str]:
+    """Body hashes used by the questions matching criteria, for prune()."""
+    hashes = set()
+    for text_hash, extra_data_hash in db.execute(
+        select(Question.text_hash, Question.extra_data_hash).where(
+            *criteria, or_(Question.text_hash.is_not(None), Question.extra_data_hash.is_not(None))
+        )
+    ):
+        hashes.update(body_hash for body_hash in (text_hash, extra_data_hash) if body_hash)
+    return list(hashes)
+
+
+def prune(db: Session, hashes: List[str]):
+    """Delete those of the given bodies that no question uses any more.
+
+    The bodies are locked first, so uploads still inserting questions that
+    use them (see _store) commit before the check.
+    """
+    for batch in _batches(hashes):
+        db.scalars(
+            select(QuestionBody.hash)
+            .where(QuestionBody.hash.in_(batch))
+            .order_by(QuestionBody.hash)
+            .with_for_update()
+        ).all()
+    for batch in _batches(hashes):
+        db.execute(
+            delete(QuestionBody).where(
+                QuestionBody.hash.in_(batch),
+                ~exists().where(Question.text_hash == QuestionBody.hash),
+                ~exists().where(Question.extra_data_hash == QuestionBody.hash),
+            )
+        )
@@ -1,17 +1,23 @@
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-import csv
-import io
+from sqlalchemy import case, func
 import json
 import logging
+import os
+import shutil
 from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 
+import analytics
+import cache
+import export
+import ingest
+import question_bodies
+from assignment import assignments
 from database import get_db
-from models import Experiment, Question, Rating, Rater, Upload
+from models import Experiment, Question, QuestionStats, Rating, Rater, RaterStats, Upload
 from schemas import ExperimentCreate, ExperimentResponse
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
@@ -96,9 +102,27 @@ def list_experiments(
 
 
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+MAX_STATS_EXPERIMENTS = 1000
+SPOOL_COPY_BYTES = 1024 * 1024
 
 
-@router.post("/experiments/{experiment_id}/upload")
+def _upload_response(u: Upload) -> dict:
+    return {
+        "id": u.id,
+        "experiment_id": u.experiment_id,
+        "filename": u.filename,
+        "uploaded_at": u.uploaded_at.isoformat(),
+        "status": u.status,
+        "question_count": u.question_count,
+        "rows_processed": u.rows_processed,
+        "duration_seconds": u.duration_seconds,
+        "rows_per_second": u.rows_per_second,
+        "error": u.error,
+        "completed_at": u.completed_at.isoformat() if u.completed_at else None,
+    }
+
+
+@router.post("/experiments/{experiment_id}/upload", status_code=202)
 def upload_questions(
     experiment_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)
 ):
@@ -110,50 +134,49 @@ def upload_questions(
     if not file.filename or not file.filename.lower().endswith('.csv'):
         raise HTTPException(status_code=400, detail="File must be a CSV file")
 
-    # Read and validate file size
-    content_bytes = file.file.read()
-    if len(content_bytes) > MAX_FILE_SIZE:
+    # Validate file size without reading the spooled upload into memory
+    file.file.seek(0, os.SEEK_END)
+    if file.file.tell() > MAX_FILE_SIZE:
         raise HTTPException(status_code=400, detail="File size exceeds 50MB limit")
+    file.file.seek(0)
 
+    # Reject a bad header now rather than failing the job later
     try:
-        content = content_bytes.decode("utf-8")
-    except UnicodeDecodeError:
-        raise HTTPException(status_code=400, detail="File must be UTF-8 encoded")
-    reader = csv.DictReader(io.StringIO(content))
-
-    questions_added = 0
-    required_fields = ["question_id", "question_text"]
-
-    for row in reader:
-        # Validate required fields
-        for field in required_fields:
-            if field not in row:
-                raise HTTPException(
-                    status_code=400, detail=f"Missing required field: {field}"
-                )
-
-        question = Question(
-            experiment_id=experiment_id,
-            question_id=row["question_id"],
-            question_text=row["question_text"],
-            gt_answer=row.get("gt_answer", ""),
-            options=row.get("options", ""),
-            question_type=row.get("question_type", "MC"),
-            extra_data=row.get("metadata", "{}"),
-        )
-        db.add(question)
-        questions_added += 1
+        ingest.check_header(ingest.open_reader(file.file))
+    except ingest.IngestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    file.file.seek(0)
 
-    # Record the upload
     upload = Upload(
         experiment_id=experiment_id,
         filename=file.filename,
-        question_count=questions_added,
+        status=ingest.PENDING,
+        question_count=0,
+        rows_processed=0,
     )
     db.add(upload)
     db.commit()
-    logger.info(f"Uploaded {questions_added} questions to experiment {experiment_id} from {file.filename}")
-    return {"message": f"Uploaded {questions_added} questions"}
+
+    # Spool to disk and hand off to the ingestion workers
+    path = ingest.spool_path(upload.id)
+    try:
+        with open(path, "wb") as spool:
+            shutil.copyfileobj(file.file, spool, SPOOL_COPY_BYTES)
+    except OSError:
+        ingest.fail_upload(db, upload.id, "Could not store the uploaded file")
+        raise
+    ingest.submit_upload(upload.id, experiment_id, path)
+    logger.info(f"Queued upload {upload.id} of {file.filename} for experiment {experiment_id}")
+
+    return {"message": f"Upload of {file.filename} queued", "job_id": upload.id}
+
+
+@router.get("/uploads/{job_id}")
+def get_upload_job(job_id: int, db: Session = Depends(get_db)):
+    upload = db.query(Upload).filter(Upload.id == job_id).first()
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return _upload_response(upload)
 
 
 @router.get("/experiments/{experiment_id}/uploads")
@@ -176,94 +199,38 @@ def list_uploads(
         .all()
     )
 
-    return [
-        {
-            "id": u.id,
-            "filename": u.filename,
-            "uploaded_at": u.uploaded_at.isoformat(),
-            "question_count": u.question_count,
-        }
-        for u in uploads
-    ]
+    return [_upload_response(u) for u in uploads]
 
 
 @router.get("/experiments/{experiment_id}/export")
-def export_ratings(experiment_id: int, db: Session = Depends(get_db)):
+def export_ratings(
+    experiment_id: int,
+    format: str = Query("csv", pattern="^(csv|jsonl|parquet|arrow)$"),
+    normalized: bool = Query(False),
+    db: Session = Depends(get_db),
+):
     experiment = db.query(Experiment).filter(Experiment.id == experiment_id).first()
     if not experiment:
         raise HTTPException(status_code=404, detail="Experiment not found")
 
-    def generate_csv():
-        # Write header
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(
-            [
-                "rating_id",
-                "question_id",
-                "question_text",
-                "gt_answer",
-                "rater_prolific_id",
-                "rater_study_id",
-                "rater_session_id",
-                "answer",
-                "confidence",
-                "time_started",
-                "time_submitted",
-                "response_time_seconds",
-            ]
-        )
-        yield output.getvalue()
-
-        # Stream ratings in batches
-        batch_size = 1000
-        offset = 0
-
-        while True:
-            ratings = (
-                db.query(Rating, Question, Rater)
-                .join(Question, Rating.question_id == Question.id)
-                .join(Rater, Rating.rater_id == Rater.id)
-                .filter(Question.experiment_id == experiment_id)
-                .offset(offset)
-                .limit(batch_size)
-                .all()
-            )
-
-            if not ratings:
-                break
-
-            output = io.StringIO()
-            writer = csv.writer(output)
-
-            for rating, question, rater in ratings:
-                response_time = (rating.time_submitted - rating.time_started).total_seconds()
-                writer.writerow(
-                    [
-                        rating.id,
-                        question.question_id,
-                        question.question_text,
-                        question.gt_answer,
-                        rater.prolific_id,
-                        rater.study_id or "",
-                        rater.session_id or "",
-                        rating.answer,
-                        rating.confidence,
-                        rating.time_started.isoformat(),
-                        rating.time_submitted.isoformat(),
-                        round(response_time, 2),
-                    ]
-                )
-
-            yield output.getvalue()
-            offset += batch_size
+    try:
+        export.check_format(format)
+    except export.ExportFormatUnavailable as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if normalized:
+        content = export.stream_normalized(db, experiment_id, format)
+        media_type = "application/zip"
+        filename = f"experiment_{experiment_id}_export.zip"
+    else:
+        content = export.stream_ratings(db, experiment_id, format)
+        media_type = export.MEDIA_TYPES[format]
+        filename = f"experiment_{experiment_id}_ratings.{export.FILE_EXTENSIONS[format]}"
 
     return StreamingResponse(
-        generate_csv(),
-        media_type="text/csv",
-        headers={
-            "Content-Disposition": f"attachment; filename=experiment_{experiment_id}_ratings.csv"
-        },
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
 
 
@@ -275,50 +242,111 @@ def delete_experiment(experiment_id: int, db: Session = Depends(get_db)):
 
     # With CASCADE delete constraints, we just need to delete the experiment
     experiment_name = experiment.name
+    question_ids = [
+        question_id
+        for (question_id,) in db.query(Question.id).filter(Question.experiment_id == experiment_id)
+    ]
+    body_hashes = question_bodies.question_hashes(db, Question.experiment_id == experiment_id)
+    # Summary rows aren't ORM children of the experiment
+    db.query(QuestionStats).filter(QuestionStats.experiment_id == experiment_id).delete(synchronize_session=False)
+    db.query(RaterStats).filter(RaterStats.experiment_id == experiment_id).delete(synchronize_session=False)
     db.delete(experiment)
+    db.flush()
+    question_bodies.prune(db, body_hashes)
     db.commit()
+    assignments.invalidate(experiment_id)
+    cache.invalidate_experiment(experiment_id, question_ids)
     logger.info(f"Deleted experiment: id={experiment_id}, name={experiment_name}")
 
     return {"message": "Experiment deleted successfully"}
 
 
-@router.get("/experiments/{experiment_id}/stats")
-def get_experiment_stats(experiment_id: int, db: Session = Depends(get_db)):
-    experiment = db.query(Experiment).filter(Experiment.id == experiment_id).first()
-    if not experiment:
-        raise HTTPException(status_code=404, detail="Experiment not found")
+def _experiment_stats(db: Session, experiment_ids: Optional[List[int]] = None) -> List[dict]:
+    """Progress stats for the given experiments (all when None), in one query.
 
-    total_questions = (
-        db.query(Question).filter(Question.experiment_id == experiment_id).count()
+    Rating totals and completion come from the maintained Question.rating_count
+    rather than counting ratings.
+    """
+    question_totals = (
+        db.query(
+            Question.experiment_id,
+            func.count(Question.id).label("total_questions"),
+            func.sum(Question.rating_count).label("total_ratings"),
+            func.sum(
+                case((Question.rating_count >= Experiment.num_ratings_per_question, 1), else_=0)
+            ).label("questions_complete"),
+        )
+        .join(Experiment, Question.experiment_id == Experiment.id)
+        .group_by(Question.experiment_id)
     )
-    total_ratings = (
-        db.query(Rating)
-        .join(Question)
-        .filter(Question.experiment_id == experiment_id)
-        .count()
+    rater_totals = (
+        db.query(Rater.experiment_id, func.count(Rater.id).label("total_raters"))
+        .group_by(Rater.experiment_id)
     )
-    total_raters = (
-        db.query(Rater).filter(Rater.experiment_id == experiment_id).count()
+    experiments = db.query(Experiment)
+    if experiment_ids is not None:
+        question_totals = question_totals.filter(Question.experiment_id.in_(experiment_ids))
+        rater_totals = rater_totals.filter(Rater.experiment_id.in_(experiment_ids))
+        experiments = experiments.filter(Experiment.id.in_(experiment_ids))
+    question_totals = question_totals.subquery()
+    rater_totals = rater_totals.subquery()
+
+    rows = (
+        experiments.with_entities(
+            Experiment.id,
+            Experiment.name,
+            Experiment.num_ratings_per_question,
+            func.coalesce(question_totals.c.total_questions, 0),
+            func.coalesce(question_totals.c.questions_complete, 0),
+            func.coalesce(question_totals.c.total_ratings, 0),
+            func.coalesce(rater_totals.c.total_raters, 0),
+        )
+        .outerjoin(question_totals, Experiment.id == question_totals.c.experiment_id)
+        .outerjoin(rater_totals, Experiment.id == rater_totals.c.experiment_id)
+        .order_by(Experiment.id)
+        .all()
     )
 
-    # Questions with enough ratings
-    questions_complete = (
-        db.query(Question)
-        .filter(Question.experiment_id == experiment_id)
-        .join(Rating)
-        .group_by(Question.id)
-        .having(func.count(Rating.id) >= experiment.num_ratings_per_question)
-        .count()
-    )
+    return [
+        {
+            "experiment_id": experiment_id,
+            "experiment_name": name,
+            "total_questions": total_questions,
+            "questions_complete": questions_complete,
+            "total_ratings": total_ratings,
+            "total_raters": total_raters,
+            "target_ratings_per_question": target,
+        }
+        for experiment_id, name, target, total_questions, questions_complete, total_ratings, total_raters in rows
+    ]
 
-    return {
-        "experiment_name": experiment.name,
-        "total_questions": total_questions,
-        "questions_complete": questions_complete,
-        "total_ratings": total_ratings,
-        "total_raters": total_raters,
-        "target_ratings_per_question": experiment.num_ratings_per_question,
-    }
+
+@router.get("/experiments/{experiment_id}/stats")
+def get_experiment_stats(experiment_id: int, db: Session = Depends(get_db)):
+    stats = _experiment_stats(db, [experiment_id])
+    if not stats:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+
+    return stats[0]
+
+
+@router.get("/stats")
+def get_stats(
+    ids: Optional[str] = Query(None, description="Comma-separated experiment ids; all experiments when omitted"),
+    db: Session = Depends(get_db),
+):
+    experiment_ids = None
+    if ids is not None:
+        try:
+            experiment_ids = [int(i) for i in ids.split(",") if i.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+        if len(experiment_ids) > MAX_STATS_EXPERIMENTS:
+            raise HTTPException(
+                status_code=400, detail=f"At most {MAX_STATS_EXPERIMENTS} experiments per request"
+            )
+
+    return _experiment_stats(db, experiment_ids)
 
 
 @router.get("/experiments/{experiment_id}/analytics")
@@ -327,122 +355,38 @@ def get_experiment_analytics(experiment_id: int, db: Session = Depends(get_db)):
     if not experiment:
         raise HTTPException(status_code=404, detail="Experiment not found")
 
-    # Get all ratings with their questions and raters
-    ratings = (
-        db.query(Rating, Question, Rater)
-        .join(Question, Rating.question_id == Question.id)
-        .join(Rater, Rating.rater_id == Rater.id)
-        .filter(Question.experiment_id == experiment_id)
-        .all()
-    )
+    return analytics.experiment_analytics(db, experiment)
 
-    if not ratings:
-        return {
-            "experiment_name": experiment.name,
-            "overview": {
-                "total_ratings": 0,
-                "total_questions": db.query(Question).filter(Question.experiment_id == experiment_id).count(),
-                "total_raters": 0,
-                "avg_response_time_seconds": 0,
-                "avg_confidence": 0,
-            },
-            "questions": [],
-            "raters": [],
-        }
 
-    # Calculate response times
-    response_times = []
-    confidences = []
-    question_stats = {}
-    rater_stats = {}
-
-    for rating, question, rater in ratings:
-        response_time = (rating.time_submitted - rating.time_started).total_seconds()
-        response_times.append(response_time)
-        confidences.append(rating.confidence)
-
-        # Per-question stats
-        q_id = question.question_id
-        if q_id not in question_stats:
-            question_stats[q_id] = {
-                "question_id": q_id,
-                "question_text": question.question_text[:100] + "..." if len(question.question_text) > 100 else question.question_text,
-                "num_ratings": 0,
-                "response_times": [],
-                "confidences": [],
-                "answers": [],
-            }
-        question_stats[q_id]["num_ratings"] += 1
-        question_stats[q_id]["response_times"].append(response_time)
-        question_stats[q_id]["confidences"].append(rating.confidence)
-        question_stats[q_id]["answers"].append(rating.answer)
-
-        # Per-rater stats
-        r_id = rater.prolific_id
-        if r_id not in rater_stats:
-            rater_stats[r_id] = {
-                "prolific_id": r_id,
-                "study_id": rater.study_id,
-                "session_start": rater.session_start.isoformat() if rater.session_start else None,
-                "session_end": rater.session_end.isoformat() if rater.session_end else None,
-                "is_active": rater.is_active,
-                "num_ratings": 0,
-                "response_times": [],
-                "confidences": [],
-            }
-        rater_stats[r_id]["num_ratings"] += 1
-        rater_stats[r_id]["response_times"].append(response_time)
-        rater_stats[r_id]["confidences"].append(rating.confidence)
-
-    # Compute final question stats
-    questions_list = []
-    for q_id, stats in question_stats.items():
-        # Count answer distribution for MC questions
-        answer_counts = {}
-        for ans in stats["answers"]:
-            answer_counts[ans] = answer_counts.get(ans, 0) + 1
-
-        questions_list.append({
-            "question_id": stats["question_id"],
-            "question_text": stats["question_text"],
-            "num_ratings": stats["num_ratings"],
-            "avg_response_time_seconds": round(sum(stats["response_times"]) / len(stats["response_times"]), 2),
-            "min_response_time_seconds": round(min(stats["response_times"]), 2),
-            "max_response_time_seconds": round(max(stats["response_times"]), 2),
-            "avg_confidence": round(sum(stats["confidences"]) / len(stats["confidences"]), 2),
-            "answer_distribution": answer_counts,
-        })
-
-    # Compute final rater stats
-    raters_list = []
-    for r_id, stats in rater_stats.items():
-        total_time = sum(stats["response_times"])
-        raters_list.append({
-            "prolific_id": stats["prolific_id"],
-            "study_id": stats["study_id"],
-            "session_start": stats["session_start"],
-            "session_end": stats["session_end"],
-            "is_active": stats["is_active"],
-            "num_ratings": stats["num_ratings"],
-            "total_response_time_seconds": round(total_time, 2),
-            "avg_response_time_seconds": round(total_time / stats["num_ratings"], 2),
-            "avg_confidence": round(sum(stats["confidences"]) / len(stats["confidences"]), 2),
-        })
-
-    # Sort raters by number of ratings (descending)
-    raters_list.sort(key=lambda x: x["num_ratings"], reverse=True)
+@router.get("/experiments/{experiment_id}/analytics/questions")
+def get_question_analytics(
+    experiment_id: int,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(analytics.DEFAULT_PAGE_SIZE, ge=1, le=analytics.MAX_PAGE_SIZE),
+    sort: str = Query("question_id", pattern=f"^({'|'.join(analytics.QUESTION_SORTS)})$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    under_quota: bool = Query(False),
+    db: Session = Depends(get_db),
+):
+    experiment = db.query(Experiment).filter(Experiment.id == experiment_id).first()
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
 
-    return {
-        "experiment_name": experiment.name,
-        "overview": {
-            "total_ratings": len(ratings),
-            "total_questions": db.query(Question).filter(Question.experiment_id == experiment_id).count(),
-            "total_raters": len(rater_stats),
-            "avg_response_time_seconds": round(sum(response_times) / len(response_times), 2),
-            "min_response_time_seconds": round(min(response_times), 2),
-            "max_response_time_seconds": round(max(response_times), 2),
-            "avg_confidence": round(sum(confidences) / len(confidences), 2),
-        },
-        "questions": questions_list,
-        "raters": raters_list,
-    }
+    return analytics.question_stats(db, experiment, skip, limit, sort, order, under_quota)
+
+
+@router.get("/experiments/{experiment_id}/analytics/raters")
+def get_rater_analytics(
+    experiment_id: int,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(analytics.DEFAULT_PAGE_SIZE, ge=1, le=analytics.MAX_PAGE_SIZE),
+    sort: str = Query("num_ratings", pattern=f"^({'|'.join(analytics.RATER_SORTS)})$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    max_avg_response_time: Optional[float] = Query(None, gt=0),
+    db: Session = Depends(get_db),
+):
+    experiment = db.query(Experiment).filter(Experiment.id == experiment_id).first()
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+
+    return analytics.rater_stats(db, experiment, skip, limit, sort, order, max_avg_response_time)
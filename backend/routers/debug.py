@@ -0,0 +1,20 @@
+from fastapi import APIRouter, HTTPException
+
+import profiler
+
+# Only included when SQL_PROFILE=1 (see profiler.py)
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+
+@router.get("/profile")
+def list_profiles():
+    """Summaries of the most recently profiled requests, newest first."""
+    return [profile.summary() for profile in profiler.recent()]
+
+
+@router.get("/profile/{profile_id}")
+def get_profile(profile_id: str):
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile.to_dict()
@@ -1,69 +1,180 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import DateTime, delete, exists, func, insert, literal, select, update
 from datetime import datetime, timedelta
-from typing import Optional
-import random
+from typing import Dict, List, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
-from database import get_db
-from models import Experiment, Question, Rating, Rater, SESSION_DURATION_MINUTES
+import analytics
+import cache
+import metrics
+import question_bodies
+import session_tokens
+from assignment import assignments
+from cache import ExperimentConfig
+from database import get_async_db, upsert
+from session_tokens import RaterSession
+from models import Question, QuestionLease, Rating, Rater, SESSION_DURATION_MINUTES
 from schemas import (
     RaterStartResponse,
     QuestionResponse,
     RatingSubmit,
     RatingResponse,
+    RatingBatchItemResult,
+    RatingBatchResponse,
     SessionStatusResponse,
 )
 
+# Rater endpoints are async so concurrent raters are bounded by the database
+# connection pool rather than the threadpool. Shared write logic written
+# against a sync Session runs inside the same transaction via run_sync.
+#
+# After /start, raters identify themselves with the signed session token it
+# returns (see session_tokens.py); the Rater row is only touched to write.
+#
+# Several workers may serve the same rater at once, so writes don't rely on
+# check-then-act: inserts fall back on the unique constraints and ending a
+# session is a conditional update. Sessions that simply run out are marked
+# inactive by the background sweeper (sweeper.py); lease and write paths
+# compare the deadline with the clock, and their writes only take effect
+# while the rater is still active, so an ended session costs no extra query.
 router = APIRouter(prefix="/api/raters", tags=["raters"])
 
+# Upper bound on questions leased to one rater in a single request
+MAX_PREFETCH_QUESTIONS = 10
+
+# Upper bound on ratings accepted by one submit-batch request
+MAX_BATCH_RATINGS = 200
+
+
+def _rater_active(rater_id: int):
+    return exists().where(Rater.id == rater_id, Rater.is_active == True)  # noqa: E712
+
+
+async def _save_leases(db: AsyncSession, question_ids: List[int], rater_id: int, expires_at: datetime) -> bool:
+    """Record (or extend) the rater's leases on the questions in one statement;
+    a concurrent request for the same rater just sets the same expiry.
+
+    Nothing is written unless the session is still active, and questions
+    deleted since the state was loaded are skipped. Returns whether any lease
+    was written.
+    """
+    result = await db.execute(
+        upsert(
+            db.bind.dialect.name,
+            QuestionLease,
+            select(
+                Question.id.label("question_id"),
+                literal(rater_id).label("rater_id"),
+                literal(expires_at, DateTime).label("expires_at"),
+            ).where(Question.id.in_(question_ids), _rater_active(rater_id)),
+            ["question_id", "rater_id"],
+            lambda current, new: {"expires_at": new.expires_at},
+        )
+    )
+    return result.rowcount > 0
+
+
+async def _release_leases(db: AsyncSession, rater_id: int):
+    await db.execute(delete(QuestionLease).where(QuestionLease.rater_id == rater_id))
+
+
+async def _end_rater_session(db: AsyncSession, session: RaterSession):
+    """Mark the session ended; the first caller's end time is kept."""
+    await db.execute(
+        update(Rater)
+        .where(Rater.id == session.rater_id, Rater.is_active == True)  # noqa: E712
+        .values(is_active=False, session_end=datetime.utcnow())
+    )
+    await _release_leases(db, session.rater_id)
+    await db.commit()
+    assignments.release_rater(session.experiment_id, session.rater_id)
+
+
+def rater_session(authorization: Optional[str] = Header(None)) -> RaterSession:
+    """The caller's session, from an `Authorization: Bearer <token>` header."""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(
+            status_code=401, detail="Missing session token", headers={"WWW-Authenticate": "Bearer"}
+        )
+    try:
+        return session_tokens.verify(token)
+    except session_tokens.InvalidToken:
+        raise HTTPException(
+            status_code=401, detail="Invalid session token", headers={"WWW-Authenticate": "Bearer"}
+        )
+
+
+def _check_deadline(session: RaterSession):
+    if session.expired:
+        raise HTTPException(status_code=403, detail="Session expired")
+
+
+async def _check_active(db: AsyncSession, session: RaterSession):
+    """Reject sessions ended early (or deleted raters).
+
+    The token alone can't tell that end-session was called, so the lease and
+    rating writes only take effect while the rater is active; this lookup
+    runs only when one of them wrote nothing, to report why.
+    """
+    is_active = await db.scalar(select(Rater.is_active).where(Rater.id == session.rater_id))
+    if is_active is None:
+        raise HTTPException(status_code=404, detail="Rater not found")
+    if not is_active:
+        raise HTTPException(status_code=403, detail="Session ended")
+
+
+def _session_response(rater: Rater, experiment: ExperimentConfig) -> RaterStartResponse:
+    session_end = rater.session_start + timedelta(minutes=SESSION_DURATION_MINUTES)
+    return RaterStartResponse(
+        rater_id=rater.id,
+        session_start=rater.session_start,
+        session_end_time=session_end,
+        experiment_name=experiment.name,
+        completion_url=experiment.prolific_completion_url,
+        session_token=session_tokens.issue(rater.id, experiment.id, session_end),
+    )
+
+
+def _check_resumable(rater: Rater):
+    session_end = rater.session_start + timedelta(minutes=SESSION_DURATION_MINUTES)
+    if datetime.utcnow() > session_end or not rater.is_active:
+        raise HTTPException(
+            status_code=403,
+            detail="You have already completed a session for this experiment"
+        )
+
 
 @router.post("/start", response_model=RaterStartResponse)
-def start_session(
+async def start_session(
     experiment_id: int = Query(...),
     PROLIFIC_PID: str = Query(...),
     STUDY_ID: Optional[str] = Query(None),
     SESSION_ID: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     # Check experiment exists
-    experiment = db.query(Experiment).filter(Experiment.id == experiment_id).first()
+    experiment = await cache.get_experiment(db, experiment_id)
     if not experiment:
         raise HTTPException(status_code=404, detail="Experiment not found")
 
     # Check if rater already has a session for this experiment
-    existing_rater = (
-        db.query(Rater)
-        .filter(
+    existing_rater = await db.scalar(
+        select(Rater).where(
             Rater.prolific_id == PROLIFIC_PID,
             Rater.experiment_id == experiment_id,
         )
-        .first()
     )
 
     if existing_rater:
-        session_end = existing_rater.session_start + timedelta(
-            minutes=SESSION_DURATION_MINUTES
-        )
-
-        # Check if session has expired
-        if datetime.utcnow() > session_end or not existing_rater.is_active:
-            raise HTTPException(
-                status_code=403,
-                detail="You have already completed a session for this experiment"
-            )
-
-        # Return existing active session
-        return RaterStartResponse(
-            rater_id=existing_rater.id,
-            session_start=existing_rater.session_start,
-            session_end_time=session_end,
-            experiment_name=experiment.name,
-            completion_url=experiment.prolific_completion_url,
-        )
+        # Return existing active session, unless it has expired
+        _check_resumable(existing_rater)
+        return _session_response(existing_rater, experiment)
 
     # Create new rater session (store as naive UTC)
     rater = Rater(
@@ -74,193 +185,386 @@ def start_session(
         session_start=datetime.utcnow(),
         is_active=True,
     )
-    db.add(rater)
-    db.commit()
-    db.refresh(rater)
+    try:
+        async with db.begin_nested():
+            db.add(rater)
+    except IntegrityError:
+        # A concurrent start for the same participant created the session
+        existing_rater = await db.scalar(
+            select(Rater).where(
+                Rater.prolific_id == PROLIFIC_PID,
+                Rater.experiment_id == experiment_id,
+            )
+        )
+        if existing_rater is None:
+            # Not a duplicate: the (cached) experiment has since been deleted
+            await cache.run(cache.invalidate_experiment, experiment_id)
+            raise HTTPException(status_code=404, detail="Experiment not found")
+        _check_resumable(existing_rater)
+        return _session_response(existing_rater, experiment)
+    await db.commit()
+    metrics.SESSIONS_STARTED.inc()
     logger.info(f"New rater session: rater_id={rater.id}, prolific_id={PROLIFIC_PID}, experiment_id={experiment_id}")
 
-    session_end = rater.session_start + timedelta(
-        minutes=SESSION_DURATION_MINUTES
-    )
-
-    return RaterStartResponse(
-        rater_id=rater.id,
-        session_start=rater.session_start,
-        session_end_time=session_end,
-        experiment_name=experiment.name,
-        completion_url=experiment.prolific_completion_url,
-    )
+    return _session_response(rater, experiment)
 
 
-@router.get("/next-question", response_model=Optional[QuestionResponse])
-def get_next_question(rater_id: int = Query(...), db: Session = Depends(get_db)):
-    # Get rater and check session
-    rater = db.query(Rater).filter(Rater.id == rater_id).first()
-    if not rater:
-        raise HTTPException(status_code=404, detail="Rater not found")
+async def _lease_questions(db: AsyncSession, session: RaterSession, n: int) -> List[QuestionResponse]:
+    """Check the rater's session and lease up to n questions to them."""
+    _check_deadline(session)
+    rater_id = session.rater_id
 
-    experiment = (
-        db.query(Experiment).filter(Experiment.id == rater.experiment_id).first()
-    )
+    experiment = await cache.get_experiment(db, session.experiment_id)
     if not experiment:
         raise HTTPException(status_code=404, detail="Experiment not found")
 
-    # Check if session expired (all times are naive UTC)
-    session_end = rater.session_start + timedelta(
-        minutes=SESSION_DURATION_MINUTES
+    # Lease the least-rated questions this rater hasn't rated, from the in-process engine
+    state = await assignments.get_async(db, experiment)
+    while True:
+        question_ids, expires_at = state.lease(rater_id, n)
+        if not question_ids:
+            # No more questions available for this rater
+            await _check_active(db, session)
+            return []
+        # Ratings submitted through another worker aren't in this worker's
+        # state yet; record them and lease again
+        rated_elsewhere = list(
+            await db.scalars(
+                select(Rating.question_id).where(
+                    Rating.rater_id == rater_id, Rating.question_id.in_(question_ids)
+                )
+            )
+        )
+        if not rated_elsewhere:
+            break
+        for question_id in rated_elsewhere:
+            state.record_rating(question_id, rater_id)
+    try:
+        saved = await _save_leases(db, question_ids, rater_id, expires_at)
+        await db.commit()
+    except IntegrityError:
+        # A leased question (or the rater) was deleted since the state was loaded
+        await db.rollback()
+        assignments.invalidate(experiment.id)
+        raise HTTPException(status_code=503, detail="Question assignment is being refreshed, please retry")
+    if not saved:
+        # The session was ended, or the questions deleted, since the state
+        # was loaded; the latter is handled below
+        state.release_rater(rater_id)
+        await _check_active(db, session)
+
+    # Only what raters are shown; ground truth and metadata stay unloaded
+    questions = {
+        q.id: q
+        for q in await db.scalars(
+            select(Question)
+            .options(
+                load_only(
+                    Question.question_id,
+                    Question.question_text,
+                    Question.options,
+                    Question.question_type,
+                    Question.text_hash,
+                )
+            )
+            .where(Question.id.in_(question_ids))
+        )
+    }
+    if len(questions) != len(question_ids):
+        # Engine state is stale (e.g. questions removed); reload on next request
+        assignments.invalidate(experiment.id)
+        raise HTTPException(status_code=503, detail="Question assignment is being refreshed, please retry")
+
+    bodies = await db.run_sync(question_bodies.load, [q.text_hash for q in questions.values()])
+    return [_question_response(questions[question_id], bodies) for question_id in question_ids]
+
+
+def _apply_ratings(db: Session, rater_id: int, rows: List[dict], question_experiments: Dict[int, int]) -> bool:
+    """Bump the counters of newly rated questions, release the rater's leases
+    on them and fold the ratings into the analytics summaries.
+
+    Runs in the same transaction as the rating inserts; rows are the inserted
+    rating values, with each question id appearing at most once, and
+    question_experiments maps each question id to its experiment. Returns
+    False, having changed nothing, if the rater's session is no longer
+    active; the caller rolls back.
+    """
+    question_ids = [row["question_id"] for row in rows]
+    updated = db.query(Question).filter(Question.id.in_(question_ids), _rater_active(rater_id)).update(
+        {Question.rating_count: Question.rating_count + 1},
+        synchronize_session=False,
     )
-    if datetime.utcnow() > session_end:
-        rater.is_active = False
-        rater.session_end = datetime.utcnow()
-        db.commit()
-        raise HTTPException(status_code=403, detail="Session expired")
-
-    # Get questions this rater has already rated
-    rated_question_ids = (
-        db.query(Rating.question_id).filter(Rating.rater_id == rater_id).subquery()
+    if updated != len(question_ids):
+        return False
+    db.query(QuestionLease).filter(
+        QuestionLease.rater_id == rater_id,
+        QuestionLease.question_id.in_(question_ids),
+    ).delete(synchronize_session=False)
+    analytics.record_ratings(
+        db,
+        [
+            dict(row, rater_id=rater_id, experiment_id=question_experiments[row["question_id"]])
+            for row in rows
+        ],
     )
+    return True
 
-    # Get rating counts per question
-    rating_counts = (
-        db.query(Question.id, func.count(Rating.id).label("count"))
-        .outerjoin(Rating)
-        .filter(Question.experiment_id == rater.experiment_id)
-        .group_by(Question.id)
-        .subquery()
-    )
 
-    # Find questions that:
-    # 1. This rater hasn't rated
-    # 2. Have fewer than num_ratings_per_question ratings
-    eligible_questions = (
-        db.query(Question, rating_counts.c.count)
-        .outerjoin(rating_counts, Question.id == rating_counts.c.id)
-        .filter(
-            Question.experiment_id == rater.experiment_id,
-            ~Question.id.in_(rated_question_ids),
-        )
-        .all()
+def _question_response(question: Question, bodies: Dict[str, str]) -> QuestionResponse:
+    return QuestionResponse(
+        id=question.id,
+        question_id=question.question_id,
+        question_text=question_bodies.full_text(bodies, question.text_hash, question.question_text),
+        options=question.options,
+        question_type=question.question_type,
     )
 
-    # Separate into under-quota and at-quota questions
-    under_quota = []
-    at_quota = []
 
-    for question, count in eligible_questions:
-        count = count or 0
-        if count < experiment.num_ratings_per_question:
-            under_quota.append((question, count))
-        else:
-            at_quota.append(question)
-
-    # Prioritize questions with fewer ratings
-    if under_quota:
-        # Sort by count (ascending) to prioritize questions with fewer ratings
-        under_quota.sort(key=lambda x: x[1])
-        # Get questions with minimum count
-        min_count = under_quota[0][1]
-        min_questions = [q for q, c in under_quota if c == min_count]
-        selected = random.choice(min_questions)
-    elif at_quota:
-        # All questions have enough ratings, sample uniformly
-        selected = random.choice(at_quota)
-    else:
-        # No more questions available for this rater
+@router.get("/next-question", response_model=Optional[QuestionResponse])
+async def get_next_question(
+    session: RaterSession = Depends(rater_session), db: AsyncSession = Depends(get_async_db)
+):
+    questions = await _lease_questions(db, session, 1)
+    if not questions:
         return None
+    return questions[0]
 
-    return QuestionResponse(
-        id=selected.id,
-        question_id=selected.question_id,
-        question_text=selected.question_text,
-        options=selected.options,
-        question_type=selected.question_type,
-    )
 
+@router.get("/next-questions", response_model=List[QuestionResponse])
+async def get_next_questions(
+    n: int = Query(2, ge=1, le=MAX_PREFETCH_QUESTIONS),
+    session: RaterSession = Depends(rater_session),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Lease a batch of questions so the client can prefetch the next one.
 
-@router.post("/submit", response_model=RatingResponse)
-def submit_rating(rating: RatingSubmit, rater_id: int = Query(...), db: Session = Depends(get_db)):
-    # Verify rater exists and is active
-    rater = db.query(Rater).filter(Rater.id == rater_id).first()
-    if not rater:
-        raise HTTPException(status_code=404, detail="Rater not found")
-    if not rater.is_active:
-        raise HTTPException(status_code=403, detail="Session expired")
+    Questions already leased to the rater come first, so a client that shows
+    the first and keeps the rest in reserve can call this again after each
+    submit to top up its queue.
+    """
+    return await _lease_questions(db, session, n)
 
-    # Verify question exists
-    question = db.query(Question).filter(Question.id == rating.question_id).first()
-    if not question:
-        raise HTTPException(status_code=404, detail="Question not found")
 
-    # Check if rater already rated this question
-    existing = (
-        db.query(Rating)
-        .filter(Rating.rater_id == rater_id, Rating.question_id == rating.question_id)
-        .first()
-    )
-    if existing:
-        raise HTTPException(status_code=400, detail="Already rated this question")
+@router.post("/submit", response_model=RatingResponse)
+async def submit_rating(
+    rating: RatingSubmit,
+    session: RaterSession = Depends(rater_session),
+    db: AsyncSession = Depends(get_async_db),
+):
+    _check_deadline(session)
+    rater_id = session.rater_id
+
+    # Verify question exists in the rater's experiment
+    question_experiment_id = (
+        await cache.get_question_experiments(db, [rating.question_id])
+    ).get(rating.question_id)
+    if question_experiment_id != session.experiment_id:
+        raise HTTPException(status_code=404, detail="Question not found")
 
     # Validate confidence
     if rating.confidence < 1 or rating.confidence > 5:
         raise HTTPException(status_code=400, detail="Confidence must be between 1 and 5")
 
     # Create rating
-    db_rating = Rating(
-        question_id=rating.question_id,
-        rater_id=rater_id,
-        answer=rating.answer,
-        confidence=rating.confidence,
-        time_started=rating.time_started,
-        time_submitted=datetime.utcnow(),
-    )
+    values = {
+        "question_id": rating.question_id,
+        "answer": rating.answer,
+        "confidence": rating.confidence,
+        "time_started": rating.time_started,
+        "time_submitted": datetime.utcnow(),
+    }
+    db_rating = Rating(rater_id=rater_id, **values)
     db.add(db_rating)
-    db.commit()
-    db.refresh(db_rating)
+    try:
+        await db.flush()
+    except IntegrityError:
+        await db.rollback()
+        already_rated = await db.scalar(
+            select(Rating.id).where(Rating.rater_id == rater_id, Rating.question_id == rating.question_id)
+        )
+        if already_rated is not None:
+            # Rated before, possibly by a concurrent submit
+            raise HTTPException(status_code=400, detail="Already rated this question")
+        # A foreign-key violation: the question was deleted, but another
+        # worker's cache still had it
+        await cache.run(cache.invalidate_questions, [rating.question_id])
+        raise HTTPException(status_code=404, detail="Question not found")
+
+    if not await db.run_sync(
+        _apply_ratings, rater_id, [values], {rating.question_id: question_experiment_id}
+    ):
+        await db.rollback()
+        await _check_active(db, session)
+        raise HTTPException(status_code=409, detail="Rating could not be recorded, please retry")
+    await db.commit()
+    assignments.record_rating(question_experiment_id, rating.question_id, rater_id)
+    metrics.RATINGS_SUBMITTED.inc()
     logger.info(f"Rating submitted: rating_id={db_rating.id}, rater_id={rater_id}, question_id={rating.question_id}")
 
     return RatingResponse(id=db_rating.id, success=True)
 
 
-@router.get("/session-status", response_model=SessionStatusResponse)
-def get_session_status(rater_id: int = Query(...), db: Session = Depends(get_db)):
-    rater = db.query(Rater).filter(Rater.id == rater_id).first()
-    if not rater:
-        raise HTTPException(status_code=404, detail="Rater not found")
+def _classify_batch(
+    ratings: List[RatingSubmit],
+    rater_id: int,
+    question_experiments: Dict[int, int],
+    already_rated: set,
+):
+    """Return each rating's status and the rows to insert for the created ones."""
+    statuses = []
+    rows = []
+    now = datetime.utcnow()
+    for rating in ratings:
+        if rating.question_id not in question_experiments:
+            statuses.append("not_found")
+        elif rating.question_id in already_rated:
+            statuses.append("duplicate")
+        elif rating.confidence < 1 or rating.confidence > 5:
+            statuses.append("invalid")
+        else:
+            statuses.append("created")
+            already_rated.add(rating.question_id)
+            rows.append(
+                {
+                    "question_id": rating.question_id,
+                    "rater_id": rater_id,
+                    "answer": rating.answer,
+                    "confidence": rating.confidence,
+                    "time_started": rating.time_started,
+                    "time_submitted": now,
+                }
+            )
+    return statuses, rows
 
-    experiment = (
-        db.query(Experiment).filter(Experiment.id == rater.experiment_id).first()
-    )
 
-    session_end = rater.session_start + timedelta(
-        minutes=SESSION_DURATION_MINUTES
+@router.post("/submit-batch", response_model=RatingBatchResponse)
+async def submit_ratings(
+    ratings: List[RatingSubmit] = Body(..., max_length=MAX_BATCH_RATINGS),
+    session: RaterSession = Depends(rater_session),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Submit several buffered ratings in one transaction.
+
+    Each item is reported individually: "created", "duplicate" (already rated,
+    or repeated within the batch), "not_found" (unknown question) or
+    "invalid" (confidence out of range).
+    """
+    _check_deadline(session)
+    rater_id = session.rater_id
+
+    question_ids = {r.question_id for r in ratings}
+    # A concurrent request can rate one of these questions between the check
+    # and the insert; the unique constraint rejects the batch, and the retry
+    # then sees that rating and reports it as a duplicate. The foreign key
+    # rejects it when a question was deleted but still cached; the retry looks
+    # the questions up again and reports it as not found.
+    for attempt in range(2):
+        # Questions from other experiments are reported as not found
+        question_experiments = {
+            question_id: experiment_id
+            for question_id, experiment_id in (await cache.get_question_experiments(db, question_ids)).items()
+            if experiment_id == session.experiment_id
+        }
+        already_rated = set(
+            await db.scalars(
+                select(Rating.question_id).where(
+                    Rating.rater_id == rater_id,
+                    Rating.question_id.in_(question_ids),
+                )
+            )
+        )
+        statuses, rows = _classify_batch(ratings, rater_id, question_experiments, already_rated)
+        if not rows:
+            break
+        try:
+            await db.execute(insert(Rating), rows)
+            applied = await db.run_sync(_apply_ratings, rater_id, rows, question_experiments)
+        except IntegrityError:
+            await db.rollback()
+            if attempt:
+                raise
+            await cache.run(cache.invalidate_questions, question_ids)
+            continue
+        if not applied:
+            await db.rollback()
+            await _check_active(db, session)
+            raise HTTPException(status_code=409, detail="Ratings could not be recorded, please retry")
+        await db.commit()
+        break
+
+    rating_ids = {}
+    if rows:
+        created_ids = [row["question_id"] for row in rows]
+        rating_ids = dict(
+            (await db.execute(
+                select(Rating.question_id, Rating.id).where(
+                    Rating.rater_id == rater_id,
+                    Rating.question_id.in_(created_ids),
+                )
+            )).all()
+        )
+        for question_id in created_ids:
+            assignments.record_rating(question_experiments[question_id], question_id, rater_id)
+        metrics.RATINGS_SUBMITTED.inc(amount=len(rows))
+        logger.info(f"Ratings submitted: count={len(rows)}, rater_id={rater_id}")
+
+    return RatingBatchResponse(
+        results=[
+            RatingBatchItemResult(
+                question_id=rating.question_id,
+                status=status,
+                id=rating_ids.get(rating.question_id) if status == "created" else None,
+            )
+            for rating, status in zip(ratings, statuses)
+        ],
+        created=len(rows),
     )
-    time_remaining = (session_end - datetime.utcnow()).total_seconds()
 
-    if time_remaining <= 0:
-        rater.is_active = False
-        rater.session_end = datetime.utcnow()
-        db.commit()
-        time_remaining = 0
 
-    questions_completed = (
-        db.query(Rating).filter(Rating.rater_id == rater_id).count()
-    )
+@router.get("/session-status", response_model=SessionStatusResponse)
+async def get_session_status(
+    session: RaterSession = Depends(rater_session), db: AsyncSession = Depends(get_async_db)
+):
+    time_remaining = (session.expires_at - datetime.utcnow()).total_seconds()
+
+    # is_active reflects a session ended early; one that has run out may not
+    # have been swept yet
+    row = (
+        await db.execute(
+            select(
+                Rater.is_active,
+                select(func.count(Rating.id)).where(Rating.rater_id == session.rater_id).scalar_subquery(),
+            ).where(Rater.id == session.rater_id)
+        )
+    ).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Rater not found")
+    is_active, questions_completed = row
 
     return SessionStatusResponse(
-        is_active=rater.is_active,
+        is_active=is_active and time_remaining > 0,
         time_remaining_seconds=max(0, int(time_remaining)),
         questions_completed=questions_completed,
     )
 
 
-@router.post("/end-session")
-def end_session(rater_id: int = Query(...), db: Session = Depends(get_db)):
-    rater = db.query(Rater).filter(Rater.id == rater_id).first()
-    if not rater:
-        raise HTTPException(status_code=404, detail="Rater not found")
+@router.post("/release-leases")
+async def release_leases(
+    session: RaterSession = Depends(rater_session), db: AsyncSession = Depends(get_async_db)
+):
+    """Hand the rater's reserved questions back to the pool; the session goes on."""
+    await _release_leases(db, session.rater_id)
+    await db.commit()
+    assignments.release_rater(session.experiment_id, session.rater_id)
+
+    return {"message": "Leases released"}
 
-    rater.is_active = False
-    rater.session_end = datetime.utcnow()
-    db.commit()
+
+@router.post("/end-session")
+async def end_session(
+    session: RaterSession = Depends(rater_session), db: AsyncSession = Depends(get_async_db)
+):
+    # Also hands any questions still reserved for this rater back to the pool
+    await _end_rater_session(db, session)
 
     return {"message": "Session ended successfully"}
@@ -0,0 +1,47 @@
+"""Database schema management with Alembic (revisions in migrations/versions).
+
+migrate() upgrades the database to the latest revision, including databases
+created before migrations existed (the baseline revision adopts them), and
+then runs data steps that need the application models.
+"""
+import logging
+import os
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+
+import analytics
+from database import SessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+
+def alembic_config(connection=None) -> Config:
+    config = Config(ALEMBIC_INI)
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def current_revision() -> str:
+    with engine.connect() as connection:
+        return MigrationContext.configure(connection).get_current_revision()
+
+
+def head_revision() -> str:
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+def migrate():
+    """Upgrade the database schema to the latest revision."""
+    with engine.begin() as connection:
+        config = alembic_config(connection)
+        command.upgrade(config, "head")
+
+    if config.attributes.get("rebuild_analytics"):
+        with SessionLocal() as db:
+            analytics.rebuild_all(db)
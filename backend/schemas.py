@@ -42,6 +42,8 @@ class RaterStartResponse(BaseModel):
     session_end_time: datetime
     experiment_name: str
     completion_url: Optional[str] = None
+    # Sent back as `Authorization: Bearer <token>` on the other rater endpoints
+    session_token: str
 
 
 class SessionStatusResponse(BaseModel):
@@ -61,3 +63,14 @@ class RatingSubmit(BaseModel):
 class RatingResponse(BaseModel):
     id: int
     success: bool
+
+
+class RatingBatchItemResult(BaseModel):
+    question_id: int
+    status: str  # created, duplicate, not_found or invalid
+    id: Optional[int] = None
+
+
+class RatingBatchResponse(BaseModel):
+    results: List[RatingBatchItemResult]
+    created: int
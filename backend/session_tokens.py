@@ -0,0 +1,76 @@
+"""Signed rater session tokens.
+
+/api/raters/start hands the rater a token carrying their rater id,
+experiment id and session deadline, signed with HMAC-SHA256. The other rater
+endpoints take it as `Authorization: Bearer <token>`, so they know who is
+calling and whether the session has run out without looking up the Rater,
+and a rater can't act under someone else's id.
+
+All workers must share SESSION_TOKEN_SECRET. Without it a random secret is
+generated per process, which is only suitable for a single local process:
+tokens stop working on restart.
+"""
+from datetime import datetime
+from typing import NamedTuple
+import base64
+import calendar
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+
+logger = logging.getLogger(__name__)
+
+SESSION_TOKEN_SECRET = os.getenv("SESSION_TOKEN_SECRET")
+if not SESSION_TOKEN_SECRET:
+    logger.warning("SESSION_TOKEN_SECRET is not set; rater tokens will only be valid in this process")
+    SESSION_TOKEN_SECRET = secrets.token_urlsafe(32)
+
+_key = SESSION_TOKEN_SECRET.encode("utf-8")
+
+
+class InvalidToken(Exception):
+    """The token is malformed or its signature doesn't match."""
+
+
+class RaterSession(NamedTuple):
+    rater_id: int
+    experiment_id: int
+    expires_at: datetime  # Naive UTC, whole seconds
+
+    @property
+    def expired(self) -> bool:
+        return datetime.utcnow() > self.expires_at
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(_key, payload, hashlib.sha256).digest()
+
+
+def issue(rater_id: int, experiment_id: int, expires_at: datetime) -> str:
+    payload = f"{rater_id}.{experiment_id}.{calendar.timegm(expires_at.utctimetuple())}".encode("ascii")
+    return f"{_b64encode(payload)}.{_b64encode(_sign(payload))}"
+
+
+def verify(token: str) -> RaterSession:
+    """Return the session a token was issued for; doesn't check expiry."""
+    try:
+        encoded_payload, encoded_signature = token.split(".")
+        payload = _b64decode(encoded_payload)
+        signature = _b64decode(encoded_signature)
+    except ValueError:
+        raise InvalidToken("Malformed session token")
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise InvalidToken("Invalid session token signature")
+
+    rater_id, experiment_id, expires_at = (int(part) for part in payload.decode("ascii").split("."))
+    return RaterSession(rater_id, experiment_id, datetime.utcfromtimestamp(expires_at))
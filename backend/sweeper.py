@@ -0,0 +1,83 @@
+"""Background expiry of rater sessions and question leases.
+
+Rater endpoints work out whether a session has run out from its deadline
+(in the session token, or session_start for /start) and never write to
+expire it. Instead each worker periodically marks every overdue session
+inactive with one UPDATE, so a cohort that started together doesn't turn a
+burst of reads into a burst of writes when its hour is up. Running the sweep
+in several workers is harmless: it only touches sessions still marked
+active.
+
+The same transaction deletes the leases of the sessions it ends and every
+lease past its expires_at, so question_leases only holds live leases; both
+statements select by condition, so a backlog of any size is one sweep. The
+sweeping worker also releases the ended sessions' leases from its assignment
+state (where UPDATE ... RETURNING is available); other workers drop them when
+they expire or on their next resync.
+"""
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import os
+from typing import Tuple
+
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.exc import OperationalError
+
+from assignment import assignments
+from database import AsyncSessionLocal
+from models import QuestionLease, Rater, SESSION_DURATION_MINUTES
+
+logger = logging.getLogger(__name__)
+
+# Seconds between sweeps; 0 disables the sweeper
+SESSION_SWEEP_SECONDS = float(os.getenv("SESSION_SWEEP_SECONDS", "60"))
+
+
+async def expire_sessions() -> Tuple[int, int]:
+    """Mark sessions past SESSION_DURATION_MINUTES inactive and delete their
+    leases and all expired ones; returns (sessions, leases) removed."""
+    now = datetime.utcnow()
+    overdue = (
+        Rater.is_active == True,  # noqa: E712
+        Rater.session_start < now - timedelta(minutes=SESSION_DURATION_MINUTES),
+    )
+    async with AsyncSessionLocal() as db:
+        # Before the UPDATE, while the overdue sessions are still active
+        leases = await db.execute(
+            delete(QuestionLease).where(
+                or_(
+                    QuestionLease.expires_at < now,
+                    QuestionLease.rater_id.in_(select(Rater.id).where(*overdue)),
+                )
+            )
+        )
+        statement = update(Rater).where(*overdue).values(is_active=False, session_end=now)
+        if db.bind.dialect.update_returning:
+            expired = (await db.execute(statement.returning(Rater.id, Rater.experiment_id))).all()
+            sessions = len(expired)
+        else:
+            # MySQL: other workers' states drop the leases when they expire
+            # or on their next resync, and so does this one's
+            expired = []
+            sessions = (await db.execute(statement)).rowcount
+        await db.commit()
+    for rater_id, experiment_id in expired:
+        assignments.release_rater(experiment_id, rater_id)
+    return sessions, leases.rowcount
+
+
+async def run(interval: float = SESSION_SWEEP_SECONDS):
+    """Sweep every interval seconds until cancelled."""
+    while True:
+        try:
+            sessions, leases = await expire_sessions()
+            if sessions or leases:
+                logger.info(f"Expired {sessions} rater sessions and {leases} question leases")
+        except OperationalError as e:
+            # e.g. SQLite busy; the next sweep picks these up
+            logger.warning(f"Session sweep failed: {e}")
+        except Exception:
+            # Keep sweeping; a failure here shouldn't stop expiry for good
+            logger.exception("Session sweep failed")
+        await asyncio.sleep(interval)
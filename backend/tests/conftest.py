@@ -0,0 +1,76 @@
+import os
+import sys
+import tempfile
+import time
+
+# The backend modules import each other by top-level name (see main.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Set before the backend modules create their engines. Tests run against a
+# scratch SQLite database unless DATABASE_URL names another scratch database.
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
+os.environ.setdefault("SESSION_SWEEP_SECONDS", "0")
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def client():
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
+
+
+def questions_csv(count: int, text: str = "text {i}") -> str:
+    return "question_id,question_text,gt_answer,options,question_type\n" + "".join(
+        f'q{i},{text.format(i=i)},A,"A,B",MC\n' for i in range(count)
+    )
+
+
+def wait_for_upload(client, job_id: int) -> dict:
+    while True:
+        job = client.get(f"/api/admin/uploads/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.01)
+
+
+def upload(client, experiment_id: int, csv_data: str, filename: str = "questions.csv") -> dict:
+    response = client.post(
+        f"/api/admin/experiments/{experiment_id}/upload", files={"file": (filename, csv_data, "text/csv")}
+    )
+    assert response.status_code == 202, response.text
+    return wait_for_upload(client, response.json()["job_id"])
+
+
+@pytest.fixture
+def make_experiment(client):
+    """Create an experiment with `questions` uploaded questions; returns its id."""
+
+    def make(questions: int = 5, num_ratings_per_question: int = 2) -> int:
+        experiment = client.post(
+            "/api/admin/experiments",
+            json={"name": "test", "num_ratings_per_question": num_ratings_per_question},
+        ).json()
+        if questions:
+            assert upload(client, experiment["id"], questions_csv(questions))["status"] == "completed"
+        return experiment["id"]
+
+    return make
+
+
+@pytest.fixture
+def start_rater(client):
+    """Start a session; returns the Authorization headers for its token."""
+    counter = iter(range(10**9))
+
+    def start(experiment_id: int) -> dict:
+        response = client.post(
+            f"/api/raters/start?experiment_id={experiment_id}&PROLIFIC_PID=p{next(counter)}-{time.monotonic_ns()}"
+        )
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['session_token']}"}
+
+    return start
@@ -0,0 +1,87 @@
+"""Incrementally maintained analytics summaries (see analytics.py)."""
+from datetime import datetime, timedelta
+import json
+
+import pytest
+from sqlalchemy import insert, select
+
+import analytics
+from database import SessionLocal
+from models import Question, QuestionStats, Rater, RaterStats, Rating
+
+
+def summaries(db, experiment_id: int):
+    def rows(model, key):
+        found = {}
+        for row in db.scalars(select(model).where(model.experiment_id == experiment_id)):
+            values = {column.name: getattr(row, column.name) for column in model.__table__.columns}
+            if "answer_counts" in values:
+                values["answer_counts"] = json.loads(values["answer_counts"])
+            found[values.pop(key)] = values
+        return found
+
+    return rows(QuestionStats, "question_id"), rows(RaterStats, "rater_id")
+
+
+def approx(summaries):
+    """Sums of response times differ slightly: SQLite's julianday() resolves
+    timestamps to about a millisecond."""
+    return [
+        {
+            key: {
+                name: pytest.approx(
+                    value, rel=analytics.CHECK_REL_TOLERANCE, abs=analytics.CHECK_ABS_TOLERANCE
+                ) if isinstance(value, float) else value
+                for name, value in values.items()
+            }
+            for key, values in rows.items()
+        }
+        for rows in summaries
+    ]
+
+
+def rate(db, experiment_id: int, raters, question_ids, start: datetime):
+    """Insert one rating per rater and question and record them as one batch."""
+    ratings = []
+    for i, rater_id in enumerate(raters):
+        for j, question_id in enumerate(question_ids):
+            ratings.append(
+                {
+                    "question_id": question_id,
+                    "rater_id": rater_id,
+                    "answer": "AB"[(i + j) % 2],
+                    "confidence": 1 + (i * 3 + j) % 5,
+                    "time_started": start,
+                    "time_submitted": start + timedelta(seconds=1.5 * (i + 1) + j),
+                }
+            )
+    db.execute(insert(Rating), ratings)
+    analytics.record_ratings(db, [dict(rating, experiment_id=experiment_id) for rating in ratings])
+    db.commit()
+
+
+def test_record_ratings_matches_rebuild(make_experiment):
+    experiment_id = make_experiment(questions=4)
+    start = datetime.utcnow().replace(microsecond=0)
+    with SessionLocal() as db:
+        question_ids = list(db.scalars(select(Question.id).where(Question.experiment_id == experiment_id)))
+        db.execute(
+            insert(Rater),
+            [{"prolific_id": f"analytics-{i}", "experiment_id": experiment_id, "session_start": start} for i in range(4)],
+        )
+        raters = list(db.scalars(select(Rater.id).where(Rater.experiment_id == experiment_id)))
+        # Several raters and questions per batch, and batches adding to
+        # existing summaries
+        rate(db, experiment_id, raters[:3], question_ids[:3], start)
+        rate(db, experiment_id, raters[3:], question_ids, start)
+        rate(db, experiment_id, raters[:3], question_ids[3:], start)
+
+        assert analytics.check(db, experiment_id) == []
+        incremental = summaries(db, experiment_id)
+        analytics.rebuild(db, experiment_id)
+        assert list(summaries(db, experiment_id)) == approx(incremental)
+
+    question_stats, rater_stats = incremental
+    assert sum(stats["num_ratings"] for stats in question_stats.values()) == 16
+    assert question_stats[question_ids[0]]["answer_counts"] == {"A": 3, "B": 1}
+    assert rater_stats[raters[3]]["num_ratings"] == 4
@@ -0,0 +1,152 @@
+"""In-process next-question assignment (see assignment.py)."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+import assignment
+from assignment import AssignmentEngine, ExperimentAssignment, _IndexedSet
+from database import SessionLocal
+from models import Experiment, Rater, SESSION_DURATION_MINUTES
+
+
+def loaded(counts, rated=(), leases=(), num_ratings_per_question=3) -> ExperimentAssignment:
+    """State for question id -> rating count, as if read from the database."""
+    state = ExperimentAssignment(1, num_ratings_per_question)
+    state.apply((list(counts.items()), list(rated), list(leases)))
+    return state
+
+
+def test_indexed_set():
+    items = _IndexedSet()
+    for item in (1, 2, 3, 2):
+        items.add(item)
+    assert sorted(items) == [1, 2, 3]
+    items.discard(1)
+    items.discard(4)
+    assert sorted(items) == [2, 3]
+    assert len(items) == 2
+    assert {items.choice() for _ in range(50)} == {2, 3}
+    items.discard(3)
+    items.discard(2)
+    assert len(items) == 0
+
+
+def test_leases_least_rated_questions_first():
+    state = loaded({1: 2, 2: 0, 3: 1})
+    assert state.lease(rater_id=10)[0] == [2]
+    # Question 2 now counts its lease, so 2 and 3 both have one
+    assert sorted(state.lease(rater_id=11, n=2)[0]) == [2, 3]
+    # All three are at two now
+    assert sorted(state.lease(rater_id=12, n=3)[0]) == [1, 2, 3]
+    assert state._counts == {1: 3, 2: 3, 3: 3}
+
+
+def test_rated_and_leased_questions_are_excluded():
+    state = loaded({1: 0, 2: 0, 3: 0, 4: 5}, rated=[(10, 1)])
+    first, _ = state.lease(rater_id=10)
+    assert first[0] in (2, 3)
+    # Held leases come back first, then new ones; never a rated question
+    leased, _ = state.lease(rater_id=10, n=3)
+    assert leased[0] == first[0]
+    assert sorted(leased) == [2, 3, 4]
+    # Every question is rated or leased by this rater
+    assert state.lease(rater_id=10, n=4)[0] == leased
+
+
+def test_rater_who_rated_everything_gets_nothing():
+    state = loaded({1: 0, 2: 0}, rated=[(10, 1), (10, 2)])
+    assert state.lease(rater_id=10, n=2)[0] == []
+
+
+def test_expired_leases_stop_counting():
+    state = loaded({1: 0, 2: 0})
+    assert state.lease(rater_id=10, ttl_seconds=-1)[0] in ([1], [2])
+    leased, _ = state.lease(rater_id=11, n=2)
+    # The first lease expired, so both questions are back at 0 and 11 gets both
+    assert sorted(leased) == [1, 2]
+    assert state._counts == {1: 1, 2: 1}
+    assert 10 not in state._leases
+
+
+def test_extended_lease_outlives_its_old_expiry():
+    state = loaded({1: 0})
+    state.lease(rater_id=10, ttl_seconds=-1)
+    # Re-leasing expires the old lease first, then leases the question again
+    assert state.lease(rater_id=10)[0] == [1]
+    state._expire_leases(datetime.utcnow())
+    assert state._counts == {1: 1}
+
+
+def test_release_and_rating_update_counts():
+    state = loaded({1: 0, 2: 0})
+    leased, _ = state.lease(rater_id=10, n=2)
+    state.record_rating(leased[0], 10)
+    # A rated lease already counted toward the quota
+    assert state._counts == {1: 1, 2: 1}
+    state.record_rating(leased[0], 10)
+    assert state._counts == {1: 1, 2: 1}
+    state.release_rater(10)
+    assert state._counts == {leased[0]: 1, leased[1]: 0}
+    assert state.lease(rater_id=10, n=2)[0] == [leased[1]]
+
+
+def test_changes_before_load_are_replayed():
+    state = ExperimentAssignment(1, 3)
+    state.record_rating(1, 10)
+    assert state._counts == {}
+    state.apply(([(1, 0), (2, 0)], [], []))
+    assert state._counts == {1: 1, 2: 0}
+    assert state.lease(rater_id=10)[0] == [2]
+
+
+def test_loaded_leases_count_unless_rated():
+    future = datetime.utcnow() + timedelta(minutes=5)
+    state = loaded({1: 1, 2: 0}, rated=[(10, 1)], leases=[(10, 1, future), (11, 2, future)])
+    assert state._counts == {1: 1, 2: 1}
+    assert state.lease(rater_id=11)[0] == [2]
+
+
+def test_stale_state_is_reloaded(monkeypatch):
+    engine = AssignmentEngine()
+    experiment = Experiment(id=1, num_ratings_per_question=3)
+    state, must_load = engine._claim(experiment)
+    assert must_load
+    state.apply(([(1, 0)], [], []))
+    assert engine._claim(experiment) == (state, False)
+
+    monkeypatch.setattr(assignment, "ASSIGNMENT_RESYNC_SECONDS", 0.001)
+    state.loaded_at -= 1
+    fresh, must_load = engine._claim(experiment)
+    assert must_load and fresh is not state
+
+
+@pytest.fixture
+def warm_experiments(client, make_experiment):
+    idle, finished, active = (make_experiment(questions=1) for _ in range(3))
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        db.execute(
+            insert(Rater),
+            [
+                {"prolific_id": "warm-done", "experiment_id": finished, "session_start": now, "is_active": False},
+                {
+                    "prolific_id": "warm-old",
+                    "experiment_id": finished,
+                    "session_start": now - timedelta(minutes=SESSION_DURATION_MINUTES + 1),
+                },
+                {"prolific_id": "warm-live", "experiment_id": active, "session_start": now},
+            ],
+        )
+        db.commit()
+    return idle, finished, active
+
+
+def test_warm_loads_only_experiments_with_raters_in_a_session(warm_experiments):
+    idle, finished, active = warm_experiments
+    engine = AssignmentEngine()
+    with SessionLocal() as db:
+        engine.warm(db)
+    assert active in engine._experiments
+    assert idle not in engine._experiments
+    assert finished not in engine._experiments
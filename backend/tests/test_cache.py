@@ -0,0 +1,187 @@
+"""Experiment and question-ownership cache (see cache.py)."""
+from datetime import datetime
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import delete, select
+
+import cache
+import ingest
+from database import AsyncSessionLocal, SessionLocal
+from models import Question, Upload
+
+
+class FakeRedis:
+    """In-memory stand-in for the redis-py calls RedisCache makes."""
+
+    def __init__(self):
+        self.data = {}
+        self.expiries = {}
+        self.threads = set()
+
+    def get(self, key):
+        self.threads.add(threading.current_thread())
+        return self.data.get(key)
+
+    def mget(self, keys):
+        self.threads.add(threading.current_thread())
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode()
+        self.expiries[key] = ex
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match):
+        return [key for key in self.data if key.startswith(match.rstrip("*"))]
+
+    def pipeline(self):
+        client = self
+
+        class Pipeline:
+            def __init__(self):
+                self.commands = []
+
+            def set(self, *args, **kwargs):
+                self.commands.append((args, kwargs))
+
+            def execute(self):
+                for args, kwargs in self.commands:
+                    client.set(*args, **kwargs)
+
+        return Pipeline()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_local_cache_expires_entries(clock):
+    local = cache.LocalCache(ttl_seconds=60)
+    local.set("a", 1)
+    clock[0] += 59
+    assert local.get("a") == 1
+    clock[0] += 1
+    assert local.get("a") is None
+    assert (local.hits, local.misses) == (1, 1)
+
+
+def test_local_cache_evicts_least_recently_used():
+    local = cache.LocalCache(max_entries=2)
+    local.set_many({"a": 1, "b": 2})
+    assert local.get("a") == 1
+    local.set("c", 3)
+    assert local.get_many(["a", "b", "c"]) == [1, None, 3]
+    local.delete(["a", "missing"])
+    assert local.get("a") is None
+
+
+def test_redis_cache_round_trip():
+    client = FakeRedis()
+    redis_cache = cache.RedisCache(client, ttl_seconds=30, prefix="test:")
+    redis_cache.set("a", [1, "x"])
+    redis_cache.set_many({"b": 2, "c": None})
+    assert redis_cache.get("a") == [1, "x"]
+    assert redis_cache.get_many(["b", "missing"]) == [2, None]
+    assert (redis_cache.hits, redis_cache.misses) == (2, 1)
+    assert set(client.expiries.values()) == {30}
+
+    redis_cache.delete(["a"])
+    assert redis_cache.get("a") is None
+    client.data["other:key"] = b"1"
+    redis_cache.clear()
+    assert list(client.data) == ["other:key"]
+
+
+@pytest.fixture
+def redis_backend(monkeypatch):
+    client = FakeRedis()
+    monkeypatch.setattr(cache, "cache", cache.RedisCache(client))
+    return client
+
+
+async def lookups(experiment_id: int, question_ids):
+    async with AsyncSessionLocal() as db:
+        return (
+            await cache.get_experiment(db, experiment_id),
+            await cache.get_question_experiments(db, question_ids),
+        )
+
+
+def question_ids(experiment_id: int):
+    with SessionLocal() as db:
+        return list(db.scalars(select(Question.id).where(Question.experiment_id == experiment_id)))
+
+
+def test_redis_lookups_run_off_the_event_loop(make_experiment, redis_backend):
+    experiment_id = make_experiment(questions=2)
+    ids = question_ids(experiment_id)
+
+    experiment, owners = asyncio.run(lookups(experiment_id, ids + [-1]))
+    assert experiment.id == experiment_id
+    assert owners == {question_id: experiment_id for question_id in ids}
+    # Answered from Redis the second time
+    assert asyncio.run(lookups(experiment_id, ids)) == (experiment, owners)
+    assert cache.cache.hits == 3
+    assert threading.main_thread() not in redis_backend.threads
+
+
+def cached(experiment_id: int, ids) -> list:
+    return [cache.cache.get(cache._experiment_key(experiment_id))] + cache.cache.get_many(
+        [cache._question_key(question_id) for question_id in ids]
+    )
+
+
+def test_deleting_an_experiment_invalidates_it(client, make_experiment):
+    experiment_id = make_experiment(questions=2)
+    ids = question_ids(experiment_id)
+    asyncio.run(lookups(experiment_id, ids))
+    assert None not in cached(experiment_id, ids)
+
+    assert client.delete(f"/api/admin/experiments/{experiment_id}").status_code == 200
+
+    assert cached(experiment_id, ids) == [None, None, None]
+
+
+def test_failed_upload_invalidates_its_questions(client, make_experiment):
+    experiment_id = make_experiment(questions=2)
+    ids = question_ids(experiment_id)
+    asyncio.run(lookups(experiment_id, ids))
+    with SessionLocal() as db:
+        upload_id = db.scalar(select(Upload.id).where(Upload.experiment_id == experiment_id))
+        ingest.fail_upload(db, upload_id, "test")
+
+    assert cached(experiment_id, ids)[1:] == [None, None]
+
+
+def test_rating_a_deleted_question_drops_its_stale_entry(client, make_experiment, start_rater):
+    experiment_id = make_experiment(questions=2)
+    headers = start_rater(experiment_id)
+    question_id = question_ids(experiment_id)[0]
+    asyncio.run(lookups(experiment_id, [question_id]))
+    # Deleted through another worker, whose invalidation didn't reach this one
+    with SessionLocal() as db:
+        db.execute(delete(Question).where(Question.id == question_id))
+        db.commit()
+    assert cached(experiment_id, [question_id])[1] == experiment_id
+
+    response = client.post(
+        "/api/raters/submit",
+        json={
+            "question_id": question_id,
+            "answer": "A",
+            "confidence": 3,
+            "time_started": datetime.utcnow().isoformat(),
+        },
+        headers=headers,
+    )
+
+    assert response.status_code == 404
+    assert cached(experiment_id, [question_id])[1] is None
@@ -0,0 +1,15 @@
+"""Engine setup (see database.py)."""
+import database
+
+
+def test_pool_settings_apply_to_both_engines():
+    for engine in (database.engine, database.async_engine.sync_engine):
+        assert engine.pool.size() == database.POOL_SIZE
+        assert engine.pool._max_overflow == database.MAX_OVERFLOW
+        assert engine.pool._timeout == database.POOL_TIMEOUT
+
+
+def test_in_memory_sqlite_takes_no_pool_settings():
+    for url in ("sqlite://", "sqlite+aiosqlite://"):
+        assert set(database._pool_options(url, "test")) == {"poolclass"}
+    assert database._pool_options("sqlite+aiosqlite:///rating_platform.db", "test")["pool_size"] == database.POOL_SIZE
@@ -0,0 +1,97 @@
+"""Rating exports (see export.py)."""
+from datetime import datetime
+import csv
+import io
+import json
+import zipfile
+
+import pytest
+
+import export
+
+
+def read_table(fmt: str, data: bytes) -> list:
+    """Rows of an exported table as dicts of strings, whatever the format."""
+    if fmt in export.COLUMNAR_FORMATS:
+        import pyarrow.ipc
+        import pyarrow.parquet
+
+    if fmt == "csv":
+        return list(csv.DictReader(io.StringIO(data.decode("utf-8"))))
+    if fmt == "jsonl":
+        rows = [json.loads(line) for line in data.decode("utf-8").splitlines()]
+    elif fmt == "parquet":
+        rows = pyarrow.parquet.read_table(io.BytesIO(data)).to_pylist()
+    else:
+        rows = pyarrow.ipc.open_stream(data).read_all().to_pylist()
+    return [
+        {
+            name: value.isoformat() if isinstance(value, datetime)
+            else "" if value is None
+            else str(round(value, 2) if isinstance(value, float) else value)
+            for name, value in row.items()
+        }
+        for row in rows
+    ]
+
+
+@pytest.fixture
+def rated_experiment(client, make_experiment, start_rater, monkeypatch):
+    """An experiment with four ratings, exported in batches of three."""
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 3)
+    experiment_id = make_experiment(questions=3)
+    for _ in range(2):
+        headers = start_rater(experiment_id)
+        for question in client.get("/api/raters/next-questions?n=2", headers=headers).json():
+            response = client.post(
+                "/api/raters/submit",
+                json={
+                    "question_id": question["id"],
+                    "answer": "B",
+                    "confidence": 4,
+                    "time_started": datetime.utcnow().isoformat(),
+                },
+                headers=headers,
+            )
+            assert response.status_code == 200, response.text
+    return experiment_id
+
+
+def export_response(client, experiment_id: int, fmt: str, normalized: bool = False):
+    response = client.get(
+        f"/api/admin/experiments/{experiment_id}/export", params={"format": fmt, "normalized": normalized}
+    )
+    assert response.status_code == 200, response.text
+    return response
+
+
+@pytest.fixture(params=export.FORMATS)
+def fmt(request):
+    if request.param in export.COLUMNAR_FORMATS:
+        pytest.importorskip("pyarrow")
+    return request.param
+
+
+def test_export_ratings(client, rated_experiment, fmt):
+    response = export_response(client, rated_experiment, fmt)
+
+    assert response.headers["content-type"].startswith(export.MEDIA_TYPES[fmt])
+    rows = read_table(fmt, response.content)
+    assert len(rows) == 4
+    assert list(rows[0]) == [name for name, _ in export.RATING_COLUMNS]
+    assert {(row["answer"], row["confidence"]) for row in rows} == {("B", "4")}
+    assert all(row["question_text"].startswith("text ") and row["gt_answer"] == "A" for row in rows)
+    assert len({row["rating_id"] for row in rows}) == 4
+
+
+def test_normalized_export(client, rated_experiment, fmt):
+    response = export_response(client, rated_experiment, fmt, normalized=True)
+
+    extension = export.FILE_EXTENSIONS[fmt]
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        questions = read_table(fmt, archive.read(f"questions.{extension}"))
+        ratings = read_table(fmt, archive.read(f"ratings.{extension}"))
+    assert [row["question_id"] for row in questions] == ["q0", "q1", "q2"]
+    assert list(ratings[0]) == [name for name, _ in export.NORMALIZED_RATING_COLUMNS]
+    assert len(ratings) == 4
+    assert {row["question_key"] for row in ratings} <= {row["question_key"] for row in questions}
@@ -0,0 +1,57 @@
+"""Background CSV ingestion (see ingest.py)."""
+from sqlalchemy import func, select
+
+import ingest
+from conftest import questions_csv, upload
+from database import SessionLocal
+from models import Question
+
+
+def question_count(upload_id: int) -> int:
+    with SessionLocal() as db:
+        return db.scalar(select(func.count()).select_from(Question).where(Question.upload_id == upload_id))
+
+
+def test_upload_inserts_every_row(client, make_experiment, monkeypatch):
+    monkeypatch.setattr(ingest, "UPLOAD_CHUNK_ROWS", 2)
+    experiment_id = make_experiment(questions=0)
+
+    job = upload(client, experiment_id, questions_csv(5))
+
+    assert (job["status"], job["question_count"], job["rows_processed"]) == ("completed", 5, 5)
+    assert question_count(job["id"]) == 5
+
+
+def test_short_row_fails_the_upload_with_its_line(client, make_experiment, monkeypatch):
+    monkeypatch.setattr(ingest, "UPLOAD_CHUNK_ROWS", 2)
+    experiment_id = make_experiment(questions=0)
+    # Line 6 has no question_text; the first chunks were already committed
+    csv_data = questions_csv(4) + "q4\n" + questions_csv(1).split("\n", 1)[1]
+
+    job = upload(client, experiment_id, csv_data)
+
+    assert job["status"] == "failed"
+    assert job["error"] == "Line 6: missing question_text"
+    assert question_count(job["id"]) == 0
+
+
+def test_blank_question_id_is_rejected(client, make_experiment):
+    experiment_id = make_experiment(questions=0)
+    job = upload(client, experiment_id, "question_id,question_text\nq0,text\n,text\n")
+    assert job["error"] == "Line 3: missing question_id"
+
+
+def test_header_is_checked_before_the_upload_is_queued(client, make_experiment):
+    experiment_id = make_experiment(questions=0)
+    response = client.post(
+        f"/api/admin/experiments/{experiment_id}/upload",
+        files={"file": ("questions.csv", "question_id,text\nq0,text\n", "text/csv")},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Missing required field: question_text"
+
+
+def test_rows_must_be_utf8(client, make_experiment):
+    experiment_id = make_experiment(questions=0)
+    job = upload(client, experiment_id, "question_id,question_text\nq0,caf\xe9\n".encode("latin-1"))
+    assert (job["status"], job["error"]) == ("failed", "File must be UTF-8 encoded (after 0 rows)")
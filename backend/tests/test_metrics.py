@@ -0,0 +1,14 @@
+"""Prometheus instrumentation (see metrics.py)."""
+from sqlalchemy.pool import QueuePool
+
+import database
+import metrics
+
+
+def test_timed_pools_log_under_sqlalchemy_pool():
+    pool_class = metrics.timed_pool_class(QueuePool, "test")
+    assert issubclass(pool_class, metrics.TimedCheckout)
+    assert pool_class.__module__ == QueuePool.__module__
+    for engine in (database.engine, database.async_engine.sync_engine):
+        assert isinstance(engine.pool, metrics.TimedCheckout)
+        assert engine.pool.logger.name.startswith("sqlalchemy.pool.")
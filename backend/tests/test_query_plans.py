@@ -0,0 +1,40 @@
+"""The hot queries must use indexes (see query_plans.py).
+
+Runs on a scratch SQLite database, and on PostgreSQL when DATABASE_URL points
+at one (the database is migrated to head first, so use a scratch database).
+"""
+from alembic import command
+import pytest
+from sqlalchemy import create_engine
+
+import database
+import query_plans
+import schema
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'query_plans.db'}")
+    with engine.begin() as connection:
+        command.upgrade(schema.alembic_config(connection), "head")
+    yield engine
+    engine.dispose()
+
+
+def test_sqlite_hot_queries_use_indexes(sqlite_engine):
+    assert query_plans.check(sqlite_engine) == []
+
+
+def test_sqlite_full_scan_is_reported(sqlite_engine):
+    with sqlite_engine.begin() as connection:
+        connection.exec_driver_sql("DROP INDEX ix_questions_text_hash")
+    failures = dict(query_plans.check(sqlite_engine))
+    assert failures["question body prune"] == ["SCAN questions"]
+
+
+@pytest.mark.skipif(
+    database.engine.dialect.name != "postgresql", reason="DATABASE_URL is not a PostgreSQL database"
+)
+def test_postgresql_hot_queries_use_indexes():
+    schema.migrate()
+    assert query_plans.check(database.engine) == []
@@ -0,0 +1,93 @@
+"""The compressed question body store (see question_bodies.py)."""
+import pytest
+from sqlalchemy import select
+
+import question_bodies
+from conftest import questions_csv, upload
+from database import SessionLocal
+from models import Question, QuestionBody
+
+
+@pytest.fixture
+def body_store(monkeypatch):
+    monkeypatch.setattr(question_bodies, "QUESTION_BODY_STORE", True)
+    monkeypatch.setattr(question_bodies, "QUESTION_BODY_MIN_CHARS", 300)
+    # Several IN (...) batches even for small uploads
+    monkeypatch.setattr(question_bodies, "HASH_BATCH_SIZE", 3)
+
+
+def long_text(tag: str) -> str:
+    return f"{tag} " + "lorem ipsum " * 50
+
+
+def stored(hashes) -> set:
+    with SessionLocal() as db:
+        return set(db.scalars(select(QuestionBody.hash).where(QuestionBody.hash.in_(list(hashes)))))
+
+
+def test_upload_stores_long_texts_once_and_serves_them(client, make_experiment, start_rater, body_store):
+    experiment_id = make_experiment(questions=0)
+    # Five distinct passages, each used twice
+    texts = [long_text(f"passage-{i % 5}") for i in range(10)]
+    csv_data = "question_id,question_text\n" + "".join(f"q{i},{text}\n" for i, text in enumerate(texts))
+    assert upload(client, experiment_id, csv_data)["status"] == "completed"
+    with SessionLocal() as db:
+        questions = db.scalars(select(Question).where(Question.experiment_id == experiment_id)).all()
+        assert all(len(question.question_text) == question_bodies.INLINE_PREFIX_CHARS for question in questions)
+        hashes = {question.text_hash for question in questions}
+        assert question_bodies.load(db, hashes) == {question_bodies.content_hash(text): text for text in texts}
+    assert len(stored(hashes)) == 5
+
+    headers = start_rater(experiment_id)
+    served = client.get("/api/raters/next-questions?n=3", headers=headers).json()
+    assert len(served) == 3
+    assert all(question["question_text"] in texts for question in served)
+
+
+def test_deleting_an_experiment_prunes_only_its_bodies(client, make_experiment, body_store):
+    shared = long_text("shared")
+    first, second = make_experiment(questions=0), make_experiment(questions=0)
+    upload(client, first, questions_csv(8, text=long_text("first-{i}")))
+    upload(client, first, "question_id,question_text\nshared," + shared + "\n")
+    upload(client, second, "question_id,question_text\nshared," + shared + "\n")
+    with SessionLocal() as db:
+        first_hashes = set(question_bodies.question_hashes(db, Question.experiment_id == first))
+    assert len(first_hashes) == 9
+
+    assert client.delete(f"/api/admin/experiments/{first}").status_code == 200
+
+    assert stored(first_hashes) == {question_bodies.content_hash(shared)}
+
+
+def test_a_body_pruned_while_storing_is_stored_again(body_store):
+    texts = {question_bodies.content_hash(text): text for text in (long_text(f"race-{i}") for i in range(5))}
+    with SessionLocal() as db:
+        question_bodies._store(db, dict(texts))
+        db.commit()
+
+        # A prune deletes one after the existence check and before the lock
+        victim = sorted(texts)[0]
+        scalars = db.scalars
+        calls = []
+
+        def racing_scalars(statement, *args, **kwargs):
+            result = scalars(statement, *args, **kwargs).all()
+            calls.append(statement)
+            if len(calls) == 1:
+                db.query(QuestionBody).filter(QuestionBody.hash == victim).delete()
+            return result
+
+        db.scalars = racing_scalars
+        try:
+            question_bodies._store(db, dict(texts))
+        finally:
+            del db.scalars
+        assert question_bodies.load(db, texts) == texts
+        db.rollback()
+
+
+def test_missing_body_is_an_error():
+    with SessionLocal() as db:
+        with pytest.raises(question_bodies.MissingQuestionBody):
+            question_bodies.load(db, ["0" * 64, None])
+    assert question_bodies.full_text({}, None, "inline") == "inline"
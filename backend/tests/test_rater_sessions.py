@@ -0,0 +1,68 @@
+"""Session checks on the rater endpoints (see routers/raters.py)."""
+from datetime import datetime
+
+from database import SessionLocal
+from models import Question, QuestionLease
+
+
+def rating(question_id: int, confidence: int = 3) -> dict:
+    return {
+        "question_id": question_id,
+        "answer": "A",
+        "confidence": confidence,
+        "time_started": datetime.utcnow().isoformat(),
+    }
+
+
+def test_ended_session_gets_403(client, make_experiment, start_rater):
+    headers = start_rater(make_experiment())
+    question_id = client.get("/api/raters/next-questions?n=2", headers=headers).json()[0]["id"]
+
+    assert client.post("/api/raters/end-session", headers=headers).status_code == 200
+
+    assert client.get("/api/raters/next-question", headers=headers).status_code == 403
+    assert client.get("/api/raters/next-questions?n=2", headers=headers).status_code == 403
+    response = client.post("/api/raters/submit", json=rating(question_id), headers=headers)
+    assert response.status_code == 403
+    assert response.json()["detail"] == "Session ended"
+    assert client.post("/api/raters/submit-batch", json=[rating(question_id)], headers=headers).status_code == 403
+    status = client.get("/api/raters/session-status", headers=headers).json()
+    assert status["is_active"] is False
+    assert status["questions_completed"] == 0
+
+
+def test_ended_session_with_no_questions_left_gets_403(client, make_experiment, start_rater):
+    headers = start_rater(make_experiment(questions=0))
+    assert client.get("/api/raters/next-questions", headers=headers).json() == []
+
+    client.post("/api/raters/end-session", headers=headers)
+
+    assert client.get("/api/raters/next-questions", headers=headers).status_code == 403
+
+
+def leases(experiment_id: int) -> int:
+    with SessionLocal() as db:
+        return (
+            db.query(QuestionLease)
+            .join(Question, QuestionLease.question_id == Question.id)
+            .filter(Question.experiment_id == experiment_id)
+            .count()
+        )
+
+
+def test_release_leases_keeps_the_session(client, make_experiment, start_rater):
+    experiment_id = make_experiment()
+    headers = start_rater(experiment_id)
+    assert len(client.get("/api/raters/next-questions?n=2", headers=headers).json()) == 2
+    assert leases(experiment_id) == 2
+
+    assert client.post("/api/raters/release-leases", headers=headers).status_code == 200
+
+    assert leases(experiment_id) == 0
+    assert client.get("/api/raters/session-status", headers=headers).json()["is_active"] is True
+    assert client.get("/api/raters/next-question", headers=headers).status_code == 200
+
+
+def test_missing_token_gets_401(client):
+    assert client.get("/api/raters/next-question").status_code == 401
+    assert client.get("/api/raters/next-question", headers={"Authorization": "Bearer junk"}).status_code == 401
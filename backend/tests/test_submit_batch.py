@@ -0,0 +1,115 @@
+"""Buffered rating submission (POST /api/raters/submit-batch)."""
+from datetime import datetime
+
+from sqlalchemy import delete, insert, select
+
+from database import SessionLocal
+from models import Question, QuestionLease, Rater, Rating
+from routers import raters
+
+
+def rating(question_id: int, confidence: int = 3) -> dict:
+    return {
+        "question_id": question_id,
+        "answer": "A",
+        "confidence": confidence,
+        "time_started": datetime.utcnow().isoformat(),
+    }
+
+
+def question_ids(experiment_id: int):
+    with SessionLocal() as db:
+        return list(db.scalars(select(Question.id).where(Question.experiment_id == experiment_id)))
+
+
+def submit(client, headers, ratings):
+    response = client.post("/api/raters/submit-batch", json=ratings, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_each_item_gets_its_own_status(client, make_experiment, start_rater):
+    experiment_id = make_experiment(questions=4)
+    other_question = question_ids(make_experiment(questions=1))[0]
+    first, second, third, fourth = question_ids(experiment_id)
+    headers = start_rater(experiment_id)
+    client.post("/api/raters/submit", json=rating(first), headers=headers)
+
+    result = submit(
+        client,
+        headers,
+        [
+            rating(first),  # rated before
+            rating(second),
+            rating(second),  # repeated within the batch
+            rating(third, confidence=9),
+            rating(999999),  # unknown question
+            rating(other_question),  # another experiment's question
+            rating(fourth),
+        ],
+    )
+
+    assert [item["status"] for item in result["results"]] == [
+        "duplicate", "created", "duplicate", "invalid", "not_found", "not_found", "created",
+    ]
+    assert result["created"] == 2
+    with SessionLocal() as db:
+        ids = dict(db.execute(select(Rating.question_id, Rating.id).where(Rating.question_id.in_([second, fourth]))).all())
+    assert [item["id"] for item in result["results"]] == [None, ids[second], None, None, None, None, ids[fourth]]
+
+
+def test_ratings_update_counts_and_release_leases(client, make_experiment, start_rater):
+    experiment_id = make_experiment(questions=2)
+    headers = start_rater(experiment_id)
+    leased = [question["id"] for question in client.get("/api/raters/next-questions?n=2", headers=headers).json()]
+
+    assert submit(client, headers, [rating(question_id) for question_id in leased])["created"] == 2
+
+    with SessionLocal() as db:
+        assert set(db.scalars(select(Question.rating_count).where(Question.id.in_(leased)))) == {1}
+        assert db.scalar(select(QuestionLease.rater_id).where(QuestionLease.question_id.in_(leased))) is None
+    status = client.get("/api/raters/session-status", headers=headers).json()
+    assert status["questions_completed"] == 2
+
+
+def test_retry_reports_a_concurrently_rated_question_as_duplicate(client, make_experiment, start_rater, monkeypatch):
+    experiment_id = make_experiment(questions=2)
+    first, second = question_ids(experiment_id)
+    headers = start_rater(experiment_id)
+    with SessionLocal() as db:
+        rater_id = db.scalar(select(Rater.id).where(Rater.experiment_id == experiment_id))
+
+    # Another request rates the first question between the duplicate check
+    # and the insert
+    real_classify = raters._classify_batch
+    calls = []
+
+    def racing_classify(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            with SessionLocal() as other:
+                other.execute(insert(Rating), [dict(rating(first), rater_id=rater_id, time_started=datetime.utcnow())])
+                other.commit()
+        return real_classify(*args)
+
+    monkeypatch.setattr(raters, "_classify_batch", racing_classify)
+    result = submit(client, headers, [rating(first), rating(second)])
+
+    assert len(calls) == 2
+    assert [item["status"] for item in result["results"]] == ["duplicate", "created"]
+    assert result["created"] == 1
+
+
+def test_retry_reports_a_deleted_question_as_not_found(client, make_experiment, start_rater):
+    experiment_id = make_experiment(questions=2)
+    first, second = question_ids(experiment_id)
+    headers = start_rater(experiment_id)
+    client.get("/api/raters/next-questions?n=2", headers=headers)
+    # Deleted through another worker: this worker's cache still has it
+    with SessionLocal() as db:
+        db.execute(delete(Question).where(Question.id == first))
+        db.commit()
+
+    result = submit(client, headers, [rating(first), rating(second)])
+
+    assert [item["status"] for item in result["results"]] == ["not_found", "created"]
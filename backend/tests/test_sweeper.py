@@ -0,0 +1,71 @@
+"""Session and lease expiry (see sweeper.py)."""
+from datetime import datetime, timedelta
+import asyncio
+
+from sqlalchemy import insert, select
+
+import sweeper
+from database import SessionLocal
+from models import Question, QuestionLease, Rater, SESSION_DURATION_MINUTES
+
+
+def test_sweep_ends_overdue_sessions_and_deletes_their_leases(client, make_experiment):
+    experiment_id = make_experiment(questions=2)
+    # Clear what other tests left behind
+    asyncio.run(sweeper.expire_sessions())
+    now = datetime.utcnow()
+    overdue = now - timedelta(minutes=SESSION_DURATION_MINUTES + 1)
+    with SessionLocal() as db:
+        question_ids = list(db.scalars(select(Question.id).where(Question.experiment_id == experiment_id)))
+        # More than SQLite's limit of 32766 bound parameters per statement
+        db.execute(
+            insert(Rater),
+            [
+                {"prolific_id": f"sweep-{i}", "experiment_id": experiment_id, "session_start": overdue}
+                for i in range(33000)
+            ]
+            + [{"prolific_id": "sweep-live", "experiment_id": experiment_id, "session_start": now}],
+        )
+        live = db.scalar(select(Rater.id).where(Rater.prolific_id == "sweep-live"))
+        expired = db.scalar(select(Rater.id).where(Rater.prolific_id == "sweep-0"))
+        db.execute(
+            insert(QuestionLease),
+            [
+                # Held by an overdue session
+                {"question_id": question_ids[0], "rater_id": expired, "expires_at": now + timedelta(minutes=5)},
+                # Past its expiry
+                {"question_id": question_ids[0], "rater_id": live, "expires_at": now - timedelta(minutes=5)},
+                {"question_id": question_ids[1], "rater_id": live, "expires_at": now + timedelta(minutes=5)},
+            ],
+        )
+        db.commit()
+
+    assert asyncio.run(sweeper.expire_sessions()) == (33000, 2)
+    assert asyncio.run(sweeper.expire_sessions()) == (0, 0)
+
+    with SessionLocal() as db:
+        assert [(lease.rater_id, lease.question_id) for lease in db.query(QuestionLease).filter(
+            QuestionLease.question_id.in_(question_ids)
+        )] == [(live, question_ids[1])]
+        assert db.get(Rater, live).is_active
+        assert not db.get(Rater, expired).is_active
+        assert db.get(Rater, expired).session_end is not None
+
+
+def test_sweeper_keeps_running_after_an_error(monkeypatch):
+    calls = []
+
+    async def expire_sessions():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ValueError("boom")
+        if len(calls) == 3:
+            raise asyncio.CancelledError
+        return 0, 0
+
+    monkeypatch.setattr(sweeper, "expire_sessions", expire_sessions)
+    try:
+        asyncio.run(sweeper.run(interval=0))
+    except asyncio.CancelledError:
+        pass
+    assert len(calls) == 3
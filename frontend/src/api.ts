@@ -1,8 +1,13 @@
-import type { Experiment, ExperimentCreate, ExperimentStats, Question, Session, RatingSubmit, Analytics, Upload } from './types';
+import type { Experiment, ExperimentCreate, ExperimentStats, ExportFormat, Question, Session, RatingSubmit, RatingBatchResult, Analytics, AnalyticsPage, QuestionAnalytics, QuestionAnalyticsQuery, RaterAnalytics, RaterAnalyticsQuery, Upload } from './types';
 
 // Use environment variable for API URL, fallback to relative path for same-origin deployment
 const API_BASE = (import.meta.env.VITE_API_URL || '') + '/api';
 
+// Rater endpoints identify the rater by the session token from startSession
+function authHeaders(token: string): Record<string, string> {
+  return { Authorization: `Bearer ${token}` };
+}
+
 export const api = {
   // Admin endpoints
   async createExperiment(data: ExperimentCreate): Promise<Experiment> {
@@ -21,7 +26,7 @@ export const api = {
     return res.json();
   },
 
-  async uploadQuestions(experimentId: number, file: File): Promise<{ message: string }> {
+  async uploadQuestions(experimentId: number, file: File): Promise<{ message: string; job_id: number }> {
     const formData = new FormData();
     formData.append('file', file);
     const res = await fetch(`${API_BASE}/admin/experiments/${experimentId}/upload`, {
@@ -32,14 +37,28 @@ export const api = {
     return res.json();
   },
 
+  async getUploadJob(jobId: number): Promise<Upload> {
+    const res = await fetch(`${API_BASE}/admin/uploads/${jobId}`);
+    if (!res.ok) throw new Error(await res.text());
+    return res.json();
+  },
+
   async getExperimentStats(experimentId: number): Promise<ExperimentStats> {
     const res = await fetch(`${API_BASE}/admin/experiments/${experimentId}/stats`);
     if (!res.ok) throw new Error(await res.text());
     return res.json();
   },
 
-  getExportUrl(experimentId: number): string {
-    return `${API_BASE}/admin/experiments/${experimentId}/export`;
+  async getStats(experimentIds: number[]): Promise<ExperimentStats[]> {
+    const res = await fetch(`${API_BASE}/admin/stats?ids=${experimentIds.join(',')}`);
+    if (!res.ok) throw new Error(await res.text());
+    return res.json();
+  },
+
+  getExportUrl(experimentId: number, format: ExportFormat = 'csv', normalized = false): string {
+    let url = `${API_BASE}/admin/experiments/${experimentId}/export?format=${format}`;
+    if (normalized) url += '&normalized=true';
+    return url;
   },
 
   async getExperimentAnalytics(experimentId: number): Promise<Analytics> {
@@ -48,6 +67,34 @@ export const api = {
     return res.json();
   },
 
+  async getQuestionAnalytics(experimentId: number, query: QuestionAnalyticsQuery): Promise<AnalyticsPage<QuestionAnalytics>> {
+    const params = new URLSearchParams({
+      skip: String(query.skip),
+      limit: String(query.limit),
+      sort: query.sort,
+      order: query.order,
+      under_quota: String(query.under_quota),
+    });
+    const res = await fetch(`${API_BASE}/admin/experiments/${experimentId}/analytics/questions?${params}`);
+    if (!res.ok) throw new Error(await res.text());
+    return res.json();
+  },
+
+  async getRaterAnalytics(experimentId: number, query: RaterAnalyticsQuery): Promise<AnalyticsPage<RaterAnalytics>> {
+    const params = new URLSearchParams({
+      skip: String(query.skip),
+      limit: String(query.limit),
+      sort: query.sort,
+      order: query.order,
+    });
+    if (query.max_avg_response_time !== null) {
+      params.set('max_avg_response_time', String(query.max_avg_response_time));
+    }
+    const res = await fetch(`${API_BASE}/admin/experiments/${experimentId}/analytics/raters?${params}`);
+    if (!res.ok) throw new Error(await res.text());
+    return res.json();
+  },
+
   async listUploads(experimentId: number): Promise<Upload[]> {
     const res = await fetch(`${API_BASE}/admin/experiments/${experimentId}/uploads`);
     if (!res.ok) throw new Error(await res.text());
@@ -72,32 +119,63 @@ export const api = {
     return res.json();
   },
 
-  async getNextQuestion(raterId: number): Promise<Question | null> {
-    const res = await fetch(`${API_BASE}/raters/next-question?rater_id=${raterId}`);
+  async getNextQuestion(token: string): Promise<Question | null> {
+    const res = await fetch(`${API_BASE}/raters/next-question`, { headers: authHeaders(token) });
+    if (res.status === 403) throw new Error('Session expired');
+    if (!res.ok) throw new Error(await res.text());
+    return res.json();
+  },
+
+  async getNextQuestions(token: string, n: number): Promise<Question[]> {
+    const res = await fetch(`${API_BASE}/raters/next-questions?n=${n}`, { headers: authHeaders(token) });
     if (res.status === 403) throw new Error('Session expired');
     if (!res.ok) throw new Error(await res.text());
     return res.json();
   },
 
-  async submitRating(raterId: number, data: RatingSubmit): Promise<{ id: number; success: boolean }> {
-    const res = await fetch(`${API_BASE}/raters/submit?rater_id=${raterId}`, {
+  async submitRating(token: string, data: RatingSubmit): Promise<{ id: number; success: boolean }> {
+    const res = await fetch(`${API_BASE}/raters/submit`, {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
+      headers: { 'Content-Type': 'application/json', ...authHeaders(token) },
+      body: JSON.stringify(data),
+    });
+    if (res.status === 403) throw new Error('Session expired');
+    if (!res.ok) throw new Error(await res.text());
+    return res.json();
+  },
+
+  async submitRatings(token: string, data: RatingSubmit[]): Promise<RatingBatchResult> {
+    const res = await fetch(`${API_BASE}/raters/submit-batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', ...authHeaders(token) },
       body: JSON.stringify(data),
     });
+    if (res.status === 403) throw new Error('Session expired');
+    if (!res.ok) throw new Error(await res.text());
+    return res.json();
+  },
+
+  async getSessionStatus(token: string): Promise<{ is_active: boolean; time_remaining_seconds: number; questions_completed: number }> {
+    const res = await fetch(`${API_BASE}/raters/session-status`, { headers: authHeaders(token) });
     if (!res.ok) throw new Error(await res.text());
     return res.json();
   },
 
-  async getSessionStatus(raterId: number): Promise<{ is_active: boolean; time_remaining_seconds: number; questions_completed: number }> {
-    const res = await fetch(`${API_BASE}/raters/session-status?rater_id=${raterId}`);
+  async releaseLeases(token: string): Promise<{ message: string }> {
+    const res = await fetch(`${API_BASE}/raters/release-leases`, {
+      method: 'POST',
+      headers: authHeaders(token),
+      // Sent while the page is being left
+      keepalive: true,
+    });
     if (!res.ok) throw new Error(await res.text());
     return res.json();
   },
 
-  async endSession(raterId: number): Promise<{ message: string }> {
-    const res = await fetch(`${API_BASE}/raters/end-session?rater_id=${raterId}`, {
+  async endSession(token: string): Promise<{ message: string }> {
+    const res = await fetch(`${API_BASE}/raters/end-session`, {
       method: 'POST',
+      headers: authHeaders(token),
     });
     if (!res.ok) throw new Error(await res.text());
     return res.json();
@@ -1,11 +1,12 @@
 import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { api } from '../api';
-import type { Experiment, ExperimentCreate } from '../types';
+import type { Experiment, ExperimentCreate, ExperimentStats } from '../types';
 
 function AdminView() {
   const navigate = useNavigate();
   const [experiments, setExperiments] = useState<Experiment[]>([]);
+  const [stats, setStats] = useState<Record<number, ExperimentStats>>({});
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [success, setSuccess] = useState<string | null>(null);
@@ -25,6 +26,11 @@ function AdminView() {
       setLoading(true);
       const data = await api.listExperiments();
       setExperiments(data);
+      if (data.length > 0) {
+        // Progress for every listed experiment in one request
+        const progress = await api.getStats(data.map((exp) => exp.id));
+        setStats(Object.fromEntries(progress.map((s) => [s.experiment_id, s])));
+      }
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Unknown error');
     } finally {
@@ -256,6 +262,9 @@ function AdminView() {
                     <div style={styles.experimentName}>{exp.name}</div>
                     <div style={styles.experimentMeta}>
                       {exp.question_count} questions · {exp.rating_count} ratings
+                      {stats[exp.id] && (
+                        <> · {stats[exp.id].questions_complete}/{stats[exp.id].total_questions} complete · {stats[exp.id].total_raters} raters</>
+                      )}
                     </div>
                   </div>
                   <span style={styles.viewLink}>View →</span>
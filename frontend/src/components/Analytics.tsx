@@ -1,6 +1,32 @@
 import { useState, useEffect } from 'react';
 import { api } from '../api';
-import type { Analytics as AnalyticsType } from '../types';
+import type {
+  Analytics as AnalyticsType,
+  AnalyticsPage,
+  QuestionAnalytics,
+  QuestionAnalyticsQuery,
+  QuestionAnalyticsSort,
+  RaterAnalytics,
+  RaterAnalyticsQuery,
+  RaterAnalyticsSort,
+} from '../types';
+
+const PAGE_SIZE = 50;
+// Default cut-off for the "fast raters" filter
+const FAST_RATER_SECONDS = 5;
+
+const QUESTION_SORTS: { value: QuestionAnalyticsSort; label: string }[] = [
+  { value: 'question_id', label: 'Question ID' },
+  { value: 'num_ratings', label: 'Ratings' },
+  { value: 'avg_response_time', label: 'Avg Time' },
+  { value: 'avg_confidence', label: 'Avg Confidence' },
+];
+
+const RATER_SORTS: { value: RaterAnalyticsSort; label: string }[] = [
+  { value: 'num_ratings', label: 'Questions' },
+  { value: 'avg_response_time', label: 'Avg Time' },
+  { value: 'avg_confidence', label: 'Avg Confidence' },
+];
 
 interface AnalyticsProps {
   experimentId: number;
@@ -13,11 +39,36 @@ function Analytics({ experimentId, experimentName, onBack }: AnalyticsProps) {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [activeTab, setActiveTab] = useState<'overview' | 'questions' | 'raters'>('overview');
+  const [questionQuery, setQuestionQuery] = useState<QuestionAnalyticsQuery>({
+    skip: 0,
+    limit: PAGE_SIZE,
+    sort: 'question_id',
+    order: 'asc',
+    under_quota: false,
+  });
+  const [questionPage, setQuestionPage] = useState<AnalyticsPage<QuestionAnalytics> | null>(null);
+  const [raterQuery, setRaterQuery] = useState<RaterAnalyticsQuery>({
+    skip: 0,
+    limit: PAGE_SIZE,
+    sort: 'num_ratings',
+    order: 'desc',
+    max_avg_response_time: null,
+  });
+  const [raterPage, setRaterPage] = useState<AnalyticsPage<RaterAnalytics> | null>(null);
+  const [pageLoading, setPageLoading] = useState(false);
 
   useEffect(() => {
     loadAnalytics();
   }, [experimentId]);
 
+  useEffect(() => {
+    if (activeTab === 'questions') loadQuestions();
+  }, [experimentId, activeTab, questionQuery]);
+
+  useEffect(() => {
+    if (activeTab === 'raters') loadRaters();
+  }, [experimentId, activeTab, raterQuery]);
+
   const loadAnalytics = async () => {
     try {
       setLoading(true);
@@ -30,6 +81,34 @@ function Analytics({ experimentId, experimentName, onBack }: AnalyticsProps) {
     }
   };
 
+  const loadQuestions = async () => {
+    try {
+      setPageLoading(true);
+      setQuestionPage(await api.getQuestionAnalytics(experimentId, questionQuery));
+    } catch (err) {
+      setError(err instanceof Error ? err.message : 'Unknown error');
+    } finally {
+      setPageLoading(false);
+    }
+  };
+
+  const loadRaters = async () => {
+    try {
+      setPageLoading(true);
+      setRaterPage(await api.getRaterAnalytics(experimentId, raterQuery));
+    } catch (err) {
+      setError(err instanceof Error ? err.message : 'Unknown error');
+    } finally {
+      setPageLoading(false);
+    }
+  };
+
+  const refresh = () => {
+    loadAnalytics();
+    if (activeTab === 'questions') loadQuestions();
+    if (activeTab === 'raters') loadRaters();
+  };
+
   const formatTime = (seconds: number | undefined | null): string => {
     if (seconds === undefined || seconds === null || isNaN(seconds)) return '-';
     if (seconds < 60) return `${seconds.toFixed(1)}s`;
@@ -189,6 +268,78 @@ function Analytics({ experimentId, experimentName, onBack }: AnalyticsProps) {
       textAlign: 'center' as const,
       color: '#888',
     },
+    controls: {
+      display: 'flex',
+      alignItems: 'center',
+      gap: '12px',
+      flexWrap: 'wrap' as const,
+      padding: '12px 20px',
+      borderBottom: '1px solid #e0e0e0',
+      fontSize: '14px',
+      color: '#555',
+    },
+    select: {
+      padding: '6px 8px',
+      border: '1px solid #ddd',
+      borderRadius: '6px',
+      fontSize: '14px',
+    },
+    numberInput: {
+      width: '64px',
+      padding: '6px 8px',
+      border: '1px solid #ddd',
+      borderRadius: '6px',
+      fontSize: '14px',
+    },
+    pager: {
+      display: 'flex',
+      alignItems: 'center',
+      justifyContent: 'space-between',
+      padding: '12px 20px',
+      fontSize: '13px',
+      color: '#666',
+    },
+    pagerButton: {
+      padding: '6px 12px',
+      background: '#fff',
+      border: '1px solid #ddd',
+      borderRadius: '6px',
+      cursor: 'pointer',
+      fontSize: '13px',
+      marginLeft: '8px',
+    },
+  };
+
+  const renderPager = (
+    page: AnalyticsPage<unknown> | null,
+    onChange: (skip: number) => void,
+  ) => {
+    if (!page || page.total === 0) return null;
+    const first = page.skip + 1;
+    const last = Math.min(page.skip + page.items.length, page.total);
+    return (
+      <div style={styles.pager}>
+        <span>
+          {first}–{last} of {page.total}
+        </span>
+        <div>
+          <button
+            style={styles.pagerButton}
+            disabled={pageLoading || page.skip === 0}
+            onClick={() => onChange(Math.max(page.skip - page.limit, 0))}
+          >
+            Previous
+          </button>
+          <button
+            style={styles.pagerButton}
+            disabled={pageLoading || last >= page.total}
+            onClick={() => onChange(page.skip + page.limit)}
+          >
+            Next
+          </button>
+        </div>
+      </div>
+    );
   };
 
   if (loading) {
@@ -283,8 +434,40 @@ function Analytics({ experimentId, experimentName, onBack }: AnalyticsProps) {
           <div style={styles.sectionHeader}>
             <h2 style={styles.sectionTitle}>Per-Question Analytics</h2>
           </div>
-          {analytics.questions.length === 0 ? (
-            <div style={styles.emptyState}>No ratings yet.</div>
+          <div style={styles.controls}>
+            <label>
+              Sort by{' '}
+              <select
+                style={styles.select}
+                value={questionQuery.sort}
+                onChange={(e) => setQuestionQuery({ ...questionQuery, sort: e.target.value as QuestionAnalyticsSort, skip: 0 })}
+              >
+                {QUESTION_SORTS.map((s) => (
+                  <option key={s.value} value={s.value}>{s.label}</option>
+                ))}
+              </select>
+            </label>
+            <select
+              style={styles.select}
+              value={questionQuery.order}
+              onChange={(e) => setQuestionQuery({ ...questionQuery, order: e.target.value as 'asc' | 'desc', skip: 0 })}
+            >
+              <option value="asc">Ascending</option>
+              <option value="desc">Descending</option>
+            </select>
+            <label>
+              <input
+                type="checkbox"
+                checked={questionQuery.under_quota}
+                onChange={(e) => setQuestionQuery({ ...questionQuery, under_quota: e.target.checked, skip: 0 })}
+              />{' '}
+              Under quota only
+            </label>
+          </div>
+          {!questionPage ? (
+            <div style={styles.emptyState}>Loading...</div>
+          ) : questionPage.items.length === 0 ? (
+            <div style={styles.emptyState}>No matching questions.</div>
           ) : (
             <div style={{ overflowX: 'auto' }}>
               <table style={styles.table}>
@@ -299,7 +482,7 @@ function Analytics({ experimentId, experimentName, onBack }: AnalyticsProps) {
                   </tr>
                 </thead>
                 <tbody>
-                  {analytics.questions.map((q) => (
+                  {questionPage.items.map((q) => (
                     <tr key={q.question_id}>
                       <td style={{ ...styles.td, ...styles.tdMono }}>{q.question_id}</td>
                       <td style={{ ...styles.td, maxWidth: '250px', overflow: 'hidden', textOverflow: 'ellipsis', whiteSpace: 'nowrap' }}>
@@ -307,7 +490,7 @@ function Analytics({ experimentId, experimentName, onBack }: AnalyticsProps) {
                       </td>
                       <td style={{ ...styles.td, ...styles.tdCenter }}>{q.num_ratings}</td>
                       <td style={{ ...styles.td, ...styles.tdCenter }}>{formatTime(q.avg_response_time_seconds)}</td>
-                      <td style={{ ...styles.td, ...styles.tdCenter }}>{q.avg_confidence.toFixed(1)}</td>
+                      <td style={{ ...styles.td, ...styles.tdCenter }}>{formatNumber(q.avg_confidence)}</td>
                       <td style={styles.td}>
                         <div style={{ display: 'flex', gap: '6px', flexWrap: 'wrap' }}>
                           {Object.entries(q.answer_distribution).map(([answer, count]) => (
@@ -323,6 +506,7 @@ function Analytics({ experimentId, experimentName, onBack }: AnalyticsProps) {
               </table>
             </div>
           )}
+          {renderPager(questionPage, (skip) => setQuestionQuery({ ...questionQuery, skip }))}
         </div>
       )}
 
@@ -332,8 +516,56 @@ function Analytics({ experimentId, experimentName, onBack }: AnalyticsProps) {
           <div style={styles.sectionHeader}>
             <h2 style={styles.sectionTitle}>Per-Rater Analytics</h2>
           </div>
-          {analytics.raters.length === 0 ? (
-            <div style={styles.emptyState}>No raters yet.</div>
+          <div style={styles.controls}>
+            <label>
+              Sort by{' '}
+              <select
+                style={styles.select}
+                value={raterQuery.sort}
+                onChange={(e) => setRaterQuery({ ...raterQuery, sort: e.target.value as RaterAnalyticsSort, skip: 0 })}
+              >
+                {RATER_SORTS.map((s) => (
+                  <option key={s.value} value={s.value}>{s.label}</option>
+                ))}
+              </select>
+            </label>
+            <select
+              style={styles.select}
+              value={raterQuery.order}
+              onChange={(e) => setRaterQuery({ ...raterQuery, order: e.target.value as 'asc' | 'desc', skip: 0 })}
+            >
+              <option value="asc">Ascending</option>
+              <option value="desc">Descending</option>
+            </select>
+            <label>
+              <input
+                type="checkbox"
+                checked={raterQuery.max_avg_response_time !== null}
+                onChange={(e) => setRaterQuery({
+                  ...raterQuery,
+                  max_avg_response_time: e.target.checked ? FAST_RATER_SECONDS : null,
+                  skip: 0,
+                })}
+              />{' '}
+              Avg time under
+            </label>
+            <input
+              type="number"
+              min={1}
+              style={styles.numberInput}
+              disabled={raterQuery.max_avg_response_time === null}
+              value={raterQuery.max_avg_response_time ?? FAST_RATER_SECONDS}
+              onChange={(e) => {
+                const seconds = parseFloat(e.target.value);
+                if (seconds > 0) setRaterQuery({ ...raterQuery, max_avg_response_time: seconds, skip: 0 });
+              }}
+            />
+            <span>seconds</span>
+          </div>
+          {!raterPage ? (
+            <div style={styles.emptyState}>Loading...</div>
+          ) : raterPage.items.length === 0 ? (
+            <div style={styles.emptyState}>No matching raters.</div>
           ) : (
             <div style={{ overflowX: 'auto' }}>
               <table style={styles.table}>
@@ -349,7 +581,7 @@ function Analytics({ experimentId, experimentName, onBack }: AnalyticsProps) {
                   </tr>
                 </thead>
                 <tbody>
-                  {analytics.raters.map((r) => (
+                  {raterPage.items.map((r) => (
                     <tr key={r.prolific_id}>
                       <td style={{ ...styles.td, ...styles.tdMono }}>{r.prolific_id}</td>
                       <td style={{ ...styles.td, ...styles.tdMono, color: '#888' }}>{r.study_id || '-'}</td>
@@ -366,12 +598,13 @@ function Analytics({ experimentId, experimentName, onBack }: AnalyticsProps) {
               </table>
             </div>
           )}
+          {renderPager(raterPage, (skip) => setRaterQuery({ ...raterQuery, skip }))}
         </div>
       )}
 
       {/* Refresh */}
       <div style={{ textAlign: 'center', marginTop: '24px' }}>
-        <button onClick={loadAnalytics} style={styles.refreshButton}>
+        <button onClick={refresh} style={styles.refreshButton}>
           Refresh Analytics
         </button>
       </div>
@@ -3,6 +3,8 @@ import { api } from '../api';
 import Analytics from './Analytics';
 import type { Experiment, ExperimentStats, Upload } from '../types';
 
+const UPLOAD_POLL_INTERVAL_MS = 1000;
+
 interface ExperimentDetailProps {
   experiment: Experiment;
   onBack: () => void;
@@ -89,6 +91,8 @@ function ExperimentDetail({ experiment, onBack, onDeleted }: ExperimentDetailPro
       setSuccess(result.message);
       setUploadFile(null);
       (e.target as HTMLFormElement).reset();
+      await loadUploads();
+      await waitForUpload(result.job_id);
       await loadStats();
       await loadUploads();
     } catch (err) {
@@ -96,6 +100,29 @@ function ExperimentDetail({ experiment, onBack, onDeleted }: ExperimentDetailPro
     }
   };
 
+  // Poll the ingestion job until it finishes, reporting progress as it goes
+  const waitForUpload = async (jobId: number) => {
+    for (;;) {
+      const job = await api.getUploadJob(jobId);
+      if (job.status === 'completed') {
+        setSuccess(`Uploaded ${job.question_count} questions`);
+        return;
+      }
+      if (job.status === 'failed') {
+        setSuccess(null);
+        setError(job.error || 'Upload failed');
+        return;
+      }
+      setSuccess(
+        job.status === 'pending'
+          ? 'Upload queued...'
+          : `Importing... ${job.rows_processed} rows` +
+            (job.rows_per_second ? ` (${Math.round(job.rows_per_second)} rows/s)` : '')
+      );
+      await new Promise(resolve => setTimeout(resolve, UPLOAD_POLL_INTERVAL_MS));
+    }
+  };
+
   const handleDelete = async () => {
     if (window.confirm(`Delete "${experiment.name}"? This cannot be undone.`)) {
       try {
@@ -402,6 +429,11 @@ function ExperimentDetail({ experiment, onBack, onDeleted }: ExperimentDetailPro
                         Export CSV
                       </button>
                     </a>
+                    <a href={api.getExportUrl(experiment.id, 'parquet', true)} download style={{ flex: 1 }}>
+                      <button style={{ ...styles.secondaryButton, width: '100%' }}>
+                        Export Parquet
+                      </button>
+                    </a>
                   </div>
                 </>
               )}
@@ -473,8 +505,11 @@ function ExperimentDetail({ experiment, onBack, onDeleted }: ExperimentDetailPro
                   {uploads.map((upload) => (
                     <div key={upload.id} style={styles.uploadItem}>
                       <span style={{ fontFamily: 'monospace' }}>{upload.filename}</span>
-                      <span style={{ color: '#666' }}>
-                        {upload.question_count} questions
+                      <span style={{ color: upload.status === 'failed' ? '#dc3545' : '#666' }}>
+                        {upload.status === 'completed' && `${upload.question_count} questions`}
+                        {upload.status === 'failed' && 'failed'}
+                        {(upload.status === 'pending' || upload.status === 'processing') &&
+                          `importing (${upload.rows_processed} rows)`}
                       </span>
                     </div>
                   ))}
@@ -1,14 +1,23 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import { useSearchParams } from 'react-router-dom';
 import { api } from '../api';
 import Timer from './Timer';
 import QuestionCard from './QuestionCard';
 import type { Session, Question } from '../types';
 
+// Questions requested per fetch: the one to show plus one held in reserve.
+// The server returns the rater's leased questions first, so a fetch made while
+// a question is shown returns it along with one newly leased question.
+const PREFETCH_COUNT = 2;
+
 function RaterView() {
   const [searchParams] = useSearchParams();
   const [session, setSession] = useState<Session | null>(null);
   const [question, setQuestion] = useState<Question | null>(null);
+  const [nextQuestion, setNextQuestion] = useState<Question | null>(null);
+  const prefetchRequest = useRef(0);
+  const sessionToken = useRef<string | null>(null);
+  const sessionEnded = useRef(false);
   const [questionsCompleted, setQuestionsCompleted] = useState(0);
   const [error, setError] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
@@ -30,7 +39,8 @@ function RaterView() {
     api.startSession(experimentId, prolificId, studyId, sessionId)
       .then(data => {
         setSession(data);
-        return loadNextQuestion(data.rater_id);
+        sessionToken.current = data.session_token;
+        return loadNextQuestion(data.session_token);
       })
       .catch(err => {
         setError(err.message);
@@ -38,14 +48,17 @@ function RaterView() {
       });
   }, [experimentId, prolificId]);
 
-  const loadNextQuestion = useCallback(async (raterId: number) => {
+  const loadNextQuestion = useCallback(async (token: string) => {
+    // Any prefetch still in flight is superseded by this load
+    prefetchRequest.current += 1;
     try {
       setLoading(true);
-      const q = await api.getNextQuestion(raterId);
-      if (q === null || (typeof q === 'object' && Object.keys(q).length === 0)) {
+      const [q, next] = await api.getNextQuestions(token, PREFETCH_COUNT);
+      if (!q) {
         setAllDone(true);
       } else {
         setQuestion(q);
+        setNextQuestion(next ?? null);
       }
     } catch (err) {
       if (err instanceof Error && err.message === 'Session expired') {
@@ -58,18 +71,40 @@ function RaterView() {
     }
   }, []);
 
+  // Fetch the question after `currentId` while the rater answers the current one,
+  // so the next submit never waits on the server
+  const prefetchNextQuestion = useCallback(async (token: string, currentId: number) => {
+    const requestId = ++prefetchRequest.current;
+    try {
+      const questions = await api.getNextQuestions(token, PREFETCH_COUNT);
+      // Dropped if the rater has moved on since
+      if (requestId === prefetchRequest.current) {
+        setNextQuestion(questions.find(q => q.id !== currentId) ?? null);
+      }
+    } catch {
+      // The next submit falls back to a blocking load
+    }
+  }, []);
+
   const handleSubmit = async (answer: string, confidence: number, timeStarted: string) => {
     if (!session || !question) return;
 
     try {
-      await api.submitRating(session.rater_id, {
+      await api.submitRating(session.session_token, {
         question_id: question.id,
         answer,
         confidence,
         time_started: timeStarted,
       });
       setQuestionsCompleted(prev => prev + 1);
-      await loadNextQuestion(session.rater_id);
+      if (nextQuestion) {
+        const upcoming = nextQuestion;
+        setNextQuestion(null);
+        setQuestion(upcoming);
+        prefetchNextQuestion(session.session_token, upcoming.id);
+      } else {
+        await loadNextQuestion(session.session_token);
+      }
     } catch (err) {
       if (err instanceof Error && err.message === 'Session expired') {
         setSessionExpired(true);
@@ -83,6 +118,23 @@ function RaterView() {
     setSessionExpired(true);
   };
 
+  // Hand the reserved question back to the pool as soon as the rater is done,
+  // instead of holding it until its lease expires
+  useEffect(() => {
+    if (session && (sessionExpired || allDone) && !sessionEnded.current) {
+      sessionEnded.current = true;
+      api.endSession(session.session_token).catch(() => {});
+    }
+  }, [session, sessionExpired, allDone]);
+
+  // Leaving the page mid-session releases the shown and reserved questions
+  useEffect(() => () => {
+    prefetchRequest.current += 1;
+    if (sessionToken.current && !sessionEnded.current) {
+      api.releaseLeases(sessionToken.current).catch(() => {});
+    }
+  }, []);
+
   const styles = {
     container: {
       maxWidth: '700px',
@@ -17,6 +17,7 @@ export interface Question {
 }
 
 export interface ExperimentStats {
+  experiment_id: number;
   experiment_name: string;
   total_questions: number;
   questions_complete: number;
@@ -25,11 +26,20 @@ export interface ExperimentStats {
   target_ratings_per_question: number;
 }
 
+export type ExportFormat = 'csv' | 'jsonl' | 'parquet' | 'arrow';
+
 export interface Upload {
   id: number;
+  experiment_id: number;
   filename: string;
   uploaded_at: string;
+  status: 'pending' | 'processing' | 'completed' | 'failed';
   question_count: number;
+  rows_processed: number;
+  duration_seconds: number | null;
+  rows_per_second: number | null;
+  error: string | null;
+  completed_at: string | null;
 }
 
 export interface Session {
@@ -38,6 +48,7 @@ export interface Session {
   session_end_time: string;
   experiment_name: string;
   completion_url: string | null;
+  session_token: string;
 }
 
 export interface RatingSubmit {
@@ -47,6 +58,15 @@ export interface RatingSubmit {
   time_started: string;
 }
 
+export interface RatingBatchResult {
+  results: {
+    question_id: number;
+    status: 'created' | 'duplicate' | 'not_found' | 'invalid';
+    id: number | null;
+  }[];
+  created: number;
+}
+
 export interface Analytics {
   experiment_name: string;
   overview: {
@@ -58,26 +78,60 @@ export interface Analytics {
     max_response_time_seconds?: number;
     avg_confidence: number;
   };
-  questions: QuestionAnalytics[];
-  raters: RaterAnalytics[];
+}
+
+export interface AnalyticsPage<T> {
+  items: T[];
+  total: number;
+  skip: number;
+  limit: number;
+}
+
+export type SortOrder = 'asc' | 'desc';
+
+export type QuestionAnalyticsSort = 'question_id' | 'num_ratings' | 'avg_response_time' | 'avg_confidence';
+
+export interface QuestionAnalyticsQuery {
+  skip: number;
+  limit: number;
+  sort: QuestionAnalyticsSort;
+  order: SortOrder;
+  under_quota: boolean;
 }
 
 export interface QuestionAnalytics {
   question_id: string;
   question_text: string;
   num_ratings: number;
-  avg_response_time_seconds: number;
-  avg_confidence: number;
+  // null for questions without ratings
+  avg_response_time_seconds: number | null;
+  min_response_time_seconds: number | null;
+  max_response_time_seconds: number | null;
+  std_response_time_seconds: number | null;
+  avg_confidence: number | null;
   answer_distribution: Record<string, number>;
 }
 
+export type RaterAnalyticsSort = 'num_ratings' | 'avg_response_time' | 'avg_confidence';
+
+export interface RaterAnalyticsQuery {
+  skip: number;
+  limit: number;
+  sort: RaterAnalyticsSort;
+  order: SortOrder;
+  max_avg_response_time: number | null;
+}
+
 export interface RaterAnalytics {
   prolific_id: string;
   study_id: string | null;
   session_start: string | null;
+  session_end: string | null;
+  is_active: boolean;
   num_ratings: number;
   total_response_time_seconds: number;
   avg_response_time_seconds: number;
+  std_response_time_seconds: number;
   avg_confidence: number;
 }
 